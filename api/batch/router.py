@@ -0,0 +1,5 @@
+from flask import Blueprint
+
+bp = Blueprint("batch", __name__)
+
+import api.batch.routes
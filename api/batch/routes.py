@@ -0,0 +1,129 @@
+"""/batch routes
+
+Run several requests of the api in one round trip, e.g the requests
+a dashboard makes when it loads. The batch request is authenticated once,
+its sub-requests reuse its `Savior` and are dispatched to the existing
+views, on a thread pool shared by all batch requests.
+
+Sub-requests run concurrently, in no particular order, so a batch
+shouldn't contain requests that depend on each other's writes.
+
+Settings, see `config.Config`:
+    BATCH_MAX_REQUESTS (int): The most sub-requests a batch may contain.
+    BATCH_MAX_WORKERS (int): The threads sub-requests are run on.
+"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, request, current_app
+from werkzeug.test import EnvironBuilder
+from api.batch.router import bp
+from api.helpers import savior_route, send, BATCH_SAVIOR_ENVIRON_KEY
+from root.partner import Partner
+from root.user import User
+from config import Config
+from exceptions import InvalidRequestDataError
+
+config = Config()
+
+METHODS = ("GET", "POST", "PUT", "PATCH", "DELETE")
+
+_executor = ThreadPoolExecutor(
+    max_workers=config.batch_max_workers, thread_name_prefix="batch"
+)
+
+def _validate(sub_requests: list[dict]) -> list[dict]:
+    """Assert sub-requests are well formed.
+
+    Raises:
+        InvalidRequestDataError: When they are not, or there are too many.
+    """
+    if not isinstance(sub_requests, list) or not sub_requests:
+        raise InvalidRequestDataError("Expected a non empty list of requests")
+    if len(sub_requests) > config.batch_max_requests:
+        raise InvalidRequestDataError(
+            f"A batch can contain at most {config.batch_max_requests} requests"
+        )
+    for sub_request in sub_requests:
+        if not isinstance(sub_request, dict):
+            raise InvalidRequestDataError("Every request must be an object")
+        path, method = sub_request.get("path"), sub_request.get("method", "GET")
+        if not isinstance(path, str) or not path.startswith("/"):
+            raise InvalidRequestDataError(f"Invalid request path: {path}")
+        if path.split("?")[0].rstrip("/") == "/batch":
+            raise InvalidRequestDataError("Batches can't be nested")
+        if not isinstance(method, str) or method.upper() not in METHODS:
+            raise InvalidRequestDataError(f"Invalid request method: {method}")
+    return sub_requests
+
+def _dispatch(
+    app: Flask, savior: Partner | User, base_url: str, sub_request: dict
+) -> tuple[int, dict]:
+    """Run a sub-request through the app's views.
+
+    Args:
+        app (Flask): The app to dispatch to.
+        savior (Partner | User): The savior of the batch request.
+        base_url (str): The url the batch request was made to.
+        sub_request (dict): The sub-request, see `batch`.
+
+    Returns:
+        The status code and json body of the sub-request's response
+    """
+    builder = EnvironBuilder(
+        path=sub_request["path"],
+        base_url=base_url,
+        method=sub_request.get("method", "GET").upper(),
+        query_string=sub_request.get("query"),
+        json=sub_request.get("json"),
+    )
+    try:
+        environ = builder.get_environ()
+    finally:
+        builder.close()
+    environ[BATCH_SAVIOR_ENVIRON_KEY] = savior
+    try:
+        with app.request_context(environ):
+            response = app.full_dispatch_request()
+            # streamed views read their cursor here, within the request
+            data = response.get_data()
+            response.close()
+    except Exception as e:
+        return 500, {"content": str(e), "error": str(e)}
+    try:
+        body = json.loads(data)
+    except ValueError:
+        # not one of our views, e.g a 404 of an unknown path
+        return response.status_code, {"content": None, "error": response.status}
+    return response.status_code, body if isinstance(body, dict) else {"content": body}
+
+@bp.post("/", strict_slashes=False)
+@savior_route(send_return=False)
+def batch(savior: Partner | User) -> Response:
+    """POST method for /batch
+
+    Expected json:
+        requests (list[dict]): The sub-requests, each with fields:
+            path (str): The path of the endpoint, e.g /saviors/files
+            method (str): Optional. The http method, defaults to GET
+            query (dict): Optional. The query params
+            json (Any): Optional. The json body
+            id (Any): Optional. An id to tell responses apart,
+                defaults to the index of the request
+
+    Returns:
+        A list of responses in the order of `requests`, each a dict with
+        fields: id, status, the status code of the response, and its
+        content and error fields
+    """
+    sub_requests = _validate((request.json or {}).get("requests"))
+    app, base_url = current_app._get_current_object(), request.host_url
+    futures = [
+        _executor.submit(_dispatch, app, savior, base_url, sub_request)
+        for sub_request in sub_requests
+    ]
+    responses = []
+    for i, (sub_request, future) in enumerate(zip(sub_requests, futures)):
+        status, body = future.result()
+        responses.append({"id": sub_request.get("id", i), "status": status, **body})
+    return send(content=responses, status=200)
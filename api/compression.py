@@ -0,0 +1,114 @@
+"""Negotiated compression of responses.
+
+Responses are mostly repetitive json, documents sharing the same
+keys, so they compress well. `send` and `send_stream` compress their
+responses with gzip or deflate, whichever the client prefers in its
+`Accept-Encoding` header.
+
+Settings, read from the app config:
+    COMPRESS_MIN_SIZE (int): Responses smaller than this many bytes are sent
+        as is, compressing them costs more than it saves. Streamed responses
+        are always compressed, their size isn't known upfront.
+    COMPRESS_LEVEL (int): The zlib compression level, from 1 (fastest)
+        to 9 (smallest). 0 disables compression.
+"""
+
+import zlib
+from typing import Iterable, Iterator, Literal
+from flask import Response, request, current_app, has_request_context
+
+Encoding = Literal["gzip", "deflate"]
+
+# zlib wbits of each encoding, gzip adds a gzip header and
+# deflate is the zlib format, as http's deflate is defined
+_WBITS: dict[str, int] = {"gzip": 16 + zlib.MAX_WBITS, "deflate": zlib.MAX_WBITS}
+
+def negotiate() -> Encoding | None:
+    """Choose the encoding of the current request's response.
+
+    Returns:
+        The accepted encoding with the highest quality, gzip on ties,
+        or None if neither gzip or deflate are accepted
+    """
+    accepted = request.accept_encodings
+    encoding = max(_WBITS, key=accepted.quality)
+    return encoding if accepted.quality(encoding) > 0 else None
+
+def compress(data: bytes, encoding: Encoding, level: int) -> bytes:
+    """Compress a response body.
+
+    Args:
+        data (bytes): The body to compress.
+        encoding (Literal[gzip, deflate]): The content encoding.
+        level (int): The compression level.
+
+    Returns:
+        The compressed body
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, _WBITS[encoding])
+    return compressor.compress(data) + compressor.flush()
+
+def compress_stream(
+    chunks: Iterable[str | bytes], encoding: Encoding, level: int
+) -> Iterator[bytes]:
+    """Compress a streamed response body.
+
+    Every chunk is flushed, so that clients can decode
+    documents as they arrive rather than when the stream ends.
+
+    Args:
+        chunks (Iterable): The chunks of the body.
+        encoding (Literal[gzip, deflate]): The content encoding.
+        level (int): The compression level.
+
+    Yields:
+        The compressed chunks
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, _WBITS[encoding])
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            compressed = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+
+def compress_response(response: Response) -> Response:
+    """Compress a response if the requesting client accepts it.
+
+    Args:
+        response (Response): The response to compress, it's modified in place.
+
+    Returns:
+        The response
+    """
+    if not has_request_context():
+        return response
+    config = current_app.config
+    level = config.get("COMPRESS_LEVEL", 0)
+    if (
+        not level
+        or response.status_code < 200
+        or response.status_code in (204, 304)
+        or "Content-Encoding" in response.headers
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = negotiate()
+    if encoding is None:
+        return response
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding, level)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < config.get("COMPRESS_MIN_SIZE", 0):
+            return response
+        response.set_data(compress(data, encoding, level))
+    response.headers["Content-Encoding"] = encoding
+    return response
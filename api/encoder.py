@@ -0,0 +1,89 @@
+"""Json encoding of responses.
+
+Responses used to be serialized with `json.dumps(content, default=str)`,
+which builds a new encoder per response and tracks every container it
+encodes to detect circular references. Responses are trees of documents
+fresh from mongodb, they can't be circular, so a single encoder is
+reused with that check disabled.
+
+Values json can't encode, mostly `ObjectId` and `datetime`, are looked up
+by their exact type in `ENCODERS`. Every encoder must return exactly what
+`str` does, so that responses stay byte-compatible with the old format.
+Types that aren't found, including subclasses of the listed types,
+e.g `pandas.Timestamp`, fall back to `str`.
+"""
+
+import json
+from datetime import datetime, date
+from typing import Any, Callable, Iterable, Iterator
+import numpy as np
+from bson import ObjectId, Decimal128
+
+# documents per chunk of a streamed response
+STREAM_BATCH_SIZE = 500
+
+def _object_id_to_str(o: ObjectId) -> str:
+    # same as `ObjectId.__str__`, without the hexlify and decode calls
+    return o.binary.hex()
+
+ENCODERS: dict[type, Callable[[Any], str]] = {
+    ObjectId: _object_id_to_str,
+    datetime: datetime.__str__,
+    date: date.__str__,
+    Decimal128: str,
+    # numpy floats (float64) and strings subclass python's, json encodes
+    # those itself, only the rest reach the encoder
+    **{
+        numpy_type: str
+        for numpy_type in (
+            np.bool_,
+            np.int8, np.int16, np.int32, np.int64,
+            np.uint8, np.uint16, np.uint32, np.uint64,
+            np.float16, np.float32,
+        )
+    },
+}
+
+def _default(o: Any, _get=ENCODERS.get) -> str:
+    """Encode a value json can't, exceptions included"""
+    return _get(type(o), str)(o)
+
+_encoder = json.JSONEncoder(default=_default, check_circular=False)
+
+def dumps(obj: Any) -> str:
+    """Serialize `obj` to a json string.
+
+    Args:
+        obj (Any): The content of a response.
+
+    Returns:
+        The same string as `json.dumps(obj, default=str)`
+    """
+    return _encoder.encode(obj)
+
+def iterencode_content(
+    documents: Iterable, batch_size: int = STREAM_BATCH_SIZE
+) -> Iterator[str]:
+    """Incrementally serialize documents as the content of a response.
+    
+    The joined chunks are the same string as 
+    `dumps({"content": list(documents)})`, but only `batch_size`
+    documents are held in memory at a time. 
+    
+    Args:
+        documents (Iterable): The documents to serialize, e.g a pymongo cursor.
+        batch_size (int): How many documents to encode per chunk.
+    
+    Yields:
+        Chunks of the json string
+    """
+    encode, batch, separator = _encoder.encode, [], ""
+    yield '{"content": ['
+    for document in documents:
+        batch.append(encode(document))
+        if len(batch) >= batch_size:
+            yield separator + ", ".join(batch)
+            separator, batch = ", ", []
+    if batch:
+        yield separator + ", ".join(batch)
+    yield "]}"
@@ -4,6 +4,7 @@ from root.partner import Partner
 from api.helpers import route, send
 from pymongo import MongoClient
 from api.helpers import savior_route
+from root import data_cache
 
 @bp.route("/", methods=["GET"], strict_slashes=False)
 @savior_route(send_return=False)
@@ -67,9 +68,11 @@ def create_emission_factor(savior: Partner) -> bool:
 @savior_route
 def delete_factor(savior: Partner, factor_id: str) -> int:
     """Delete a factor created by a savior"""
-    return savior.db.emission_factors.delete_one(
+    deleted_count = savior.db.emission_factors.delete_one(
         {"savior_id": savior.savior_id, "resource_id": factor_id}
     ).deleted_count
+    data_cache.bump(savior.savior_id, "emission_factors")
+    return deleted_count
 
         
 @bp.route("/calculations", methods=["POST"])
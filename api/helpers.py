@@ -4,9 +4,9 @@ Wrappers and decorators for regular routes and auth-protected routes.
 Common functions that are used for both partner and user endpoints.
 """
 
-import json
-from flask import make_response, Response
-from typing import Callable, Literal, Iterable
+from flask import make_response, Response, current_app, request
+from typing import Callable, Literal, Iterable, Iterator
+from itertools import chain, islice
 from functools import wraps
 from exceptions import (
     ExceptionWithStatusCode, 
@@ -16,13 +16,17 @@ from exceptions import (
     InvalidMediaTypeError
 )
 from root.user import User 
+from root.savior import Savior, CONTEXT_CLAIM
 from functools import wraps
 from datetime import datetime, timedelta, timezone
 import pandas as pd
 from werkzeug.datastructures import FileStorage
 from bson import ObjectId
-from pymongo import MongoClient, errors as MongoErrors, collection, database
+from pymongo import errors as MongoErrors, collection, database
+from database import mongo
+from api import encoder, compression
 from root.partner import Partner, GHG_CATEGORIES_TO_UPLOAD_TASKS
+from root import ingest
 from flask_jwt_extended import (
     create_access_token, 
     get_jwt, get_jwt_identity, 
@@ -30,34 +34,80 @@ from flask_jwt_extended import (
     set_access_cookies
 )
 
+# the environ key of a batched sub-request's `Savior`, see `api.batch`
+BATCH_SAVIOR_ENVIRON_KEY = "sprive.batch_savior"
+
 def send(status: int, **kwargs) -> Response:
     """Json serialize a view with a status code
     
+    The response is compressed when large enough and 
+    accepted by the client, see `compression`.
+    
+    Args:
+        status (int): The status code to make the response with
+        
+    Returns:
+        A flask Response
+    """
+    return compression.compress_response(
+        make_response(encoder.dumps({**kwargs}), status)
+    )
+
+def send_stream(status: int, content: Iterator) -> Response:
+    """Json serialize a view incrementally, with chunked transfer encoding
+    
+    The response body is the same as `send(content=list(content))`,
+    but documents are encoded in batches as they are read, see 
+    `encoder.iterencode_content`. The first document is read before 
+    the response is made, so that query errors, which usually occur 
+    on the first read of a cursor, can still be sent with an error status.
+    
     Args:
         status (int): The status code to make the response with
+        content (Iterator): The documents to send, e.g a pymongo cursor.
+            It's closed once sent, or when the client disconnects.
         
     Returns:
         A flask Response
     """
-    return make_response(json.dumps({**kwargs}, default=str), status)
+    head = list(islice(content, 1))
+    def _generate():
+        try:
+            yield from encoder.iterencode_content(chain(head, content))
+        finally:
+            close = getattr(content, "close", None)
+            if close is not None:
+                close()
+    return compression.compress_response(Response(_generate(), status))
+
+def _send_view_result(
+    content, status: int, stream: bool
+) -> Response:
+    """Send a view's return, streamed when possible and requested"""
+    if stream and isinstance(content, Iterator):
+        return send_stream(content=content, status=status)
+    return send(content=content, status=status)
 
 def route(
     needs_db: bool = False, 
     send_return = True,
     success_code: int = 200,
+    stream: bool = False,
 ) -> Callable:
     """Wraps a flask view
     
-    Get a MongoClient instance and implement error handling 
+    Get the shared MongoClient instance and implement error handling 
     for a flask view. Whatever the view returns is json serialized by default
     
     Can be used with or without parameters
     
     Args:
-        needs_db (bool): If true, pass a MongoClient to the `client` 
-            argument of the view
+        needs_db (bool): If true, pass the process-wide MongoClient
+            to the `client` argument of the view. See `database.mongo`
         send_return (bool): Whether or not to json serialize the function result
         success_code (int): The status code to return when no error is raised
+        stream (bool): Whether to stream the view's return when it's an 
+            iterator, e.g a pymongo cursor, instead of a list. See `send_stream`
         
     Returns:
         The wrapped flask view function
@@ -69,36 +119,70 @@ def route(
         def _inner(*args, **kwargs):
             try:
                 if needs_db:
-                    client = MongoClient()
-                    response = func(client=client, *args, **kwargs)
-                    client.close()
+                    response = func(client=mongo.client, *args, **kwargs)
                 else:
                     response = func(*args, **kwargs)
+                if send_return:
+                    response = _send_view_result(
+                        response, status=success_code, stream=stream
+                    )
             except ExceptionWithStatusCode as e:
                 return send(content=e, error=e, status=e.status_code) 
             except Exception as e:
                 return send(content=e, error=e, status=400)
-            return send(
-                content=response, status=success_code
-            ) if send_return else response
+            return response
         return _inner
     return _wrapper
 
+def _uses_savior_context() -> bool:
+    """Whether jwt claims carry a savior context, see `Savior.context`"""
+    return current_app.config.get("JWT_SAVIOR_CONTEXT", False)
+
+def _access_claims(
+    savior_type: Literal["partners", "users"],
+    partner_id: str | None = None,
+    context: dict | None = None,
+) -> dict:
+    """The additional claims of an access token
+    
+    Args:
+        savior_type (Literal[partners, users]): The type of the account
+        partner_id (str): The company_id of a partner account
+        context (dict): Optional. The savior context to embed,
+            it's only embedded when `JWT_SAVIOR_CONTEXT` is enabled.
+    
+    Returns:
+        A dict of claims
+    """
+    claims = {"savior_type": savior_type}
+    if partner_id is not None:
+        claims["partner"] = partner_id
+    if context is not None and _uses_savior_context():
+        claims[CONTEXT_CLAIM] = context
+    return claims
+
 def _refresh_partner_cookies_if_needed(
     response: Response,
     token_expiration: datetime.timestamp, 
     savior_id: str,
+    partner_id: str,
+    context: dict | None = None,
+    force: bool = False,
 ) -> None:
     """Refreshes a partners authorization cookies if needed.
     
     Only will refresh if the token they currently are requesting with
-    expires in 30 minutes or less.
+    expires in 30 minutes or less, or when forced to, e.g. when 
+    the token's savior context is stale.
     
     Args:
         response (Response): The response to set cookies on.
         token_expiration (datetime.timestamp): The expiration timestamp on the jwt token.
         savior_id (str): The identity to create the token with, 
-            and add as additional_claims to the token
+            the _id of the company user
+        partner_id (str): The company_id to add as additional_claims to the token
+        context (dict): Optional. The savior context to add to the claims
+        force (bool): Whether to refresh regardless of the expiration
         
     Returns:
         None
@@ -106,13 +190,12 @@ def _refresh_partner_cookies_if_needed(
     should_refresh = datetime.timestamp(
         datetime.now(tz=timezone.utc) + timedelta(minutes=30)
     )
-    if should_refresh > token_expiration:
+    if force or should_refresh > token_expiration:
         refreshed_token = create_access_token(
             identity=savior_id,
-            additional_claims={
-                "savior_type": "partners",
-                "partner": savior_id
-            }
+            additional_claims=_access_claims(
+                "partners", partner_id=partner_id, context=context
+            )
         )
         set_access_cookies(response, refreshed_token)
     return None
@@ -123,6 +206,7 @@ def savior_route(
     *,
     send_return: bool = True,
     success_code: int = 200, 
+    stream: bool = False,
 ) -> Callable:
     """Route decorator for auth-required flask views
     
@@ -135,6 +219,16 @@ def savior_route(
     It also will refresh cookies when they expire if the request
     comes from a partner.
     
+    When `JWT_SAVIOR_CONTEXT` is enabled in the app config, the token's
+    savior context is passed to the `Savior` class, so that views reading
+    `savior.context` don't touch the db. Stale contexts are replaced, 
+    partners get refreshed cookies, and users a new token in the 
+    `X-Access-Token` response header.
+    
+    Sub-requests of a /batch request are already authenticated, they
+    reuse the batch request's `Savior`, and the batch response
+    refreshes tokens instead. See `api.batch`.
+    
     Args:
         _func (Callable | None): The function to wrap when 
             decorating without invocating, i.e without parameters
@@ -142,6 +236,8 @@ def savior_route(
             serialize the response
         success_code (int): Named arg. The status code to make the Response with
             when successful
+        stream (bool): Named arg. Whether to stream the view's return when it's
+            an iterator, e.g a pymongo cursor, instead of a list. See `send_stream`
     
     Returns:
         The function it's wrapping, called with the relevant `Savior`
@@ -151,31 +247,52 @@ def savior_route(
     def _wrapper(func: Callable | None = _func) -> Callable:
         @wraps(func)
         def _inner(*args, **kwargs):
-            try: 
-                verify_jwt_in_request()
-                savior_id = get_jwt_identity()
-                jwt = get_jwt()
-                savior_type = jwt["savior_type"]
-            except Exception as e:
-                return send(content=e, error=e, status=401)
+            batch_savior = request.environ.get(BATCH_SAVIOR_ENVIRON_KEY)
+            if batch_savior is None:
+                try: 
+                    verify_jwt_in_request()
+                    savior_id = get_jwt_identity()
+                    jwt = get_jwt()
+                    savior_type = jwt["savior_type"]
+                except Exception as e:
+                    return send(content=e, error=e, status=401)
+                use_context = _uses_savior_context()
+                context = jwt.get(CONTEXT_CLAIM) if use_context else None
             try:
-                if savior_type == "partners":
-                    savior = Partner(savior_id=jwt["partner"], user_id=savior_id)              
+                if batch_savior is not None:
+                    savior = batch_savior
+                elif savior_type == "partners":
+                    savior = Partner(
+                        savior_id=jwt["partner"], user_id=savior_id, context=context
+                    )              
                 elif savior_type == "users":
-                    savior = User(savior_id=savior_id)
-                res = send(
-                    content=func(savior, *args, **kwargs), status=success_code
+                    savior = User(savior_id=savior_id, context=context)
+                res = _send_view_result(
+                    func(savior, *args, **kwargs), status=success_code, stream=stream
                 ) if send_return else func(savior, *args, **kwargs)
-                savior._close()
             except ExceptionWithStatusCode as e:
                 return send(content=e, error=e, status=e.status_code)
             except Exception as e:
                 return send(content=e, error=e, status=400)
+            if batch_savior is not None:
+                return res
+            refresh_context = use_context and savior.context_is_stale
             if savior_type == "partners":
                 _refresh_partner_cookies_if_needed(
                     response=res, 
                     token_expiration=jwt["exp"],
-                    savior_id=savior_id
+                    savior_id=savior_id,
+                    partner_id=jwt["partner"],
+                    context=savior.context if use_context else None,
+                    force=refresh_context,
+                )
+            elif refresh_context and isinstance(res, Response):
+                res.headers["X-Access-Token"] = create_access_token(
+                    identity=savior_id,
+                    additional_claims=_access_claims(
+                        "users", context=savior.context
+                    ),
+                    expires_delta=False
                 )
             return res
         return _inner
@@ -187,6 +304,7 @@ def _login(
     username: str,
     email: str,
     partner_token_identity: str | None = None,
+    context: dict | None = None,
     **response_kwargs, 
 ) -> dict:
     """Account login helper
@@ -203,6 +321,8 @@ def _login(
         email (str): The account email
         partner_token_identity: This will be the _id
             of the partner account, aka the company user
+        context (dict): Optional. The savior context to embed in
+            the token's claims, see `Savior.make_context`
     
     Returns:
         A dictionary of the account to return
@@ -210,7 +330,7 @@ def _login(
     if savior_type == "users":
         access_token = create_access_token(
             identity=savior_id, 
-            additional_claims={"savior_type": savior_type},
+            additional_claims=_access_claims(savior_type, context=context),
             expires_delta=False
         )
         res = {
@@ -223,7 +343,9 @@ def _login(
     else: 
         access_token = create_access_token(
             identity=partner_token_identity, 
-            additional_claims={"savior_type": savior_type, "partner": savior_id}
+            additional_claims=_access_claims(
+                savior_type, partner_id=savior_id, context=context
+            )
         )
         res = {
             "username": username, 
@@ -281,7 +403,10 @@ def create_account(
         savior_type, 
         username = account["username"],
         email = email,
-        partner_token_identity=_id
+        partner_token_identity=_id,
+        context=Savior.make_context(
+            account, company_id=_id if savior_type == "partners" else None
+        ),
     )
     if savior_type == "partners":
         tasks_savior_id = ObjectId(_id)
@@ -336,6 +461,7 @@ def login(
             f"Could not find an account with that {query_field}"
         )
     elif password == account.pop("password"):
+        context = Savior.make_context(account)
         if savior_type == "partners":
             token_id = str(account.pop("_id"))
             field = account.pop
@@ -345,6 +471,7 @@ def login(
                 username=field("username"), 
                 email=field("email"),
                 partner_token_identity=token_id,
+                context=context,
                 **account,
             )
             response = send(content=response, status=200)
@@ -355,6 +482,7 @@ def login(
                 savior_type=savior_type, 
                 username=account["username"], 
                 email=account["email"],
+                context=context,
                 current_pledge=account.get("current_pledge", {}),
                 spriving=account.get("spriving", False)
             )
@@ -391,7 +519,10 @@ def file_to_df(file: FileStorage, filename: str | None = None) -> pd.DataFrame:
     file_extension = filename.partition(".")[-1]
     if file_extension == "csv":
         return pd.read_csv(file)
-    elif file_extension in ["xls", "xlsx"]:
+    elif file_extension in ingest.EXCEL_EXTENSIONS:
+        # streamed in read only mode, see `root.ingest`
+        return ingest.read_dataframe(file.stream, filename)
+    elif file_extension == "xls":
         return pd.read_excel(file)
     else:
         raise InvalidMediaTypeError("Invalid file type")
@@ -0,0 +1,5 @@
+from flask import Blueprint
+
+bp = Blueprint("jobs", __name__)
+
+import api.jobs.routes
@@ -0,0 +1,59 @@
+"""/jobs routes
+
+Run /saviors/data queries in the background, for analytics that take
+too long to run within a request. A job is submitted with the same json as
+/saviors/data, and its results are fetched in pages once it's done.
+See `root.jobs`.
+"""
+
+from flask import request
+from bson import ObjectId
+from api.jobs.router import bp
+from api.helpers import savior_route
+from root.partner import Partner
+from root.user import User
+from exceptions import InvalidRequestDataError
+
+@bp.post("/", strict_slashes=False)
+@savior_route(success_code=202)
+def submit_job(savior: Partner | User) -> ObjectId:
+    """POST method for /jobs
+    
+    Expected json:
+        collection (str): a valid collection
+        query_type (Literal[aggregate, find]): Whether to call find() or aggregate on the collection
+        filters ([dict | list[dict]]): A dict filters to find() or a aggregate pipeline
+    
+    Returns:
+        A Response 202, containing the _id of the queued job
+    """
+    return savior.submit_data_job(**request.json)
+
+@bp.get("/<string:job_id>")
+@savior_route
+def get_job(savior: Partner | User, job_id: str) -> dict:
+    """GET method for /jobs/<job_id>
+    
+    Returns:
+        The job, with its status, one of queued, running, done or failed,
+        and the error of failed jobs
+    """
+    return savior.get_data_job(job_id)
+
+@bp.get("/<string:job_id>/results")
+@savior_route
+def get_job_results(savior: Partner | User, job_id: str) -> dict:
+    """GET method for /jobs/<job_id>/results
+    
+    Query params:
+        page (int): Optional. The page of results, starting at 0.
+    
+    Returns:
+        A dict with the page's results, the page,
+        and the number of pages and results of the job
+    """
+    try:
+        page = int(request.args.get("page", 0))
+    except ValueError as e:
+        raise InvalidRequestDataError("page must be an integer") from e
+    return savior.get_data_job_results(job_id, page=page)
@@ -13,6 +13,7 @@ from api.partners.router import bp
 from pymongo import MongoClient
 from flask import request, Response
 from bson import ObjectId
+from pymongo.cursor import Cursor
 from root.partner import Partner
 
 @bp.post("/", strict_slashes=False)
@@ -109,16 +110,14 @@ def get_partner(client: MongoClient, partner_id: str) -> list | dict:
     return Partner.get_partner(db=client.spt, partner_id=partner_id)
     
 @bp.get("/", strict_slashes=False)
-@route(needs_db=True)
-def get_partners(client: MongoClient) -> list:
+@route(needs_db=True, stream=True)
+def get_partners(client: MongoClient) -> Cursor:
     """GET method to /partners
     
     Returns:
-        A list of partner account dictionaries
+        A list of partner account dictionaries, streamed as they are read
     """
-    return list(
-        client.spt.partners.find(
-            {}, 
-            {"name": "$company", "company": 1, "joined": 1, "region": 1, "bio": 1}
-        )
+    return client.spt.partners.find(
+        {}, 
+        {"name": "$company", "company": 1, "joined": 1, "region": 1, "bio": 1}
     )
\ No newline at end of file
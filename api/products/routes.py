@@ -132,10 +132,11 @@ def search_products(client: MongoClient) -> dict[str, bool | list]:
         limit (int): How many results to return, 0 means all
         skip (int): How many results to skip
         q (str): The search query
+        total (bool): Optional. Whether to count all matching products
     
     Returns: 
         A dict with boolean field has_more, and products field
-        containing product level info
+        containing product level info. When requested, an int total field
     """
     return Savior.collection_text_search(
         collection=client.spt.emission_factors,
@@ -9,8 +9,10 @@ from api.helpers import savior_route
 from root.partner import Partner
 from flask import request, Response
 from api.helpers import send, file_to_df
+from root import ingest
+from exceptions import FileValidationError, InvalidRequestDataError
 from bson import ObjectId
-from datetime import datetime, timezone
+from pymongo.cursor import Cursor
 
 @bp.delete("/logout")
 def logout() -> Response:
@@ -51,28 +53,96 @@ def upload_file(savior: Partner) -> Response:
     
     Uploads an emission file. Accepted file types are: csv, excel / xls
     
+    Csv and xlsx files are parsed and inserted a chunk of rows at a time, 
+    see `root.ingest`. Sheets of a workbook other than the first are 
+    uploaded with the sheets field, each as a file of its own. Large csv
+    and xlsx files can be uploaded in the background with the async field,
+    their progress is polled at /saviors/files/jobs/<job_id>.
+    
     Note that even if there are multiple files uploaded 
     with a list we only process the first one
     
     Expected request form:
         file[]` or file (FileStorage): the file to upload
+        sheets (list[str]): Optional. The sheets of a workbook to upload, 
+            or all, sent as repeated fields. See `Partner.ingest_workbook`
+        async (str): Optional. true to upload the file in the background
     Returns:
-        The id of the file uploaded
+        The id of the file uploaded, or a list of the ids
+        of each sheet's file when uploading sheets. Csv and xlsx uploads
+        also send the num_rows and co2e totals of the upload. When rows
+        are invalid, the errors of each column, see `root.validation`.
+        A Response 202 with the id of the job when uploading in the background
     """
     get_file = request.files.get
     file = get_file("file[]") or get_file("file")
     filename = file.filename
-    file_df = file_to_df(file, filename)
-    print(request.form)
+    sheets = request.form.getlist("sheets")
+    extension = ingest.file_extension(filename)
+    results, totals = [], {}
     try:
-        response, status = savior.handle_emissions_file(
-            file_df=file_df, get_form_field=request.form.get, filename=filename
-        ), 200
+        if sheets and extension not in ingest.EXCEL_EXTENSIONS:
+            raise InvalidRequestDataError(
+                f"Only {' and '.join(ingest.EXCEL_EXTENSIONS)} files have sheets to upload"
+            )
+        if request.form.get("async", "").lower() in ("1", "true"):
+            if sheets:
+                raise InvalidRequestDataError(
+                    "Sheets can't be uploaded in the background"
+                )
+            job_id = savior.submit_file_job(
+                file=file.stream, filename=filename, form=request.form.to_dict()
+            )
+            return send(content=job_id, status=202)
+        if sheets:
+            with ingest.saved_upload(file.stream, suffix=f".{extension}") as path:
+                results = savior.ingest_workbook(
+                    path=path, 
+                    sheets=sheets, 
+                    get_form_field=request.form.get, 
+                    filename=filename,
+                )
+            response = [result.file_id for result in results]
+        elif ingest.supports_chunks(filename):
+            results = [
+                savior.ingest_emissions_file(
+                    chunks=ingest.file_chunks(file.stream, filename), 
+                    get_form_field=request.form.get, 
+                    filename=filename,
+                )
+            ]
+            response = results[0].file_id
+        else:
+            response = savior.handle_emissions_file(
+                file_df=file_to_df(file, filename), 
+                get_form_field=request.form.get, 
+                filename=filename,
+            )
+        if results:
+            totals = {
+                "num_rows": sum(result.num_rows for result in results),
+                "co2e": sum(result.co2e for result in results),
+            }
+        status = 200
+    except FileValidationError as e:
+        return send(content=e, errors=e.errors, status=e.status_code)
     except Exception as e:
-        response, status = e, 400
-    response = send(content=response, status=status)
+        response, status = e, getattr(e, "status_code", 400)
+    response = send(content=response, status=status, **totals)
     return response
 
+@bp.get("/files/jobs/<string:job_id>")
+@savior_route
+def get_file_job(savior: Partner, job_id: str) -> dict:
+    """GET method of /saviors/files/jobs/<job_id> endpoint.
+    
+    Returns:
+        The upload job, with its status, one of queued, running, done or 
+        failed, its progress, the file_id of done jobs, and the error of 
+        failed ones. See `root.ingest_jobs`
+    """
+    return savior.get_file_job(job_id)
+
 @bp.get("/files/<string:file_id>")
 @savior_route(send_return=False)
 def get_file(savior: Partner, file_id: str) -> Response:
@@ -236,18 +306,15 @@ def company_users(savior: Partner) -> list:
     )
     
 @bp.get("/company-tree")
-@savior_route
-def get_company_tree(savior: Partner) -> list:
+@savior_route(stream=True)
+def get_company_tree(savior: Partner) -> Cursor:
     """GET method of /saviors/company-tree
     
     Returns:
-        All the accounts created under the company
+        All the accounts created under the company, streamed as they are read
      
     """
-    
-    return list(
-        savior.db.partners.find({"company_id": savior.savior_id}, {"password": 0})
-    )
+    return savior.db.partners.find({"company_id": savior.savior_id}, {"password": 0})
     
 @bp.post("/company-tree")
 @savior_route(success_code=201)
@@ -266,20 +333,4 @@ def invite_user(savior: Partner) -> ObjectId:
     Returns:
         The _id of the created user
     """
-    account = request.json
-    collection = savior.db.partners
-    company_info = collection.find_one(
-        {"company_id": savior.savior_id, "role": "company"},
-        {"company_id": 1, "company_email": 1, "region": 1, "company": 1, "_id": 0}
-    )
-    return collection.insert_one(
-        {
-            **company_info,
-            "role": account["role"],
-            "password": account["password"],
-            "username": account["username"],
-            "email": account["email"],
-            "joined": datetime.now(tz=timezone.utc),
-            "team": account.get("team", None),
-        }
-    ).inserted_id
\ No newline at end of file
+    return savior.invite_user(account=request.json)
\ No newline at end of file
@@ -19,8 +19,12 @@ For example:
 from flask import request
 from api.saviors.router import bp
 from api.helpers import savior_route
+from root import emission_rollups, catalog
 from root.partner import Partner
 from root.user import User
+from exceptions import InvalidRequestDataError
+from pymongo.cursor import Cursor
+from typing import Iterator
 
 @bp.put("/", strict_slashes=False)
 @savior_route
@@ -50,36 +54,140 @@ def get_savior(savior: User | Partner) -> dict:
     return savior.savior
 
 @bp.get("/logs")
-@savior_route
-def logs(savior: User | Partner) -> dict | list:
+@savior_route(stream=True)
+def logs(savior: User | Partner) -> dict | Cursor:
     """GET method for /saviors/logs endpoint
     
+    Query params:
+        limit (int): Optional. The size of a page. Defaults to 0, all logs.
+        skip (int): Optional. Legacy, how many logs to skip. Defaults to 0.
+        cursor (str): Optional. The `next_cursor` of the previous page, 
+            empty for the first page. 
+    
     Returns:
-        A list of dictionaries containing logs if request is from partner
-        otherwise a dictionary with fields: logs, has_more
+        A list of dictionaries containing logs if request is from partner,
+        streamed as they are read, otherwise, or when paging with `cursor`, 
+        a dictionary with fields: logs, has_more, next_cursor
     """
     args = request.args.get
-    print("HERERE")
-    return savior.logs(
-        limit=int(args("limit", 0)),
-        skip=int(args("skip", 0))
+    limit, skip, cursor = int(args("limit", 0)), int(args("skip", 0)), args("cursor")
+    if isinstance(savior, Partner) and cursor is None:
+        return savior.logs_cursor(limit=limit, skip=skip)
+    return savior.logs(limit=limit, skip=skip, cursor=cursor)
+    
+@bp.get("/emissions")
+@savior_route
+def emissions(savior: User | Partner) -> list:
+    """GET method for /saviors/emissions endpoint
+    
+    The savior's emissions over time, read from rollups, 
+    which is much cheaper than aggregating logs with /saviors/data.
+    
+    Query params:
+        granularity (Literal[day, month]): Optional. Defaults to month.
+        start (str): Optional. ISO8601 date the periods start at or after.
+        end (str): Optional. ISO8601 date the periods start before.
+        group_by (str): Optional. Comma separated dimensions to group periods by,
+            any of scope, category, ghg_category and team.
+        scope, category, ghg_category, team (str): Optional. Only 
+            include emissions with this value.
+    
+    Returns:
+        A list of periods and their co2e and log count, oldest first
+    """
+    args = request.args
+    group_by = args.get("group_by")
+    return savior.get_emissions(
+        granularity=args.get("granularity", "month"),
+        start=args.get("start"),
+        end=args.get("end"),
+        group_by=group_by.split(",") if group_by else [],
+        filters={
+            dimension: args[dimension] 
+            for dimension in emission_rollups.DIMENSIONS if dimension in args
+        },
     )
     
 @bp.route("/data", methods=["POST"])
-@savior_route 
-def handle_data(savior: Partner | User) -> list | dict:
+@savior_route(stream=True)
+def handle_data(savior: Partner | User) -> tuple | Iterator:
     """POST method for /saviors/data
     
     Access to mongodb find and aggregation methods on db collections.
     
-    Only data of the requesting savior can be retrieved
+    Only data of the requesting savior can be retrieved. Results are
+    cached until the savior writes to the collection, see `root.data_cache`
+    
+    When a batch_size is given, only the first batch is returned, along with
+    a cursor to get the next batches from /saviors/data/<cursor>, see `root.cursors`
     
     Expected json:
         collection (str): a valid collection
         query_type (Literal[aggregate, find]): Whether to call find() or aggregate on the collection
         filters ([dict | list[dict]]): A dict filters to find() or a aggregate pipeline
+        batch_size (int): Optional. The number of results per batch
         
     Returns:
-         a list or dict with the resulting data
+         a list with the resulting data, streamed as it's read when not cached,
+         or a dict of the first batch's results and cursor when batching
+    """
+    if "batch_size" in request.json:
+        return savior.get_data_batch(**request.json)
+    return savior.get_cached_data(**request.json)
+
+@bp.get("/queries")
+@savior_route
+def get_queries(savior: Partner | User) -> list:
+    """GET method for /saviors/queries
+    
+    Returns:
+        The named queries of the catalog, each with 
+        its name, description and params, see `root.catalog`
+    """
+    return [query.to_dict() for query in catalog.CATALOG.values()]
+
+@bp.get("/queries/<string:name>")
+@savior_route(stream=True)
+def run_query(savior: Partner | User, name: str) -> tuple | Iterator:
+    """GET method for /saviors/queries/<name>
+    
+    Run a named query of the catalog on the savior's data.
+    
+    Query params:
+        The params of the query, e.g start and end dates
+    
+    Returns:
+        A list with the query's results
+    """
+    return savior.run_named_query(name, request.args.to_dict())
+
+@bp.get("/data/<string:cursor_id>")
+@savior_route
+def get_more_data(savior: Partner | User, cursor_id: str) -> dict:
+    """GET method for /saviors/data/<cursor_id>
+    
+    Query params:
+        batch_size (int): Optional. Defaults to the size of the first batch
+    
+    Returns:
+        A dict with the next batch's results, and the cursor 
+        of the batch after it, None when there are no more results
+    """
+    batch_size = request.args.get("batch_size")
+    try:
+        batch_size = None if batch_size is None else int(batch_size)
+    except ValueError as e:
+        raise InvalidRequestDataError("batch_size must be an integer") from e
+    return savior.get_more_data(cursor_id, batch_size=batch_size)
+
+@bp.delete("/data/<string:cursor_id>")
+@savior_route
+def close_data_cursor(savior: Partner | User, cursor_id: str) -> bool:
+    """DELETE method for /saviors/data/<cursor_id>
+    
+    Close a cursor before reading all of its batches.
+    
+    Returns:
+        Whether the cursor was open
     """
-    return savior.get_data(**request.json)
\ No newline at end of file
+    return savior.close_data_cursor(cursor_id)
\ No newline at end of file
@@ -43,13 +43,17 @@ def get_starred_products(savior: User) -> dict:
             Defaults to 0.
         skip (int): Optional. The amount of documents to skip
             for pagination. Defaults to 0
+        cursor (str): Optional. The `next_cursor` of the previous page,
+            pages with it instead of `skip`.
     
     Returns: 
-        A list of the user's starred products.
+        A dict with the user's starred products, has_more and next_cursor fields.
     """
     get_arg = request.args.get
     return savior.starred_products(
-        limit=int(get_arg("limit", 0)), skip=int(get_arg("skip", 0))
+        limit=int(get_arg("limit", 0)), 
+        skip=int(get_arg("skip", 0)),
+        cursor=get_arg("cursor"),
     )
     
 @bp.get("/times-logged")
@@ -67,6 +71,18 @@ def times_logged(savior: User) -> int:
         since_date=request.args["since_date"]
     )
     
+@bp.get("/pledge-progress")
+@savior_route
+def pledge_progress(savior: User) -> dict | None:
+    """GET method for /saviors/pledge-progress
+    
+    Returns:
+        The progress of the user's current pledge within its current period,
+        a dict with fields: frequency, period_start, period_end, co2e, count, 
+        streak, pledged_co2e, remaining_co2e. None without a current pledge.
+    """
+    return savior.pledge_progress()
+    
 @bp.post("/sprivers")
 @savior_route
 def start_spriving(savior: User) -> bool:
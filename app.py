@@ -4,6 +4,10 @@ from flask_cors import CORS
 from flask import Flask
 # from flask_mail import Mail
 from flask_jwt_extended import JWTManager  
+from database import mongo
+from config import Config
+from indexes import verify_indexes
+import cli
 
 # mail = Mail()
 
@@ -19,14 +23,28 @@ def create_app(testing: bool = False) -> Flask:
     app.config["JWT_COOKIE_SECURE"] = False #TODO: CHANGE THIS TO TRUE  
     app.config["JWT_CSRF_METHODS"] = ["GET", "POST", "PUT", "PATCH", "DELETE"]
     app.config["JWT_COOKIE_DOMAIN"] = "localhost"
+    config = Config()
+    # embed the savior context in jwt claims, see `Savior.context`
+    app.config["JWT_SAVIOR_CONTEXT"] = config.jwt_savior_context
+    # see `api.compression`
+    app.config["COMPRESS_MIN_SIZE"] = config.compress_min_size
+    app.config["COMPRESS_LEVEL"] = config.compress_level
     JWTManager(app)
-    CORS(app, supports_credentials=True)
-    # app.config["CELERY"] = {
-    #     "broker": "pyamqp://guest@localhost//",
-    #     "result_backend": "mongodb://localhost:27017/celery",
-    #     "task_ignore_result": True
-    # }
-    # celery_init_app(app)
+    CORS(app, supports_credentials=True, expose_headers=["X-Access-Token"])
+    mongo.init_app(app)
+    cli.init_app(app)
+    app.config["MONGO_VERIFY_INDEXES"] = not testing
+    if app.config["MONGO_VERIFY_INDEXES"]:
+        verify_indexes(uri=mongo.uri, db_name=mongo.db_name)
+    if config.celery_broker_url:
+        # background jobs run on celery workers, see `root.jobs`
+        from queues.celery_app import celery_init_app
+        app.config["CELERY"] = {
+            "broker": config.celery_broker_url,
+            "result_backend": config.celery_result_backend,
+            "task_ignore_result": True
+        }
+        celery_init_app(app)
 
     from api.saviors.router import bp as saviors_bp
     app.register_blueprint(saviors_bp, url_prefix="/saviors")
@@ -46,6 +64,12 @@ def create_app(testing: bool = False) -> Flask:
     from api.tasks.router import bp as tasks_bp
     app.register_blueprint(tasks_bp, url_prefix="/tasks")
     
+    from api.batch.router import bp as batch_bp
+    app.register_blueprint(batch_bp, url_prefix="/batch")
+    
+    from api.jobs.router import bp as jobs_bp
+    app.register_blueprint(jobs_bp, url_prefix="/jobs")
+    
     # from api.common.router import bp as common_bp
     # app.register_blueprint(common_bp)
     
@@ -0,0 +1,84 @@
+"""Flask cli commands.
+
+Registered on the app by `create_app`, run them with:
+    flask --app app <group> <command>
+"""
+
+import click
+from flask import Flask
+from flask.cli import AppGroup
+from database import mongo
+import indexes
+from exceptions import ResourceConflictError
+from root import file_summaries, product_rollups, emission_rollups
+
+indexes_cli = AppGroup("indexes", help="Manage the declared mongodb indexes.")
+
+@indexes_cli.command("diff")
+def diff_indexes() -> None:
+    """Compare declared indexes to the existing ones.
+
+    Exits with a status code of 1 when they differ.
+    """
+    differs = False
+    for collection_name, diff in indexes.diff_indexes(mongo.db).items():
+        for status in ("missing", "mismatched", "undeclared"):
+            for name in getattr(diff, status):
+                click.echo(f"{status:<11} {collection_name}.{name}")
+        differs = differs or bool(diff.missing or diff.mismatched)
+    if differs:
+        raise SystemExit(1)
+    click.echo("All declared indexes exist")
+
+@indexes_cli.command("create")
+@click.option(
+    "--drop-mismatched",
+    is_flag=True,
+    help="Drop and recreate indexes that don't match their declaration.",
+)
+def create_indexes(drop_mismatched: bool) -> None:
+    """Create missing declared indexes."""
+    created = indexes.create_indexes(mongo.db, drop_mismatched=drop_mismatched)
+    for collection_name, names in created.items():
+        for name in names:
+            click.echo(f"created {collection_name}.{name}")
+    if not created:
+        click.echo("Nothing to create")
+
+files_cli = AppGroup("files", help="Manage the summaries of uploaded files.")
+
+@files_cli.command("backfill")
+def backfill_files() -> None:
+    """Summarize the files of all existing logs."""
+    num_partners = file_summaries.backfill(mongo.db)
+    click.echo(f"Summarized the files of {num_partners} partners")
+
+products_cli = AppGroup("products", help="Manage the rollups of products.")
+
+@products_cli.command("backfill")
+def backfill_products() -> None:
+    """Rebuild the rollups of all existing products."""
+    num_products = product_rollups.backfill(mongo.db)
+    click.echo(f"Rebuilt the rollups of {num_products} products")
+
+emissions_cli = AppGroup("emissions", help="Manage the rollups of logged emissions.")
+
+@emissions_cli.command("backfill")
+def backfill_emissions() -> None:
+    """Rebuild the emission rollups from all existing logs.
+
+    Stop uploads and product logs first, emissions recorded
+    during the backfill abort it.
+    """
+    try:
+        num_buckets = emission_rollups.backfill(mongo.db)
+    except ResourceConflictError as e:
+        raise click.ClickException(str(e)) from e
+    click.echo(f"Wrote {num_buckets} emission buckets")
+
+def init_app(app: Flask) -> None:
+    """Register all cli command groups on `app`"""
+    app.cli.add_command(indexes_cli)
+    app.cli.add_command(files_cli)
+    app.cli.add_command(products_cli)
+    app.cli.add_command(emissions_cli)
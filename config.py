@@ -5,8 +5,76 @@ import os
 
 load_dotenv()
 
+def _optional_int(name: str, default: int | None = None) -> int | None:
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+def _optional_float(name: str, default: float | None = None) -> float | None:
+    value = os.environ.get(name)
+    return float(value) if value else default
+
 @dataclass(slots=True)
 class Config:
     greenhouse_gasses = ["co2", "n2o", "ch4"]
     data_dir = Path.cwd().parent / "data"
-    api_data_version = os.environ.get("API_DATA_VERSION")
\ No newline at end of file
+    api_data_version = os.environ.get("API_DATA_VERSION")
+    mongo_uri = os.environ.get("MONGO_URI", "mongodb://localhost:27017")
+    mongo_db_name = os.environ.get("MONGO_DB_NAME", "spt")
+    mongo_max_pool_size = _optional_int("MONGO_MAX_POOL_SIZE", 100)
+    mongo_min_pool_size = _optional_int("MONGO_MIN_POOL_SIZE", 0)
+    mongo_server_selection_timeout_ms = _optional_int(
+        "MONGO_SERVER_SELECTION_TIMEOUT_MS", 30000
+    )
+    mongo_connect_timeout_ms = _optional_int("MONGO_CONNECT_TIMEOUT_MS", 20000)
+    mongo_socket_timeout_ms = _optional_int("MONGO_SOCKET_TIMEOUT_MS")
+    mongo_wait_queue_timeout_ms = _optional_int("MONGO_WAIT_QUEUE_TIMEOUT_MS")
+    # seconds to cache savior profiles across requests, 0 disables it
+    profile_cache_ttl = _optional_float("PROFILE_CACHE_TTL", 0)
+    profile_cache_size = _optional_int("PROFILE_CACHE_SIZE", 4096)
+    # embed a savior context in jwt claims, see `Savior.context`
+    jwt_savior_context = os.environ.get(
+        "JWT_SAVIOR_CONTEXT", ""
+    ).lower() in ("1", "true")
+    # seconds a jwt savior context is trusted for after it's issued. Profile
+    # updates only make contexts stale in the process that wrote them, other
+    # workers trust them until this age, so keep it short
+    jwt_context_max_age = _optional_float("JWT_CONTEXT_MAX_AGE", 120)
+    # response compression, see `api.compression`
+    compress_min_size = _optional_int("COMPRESS_MIN_SIZE", 1024)
+    compress_level = _optional_int("COMPRESS_LEVEL", 6)
+    # /batch sub-requests per request, and threads running them, see `api.batch`
+    batch_max_requests = _optional_int("BATCH_MAX_REQUESTS", 20)
+    batch_max_workers = _optional_int("BATCH_MAX_WORKERS", 4)
+    # seconds to cache /saviors/data results, 0 disables it, see `root.data_cache`
+    data_cache_ttl = _optional_float("DATA_CACHE_TTL", 0)
+    data_cache_size = _optional_int("DATA_CACHE_SIZE", 1024)
+    data_cache_max_documents = _optional_int("DATA_CACHE_MAX_DOCUMENTS", 1000)
+    # limits of client supplied /saviors/data queries, see `root.guards`
+    data_max_time_ms = _optional_int("DATA_MAX_TIME_MS", 5000)
+    data_max_results = _optional_int("DATA_MAX_RESULTS", 10000)
+    data_max_pipeline_stages = _optional_int("DATA_MAX_PIPELINE_STAGES", 20)
+    data_max_blocking_stages = _optional_int("DATA_MAX_BLOCKING_STAGES", 4)
+    data_max_scanned_docs = _optional_int("DATA_MAX_SCANNED_DOCS", 100000)
+    data_allow_disk_use = os.environ.get(
+        "DATA_ALLOW_DISK_USE", ""
+    ).lower() in ("1", "true")
+    # /saviors/data cursors continued in batches, see `root.cursors`
+    cursor_idle_ttl = _optional_float("CURSOR_IDLE_TTL", 300)
+    cursor_max_per_savior = _optional_int("CURSOR_MAX_PER_SAVIOR", 5)
+    cursor_max_batch_size = _optional_int("CURSOR_MAX_BATCH_SIZE", 10000)
+    # rows of uploaded files parsed and inserted at a time, see `root.ingest`
+    ingest_chunk_size = _optional_int("INGEST_CHUNK_SIZE", 5000)
+    # processes parsing the sheets of multi sheet uploads, see `root.ingest`
+    ingest_workers = _optional_int("INGEST_WORKERS", os.cpu_count() or 1)
+    # background /saviors/data queries, see `root.jobs`
+    job_max_time_ms = _optional_int("JOB_MAX_TIME_MS", 600000)
+    job_max_results = _optional_int("JOB_MAX_RESULTS", 1000000)
+    job_max_scanned_docs = _optional_int("JOB_MAX_SCANNED_DOCS", 10000000)
+    job_page_size = _optional_int("JOB_PAGE_SIZE", 1000)
+    job_ttl = _optional_int("JOB_TTL", 86400)
+    job_workers = _optional_int("JOB_WORKERS", 2)
+    # background file uploads, see `root.ingest_jobs`
+    ingest_job_workers = _optional_int("INGEST_JOB_WORKERS", 1)
+    # jobs run on celery when a broker is set, see queues/
+    celery_broker_url = os.environ.get("CELERY_BROKER_URL")
+    celery_result_backend = os.environ.get("CELERY_RESULT_BACKEND")
@@ -0,0 +1,162 @@
+"""Process-wide MongoClient registry.
+
+A `MongoClient` is expensive to create, every new one does a TCP handshake,
+server discovery and builds its own connection pool. Instead of creating
+one per request, all `Savior` classes and `route` views share the client
+held by the `mongo` registry in this module.
+
+The registry follows the flask extension pattern, it's created at import
+time and configured with `mongo.init_app(app)` inside `create_app`. When
+used outside of an app, i.e from scripts or tests, it falls back to the
+defaults found in `Config`.
+
+Note: pymongo clients are not fork-safe. The client is created lazily and
+is tied to the pid that created it, so pre-fork WSGI servers (gunicorn, uwsgi)
+give each worker its own client and connection pool.
+"""
+
+import os
+import atexit
+import threading
+from flask import Flask
+from pymongo import MongoClient
+from pymongo.database import Database
+from config import Config
+
+class MongoRegistry:
+    """Holds one `MongoClient` per process.
+
+    Attributes:
+        uri (str): The mongodb connection string.
+        db_name (str): The name of the database holding all collections.
+        options (dict): Keyword arguments passed to `MongoClient`,
+            e.g pool size and timeouts.
+    """
+    __slots__ = ("uri", "db_name", "options", "_client", "_pid", "_lock")
+
+    def __init__(self, app: Flask | None = None):
+        config = Config()
+        self.uri, self.db_name = config.mongo_uri, config.mongo_db_name
+        self.options = self._client_options(
+            max_pool_size=config.mongo_max_pool_size,
+            min_pool_size=config.mongo_min_pool_size,
+            server_selection_timeout_ms=config.mongo_server_selection_timeout_ms,
+            connect_timeout_ms=config.mongo_connect_timeout_ms,
+            socket_timeout_ms=config.mongo_socket_timeout_ms,
+            wait_queue_timeout_ms=config.mongo_wait_queue_timeout_ms,
+        )
+        self._client, self._pid = None, None
+        self._lock = threading.Lock()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+        atexit.register(self.close)
+        if app is not None:
+            self.init_app(app)
+
+    @staticmethod
+    def _client_options(
+        max_pool_size: int,
+        min_pool_size: int,
+        server_selection_timeout_ms: int,
+        connect_timeout_ms: int,
+        socket_timeout_ms: int | None,
+        wait_queue_timeout_ms: int | None,
+    ) -> dict:
+        """Map the registry settings to `MongoClient` keyword arguments"""
+        return {
+            "maxPoolSize": max_pool_size,
+            "minPoolSize": min_pool_size,
+            "serverSelectionTimeoutMS": server_selection_timeout_ms,
+            "connectTimeoutMS": connect_timeout_ms,
+            "socketTimeoutMS": socket_timeout_ms,
+            "waitQueueTimeoutMS": wait_queue_timeout_ms,
+        }
+
+    def init_app(self, app: Flask) -> None:
+        """Configure the registry from a flask app's config.
+
+        Any MONGO_* keys missing from `app.config` are
+        set to the registry's current values.
+
+        Args:
+            app (Flask): The app to configure the registry with
+        """
+        options = self.options
+        config = app.config
+        config.setdefault("MONGO_URI", self.uri)
+        config.setdefault("MONGO_DB_NAME", self.db_name)
+        config.setdefault("MONGO_MAX_POOL_SIZE", options["maxPoolSize"])
+        config.setdefault("MONGO_MIN_POOL_SIZE", options["minPoolSize"])
+        config.setdefault(
+            "MONGO_SERVER_SELECTION_TIMEOUT_MS", options["serverSelectionTimeoutMS"]
+        )
+        config.setdefault("MONGO_CONNECT_TIMEOUT_MS", options["connectTimeoutMS"])
+        config.setdefault("MONGO_SOCKET_TIMEOUT_MS", options["socketTimeoutMS"])
+        config.setdefault("MONGO_WAIT_QUEUE_TIMEOUT_MS", options["waitQueueTimeoutMS"])
+        self.configure(
+            uri=config["MONGO_URI"],
+            db_name=config["MONGO_DB_NAME"],
+            **self._client_options(
+                max_pool_size=config["MONGO_MAX_POOL_SIZE"],
+                min_pool_size=config["MONGO_MIN_POOL_SIZE"],
+                server_selection_timeout_ms=config["MONGO_SERVER_SELECTION_TIMEOUT_MS"],
+                connect_timeout_ms=config["MONGO_CONNECT_TIMEOUT_MS"],
+                socket_timeout_ms=config["MONGO_SOCKET_TIMEOUT_MS"],
+                wait_queue_timeout_ms=config["MONGO_WAIT_QUEUE_TIMEOUT_MS"],
+            )
+        )
+        app.extensions["mongo"] = self
+
+    def configure(
+        self, uri: str | None = None, db_name: str | None = None, **options
+    ) -> None:
+        """Change the connection settings.
+
+        The current client, if any, is closed and a new one
+        is created with the new settings on next access.
+
+        Args:
+            uri (str): Optional. The mongodb connection string.
+            db_name (str): Optional. The database to use.
+            **options: Keyword arguments to update the `MongoClient` options with.
+        """
+        self.close()
+        self.uri = uri or self.uri
+        self.db_name = db_name or self.db_name
+        self.options = {**self.options, **options}
+
+    @property
+    def client(self) -> MongoClient:
+        """The `MongoClient` of the current process"""
+        client, pid = self._client, os.getpid()
+        if client is None or self._pid != pid:
+            with self._lock:
+                if self._client is None or self._pid != pid:
+                    self._client = MongoClient(self.uri, connect=False, **self.options)
+                    self._pid = pid
+                client = self._client
+        return client
+
+    @property
+    def db(self) -> Database:
+        """The database holding all collections"""
+        return self.client[self.db_name]
+
+    def close(self) -> None:
+        """Close the client and its connection pool.
+
+        A client inherited from a parent process is
+        never closed, it belongs to the parent.
+        """
+        with self._lock:
+            client, self._client = self._client, None
+            if client is not None and self._pid == os.getpid():
+                client.close()
+            self._pid = None
+
+    def _after_fork(self) -> None:
+        """Forget the parent's client in a forked child"""
+        self._lock = threading.Lock()
+        self._client, self._pid = None, None
+
+mongo = MongoRegistry()
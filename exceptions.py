@@ -107,3 +107,39 @@ class ResourceConflictError(ExceptionWithStatusCode):
     def __init__(self, *args: object) -> None:
         super().__init__(*args, status_code=409)
 
+class QueryRejectedError(ExceptionWithStatusCode):
+    """Error for queries too expensive to run.
+    
+    Raise this when a client supplied query breaks the
+    limits of `root.guards`, e.g it uses a stage that isn't 
+    allowed, or can't be served by an index.
+    
+    Attributes:
+        status_code: 422
+    """
+    def __init__(self, *args: object) -> None:
+        super().__init__(*args, status_code=422)
+        
+class QueryTimeoutError(ExceptionWithStatusCode):
+    """Error for queries that ran out of time.
+    
+    Raise this when a query exceeds its `maxTimeMS`.
+    
+    Attributes:
+        status_code: 504
+    """
+    def __init__(self, *args: object) -> None:
+        super().__init__(*args, status_code=504)
+        
+class FileValidationError(ExceptionWithStatusCode):
+    """Error for uploaded files with invalid values.
+    
+    Raise this when rows of an uploaded file fail `root.validation`.
+    
+    Attributes:
+        status_code: 400
+        errors (dict): The errors of each column, see `ValidationReport.to_dict`
+    """
+    def __init__(self, *args: object, errors: dict | None = None) -> None:
+        self.errors = errors or {}
+        super().__init__(*args, status_code=400)
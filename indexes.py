@@ -0,0 +1,354 @@
+"""Declared mongodb indexes.
+
+Every index a query in `root/` depends on is declared here, next to the
+collection it belongs to. Nothing creates indexes implicitly, so a fresh
+deployment must run `flask --app app indexes create`. `create_app` also
+verifies the declarations on startup and logs a warning for every missing
+index, rather than letting queries silently fall back to collection scans.
+
+Note: When adding a query shape to a `Savior` class, declare its index here.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from pymongo import IndexModel, ASCENDING, DESCENDING, TEXT, MongoClient
+from pymongo.database import Database
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+INDEXES: dict[str, list[IndexModel]] = {
+    "logs": [
+        # Partner.logs, keyset pages, see root/pagination.py
+        IndexModel(
+            [("savior_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="savior_id_created_at_id"
+        ),
+        # Partner.get_file_logs, root.file_summaries.refresh
+        IndexModel([("source_file.id", ASCENDING)], name="source_file_id"),
+        # Savior.get_data date ranges
+        IndexModel(
+            [("savior_id", ASCENDING), ("source_file.upload_date", ASCENDING)],
+            name="savior_id_upload_date"
+        ),
+    ],
+    "product_logs": [
+        # User.logs, User.get_times_logged, keyset pages, see root/pagination.py
+        IndexModel(
+            [("savior_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="savior_id_created_at_id"
+        ),
+        # Partner.unpublish_product
+        IndexModel([("product_id", ASCENDING)], name="product_id"),
+    ],
+    "products": [
+        # Partner.get_own_product
+        IndexModel(
+            [("savior_id", ASCENDING), ("product_id", ASCENDING)],
+            name="savior_id_product_id"
+        ),
+        # Partner.get_product for published products
+        IndexModel([("product_id", ASCENDING)], name="product_id"),
+    ],
+    "product_rollups": [
+        # Partner.get_products
+        IndexModel(
+            [
+                ("savior_id", ASCENDING), 
+                ("last_update", DESCENDING), 
+                ("created_at", DESCENDING),
+            ],
+            name="savior_id_last_update_created_at"
+        ),
+    ],
+    "tasks": [
+        # Partner.get_tasks
+        IndexModel(
+            [("savior_id", ASCENDING), ("created_at", ASCENDING)],
+            name="savior_id_created_at"
+        ),
+    ],
+    "stars": [
+        # User.handle_stars
+        IndexModel(
+            [("savior_id", ASCENDING), ("resource_id", ASCENDING)],
+            name="savior_id_resource_id"
+        ),
+        # User.starred_products, keyset pages, see root/pagination.py
+        IndexModel(
+            [("savior_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="savior_id_created_at_id"
+        ),
+    ],
+    "emission_factors": [
+        # Savior.collection_text_search
+        IndexModel(
+            [("name", TEXT), ("keywords", TEXT), ("activity", TEXT)],
+            name="text_search",
+            weights={"name": 10, "keywords": 5, "activity": 1},
+        ),
+        # User.log_product_emissions
+        IndexModel([("product_id", ASCENDING)], name="product_id", sparse=True),
+        # /products search without a query, sorted by last_update
+        IndexModel(
+            [("last_update", DESCENDING), ("_id", DESCENDING)],
+            name="products_last_update_id",
+            partialFilterExpression={"product_id": {"$exists": True}},
+        ),
+        # Partner.get_partner
+        IndexModel(
+            [("savior_id", ASCENDING), ("created_at", DESCENDING)],
+            name="savior_id_created_at"
+        ),
+    ],
+    "emission_rollups": [
+        # root.emission_rollups, the key of a bucket and Savior.get_emissions
+        IndexModel(
+            [
+                ("savior_id", ASCENDING), 
+                ("granularity", ASCENDING), 
+                ("period", ASCENDING),
+                ("scope", ASCENDING),
+                ("category", ASCENDING),
+                ("ghg_category", ASCENDING),
+                ("team", ASCENDING),
+            ],
+            name="savior_id_granularity_period_dimensions",
+            unique=True,
+        ),
+    ],
+    "query_jobs": [
+        # root.jobs, jobs are removed once they expire
+        IndexModel(
+            [("expires_at", ASCENDING)], name="expires_at", expireAfterSeconds=0
+        ),
+        # root.jobs.get
+        IndexModel([("savior_id", ASCENDING)], name="savior_id"),
+    ],
+    "query_job_results": [
+        # root.jobs.results
+        IndexModel(
+            [("job_id", ASCENDING), ("page", ASCENDING)], 
+            name="job_id_page", 
+            unique=True,
+        ),
+        IndexModel(
+            [("expires_at", ASCENDING)], name="expires_at", expireAfterSeconds=0
+        ),
+    ],
+    "ingest_jobs": [
+        # root.ingest_jobs, jobs are removed once they expire
+        IndexModel(
+            [("expires_at", ASCENDING)], name="expires_at", expireAfterSeconds=0
+        ),
+        # root.ingest_jobs.get
+        IndexModel([("savior_id", ASCENDING)], name="savior_id"),
+    ],
+    "ingest_uploads.files": [
+        # root.ingest_jobs, uploads of jobs that never ran are removed once expired
+        IndexModel([("metadata.expires_at", ASCENDING)], name="metadata_expires_at"),
+        # created by GridFS on the first upload
+        IndexModel(
+            [("filename", ASCENDING), ("uploadDate", ASCENDING)], 
+            name="filename_1_uploadDate_1",
+        ),
+    ],
+    "ingest_uploads.chunks": [
+        # created by GridFS on the first upload
+        IndexModel(
+            [("files_id", ASCENDING), ("n", ASCENDING)], name="files_id_1_n_1", unique=True
+        ),
+    ],
+    "files": [
+        # Partner.files
+        IndexModel(
+            [
+                ("savior_id", ASCENDING), 
+                ("needs_processing", ASCENDING), 
+                ("upload_date", DESCENDING),
+            ],
+            name="savior_id_needs_processing_upload_date"
+        ),
+    ],
+    "partners": [
+        # api.helpers.login
+        IndexModel([("email", ASCENDING)], name="email"),
+        # api.helpers.check_email_availability
+        IndexModel([("company_email", ASCENDING)], name="company_email"),
+        # company tree, users and teams
+        IndexModel([("company_id", ASCENDING)], name="company_id"),
+        # api.helpers.create_account relies on a DuplicateKeyError
+        IndexModel([("username", ASCENDING)], name="username", unique=True),
+    ],
+    "users": [
+        # api.helpers.login, api.helpers.create_account
+        IndexModel([("username", ASCENDING)], name="username", unique=True),
+        IndexModel([("email", ASCENDING)], name="email"),
+    ],
+}
+
+# index options that change what an index does, and so must match
+_COMPARED_OPTIONS = ("unique", "sparse", "weights", "partialFilterExpression")
+
+@dataclass(slots=True)
+class IndexDiff:
+    """The difference between declared and existing indexes of a collection
+
+    Attributes:
+        missing (list): Names of declared indexes that don't exist.
+        mismatched (list): Names of declared indexes that exist
+            with different keys or options.
+        undeclared (list): Names of existing indexes that aren't declared.
+    """
+    missing: list[str] = field(default_factory=list)
+    mismatched: list[str] = field(default_factory=list)
+    undeclared: list[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.missing or self.mismatched or self.undeclared)
+
+def _is_text(key: list[tuple]) -> bool:
+    return any(direction == TEXT for _, direction in key)
+
+def _normalize(spec: dict) -> dict:
+    """Turn an index spec into a comparable dict.
+
+    Text indexes are stored by mongodb with `_fts` keys,
+    and their fields are found in `weights` instead.
+    """
+    raw_key = list(
+        spec["key"].items() if isinstance(spec["key"], dict) else spec["key"]
+    )
+    options = {
+        option: spec[option] for option in _COMPARED_OPTIONS if spec.get(option)
+    }
+    if _is_text(raw_key) or any(k == "_fts" for k, _ in raw_key):
+        options.setdefault(
+            "weights", {k: 1 for k, direction in raw_key if direction == TEXT}
+        )
+        return {"key": [("_fts", TEXT)], **options}
+    key = [
+        (k, int(v) if isinstance(v, (int, float)) else v) for k, v in raw_key
+    ]
+    return {"key": key, **options}
+
+def diff_collection(db: Database, collection_name: str) -> IndexDiff:
+    """Compare a collection's existing indexes to its declared ones.
+
+    Args:
+        db (Database): The database holding the collection.
+        collection_name (str): The name of the collection.
+
+    Returns:
+        An `IndexDiff` for the collection
+    """
+    existing = {
+        name: _normalize(spec)
+        for name, spec in db[collection_name].index_information().items()
+        if name != "_id_"
+    }
+    diff = IndexDiff()
+    declared_names = set()
+    for model in INDEXES.get(collection_name, []):
+        document = model.document
+        name = document["name"]
+        declared_names.add(name)
+        declared = _normalize(document)
+        if name in existing:
+            if existing[name] != declared:
+                diff.mismatched.append(name)
+        elif declared not in existing.values():
+            diff.missing.append(name)
+        else:
+            # same index, created under a different name
+            declared_names.update(
+                _name for _name, spec in existing.items() if spec == declared
+            )
+    diff.undeclared = sorted(existing.keys() - declared_names)
+    return diff
+
+def diff_indexes(db: Database) -> dict[str, IndexDiff]:
+    """Compare all declared indexes to the existing ones.
+
+    Args:
+        db (Database): The database to compare.
+
+    Returns:
+        A dict of collection names mapped to their `IndexDiff`
+    """
+    return {name: diff_collection(db, name) for name in INDEXES}
+
+def create_indexes(
+    db: Database,
+    drop_mismatched: bool = False,
+    collections: list[str] | None = None,
+) -> dict[str, list[str]]:
+    """Create all missing declared indexes.
+
+    Creating an index that already exists is a no-op for mongodb,
+    so only missing indexes are sent to the server.
+
+    Args:
+        db (Database): The database to create indexes in.
+        drop_mismatched (bool): Whether to drop and recreate indexes
+            that exist with different keys or options. Defaults to False.
+        collections (list): Optional. Only create indexes of these collections.
+
+    Returns:
+        A dict of collection names mapped to the names of the created indexes
+    """
+    created = {}
+    for collection_name in collections or INDEXES:
+        diff = diff_collection(db, collection_name)
+        collection = db[collection_name]
+        to_create = set(diff.missing)
+        if drop_mismatched:
+            for name in diff.mismatched:
+                collection.drop_index(name)
+            to_create.update(diff.mismatched)
+        models = [
+            model for model in INDEXES[collection_name]
+            if model.document["name"] in to_create
+        ]
+        if models:
+            created[collection_name] = collection.create_indexes(models)
+    return created
+
+def verify_indexes(
+    uri: str, db_name: str, timeout_ms: int = 2000
+) -> bool:
+    """Warn about any missing or mismatched declared indexes.
+
+    Meant to run on startup. It uses its own short-lived client
+    so that an unreachable server does not stall startup, and so that
+    the shared client isn't created before WSGI servers fork.
+
+    Args:
+        uri (str): The mongodb connection string.
+        db_name (str): The name of the database to verify.
+        timeout_ms (int): How long to wait for the server.
+
+    Returns:
+        True if all declared indexes exist as declared
+    """
+    client = MongoClient(uri, serverSelectionTimeoutMS=timeout_ms)
+    try:
+        diffs = diff_indexes(client[db_name])
+    except PyMongoError as e:
+        logger.warning("Could not verify mongodb indexes: %s", e)
+        return False
+    finally:
+        client.close()
+    verified = True
+    for collection_name, diff in diffs.items():
+        for name in diff.missing:
+            verified = False
+            logger.warning("Missing index %s.%s", collection_name, name)
+        for name in diff.mismatched:
+            verified = False
+            logger.warning(
+                "Index %s.%s does not match its declaration", collection_name, name
+            )
+    if not verified:
+        logger.warning("Run `flask --app app indexes create` to create indexes")
+    return verified
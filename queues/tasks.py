@@ -1,5 +1,16 @@
 from celery import shared_task
+from bson import ObjectId
 
 @shared_task(ignore_result=False)
 def add(a: int, b: int) -> int:
-    return a + b
\ No newline at end of file
+    return a + b
+
+@shared_task(ignore_result=True)
+def run_query_job(job_id: str) -> None:
+    from root import jobs
+    jobs.run(ObjectId(job_id))
+
+@shared_task(ignore_result=True)
+def run_ingest_job(job_id: str) -> None:
+    from root import ingest_jobs
+    ingest_jobs.run(ObjectId(job_id))
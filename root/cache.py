@@ -0,0 +1,88 @@
+"""In-process caches.
+
+Note: Each WSGI worker process holds its own caches, invalidating an entry
+only affects the process that performed the write. Other workers may serve
+the entry until it expires, so keep ttls short for data that must be fresh.
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+_MISSING = object()
+
+class TTLCache:
+    """A thread-safe, least recently used cache with expiring entries.
+
+    Attributes:
+        ttl (float): How many seconds an entry lives. When 0 or less,
+            the cache is disabled, it stores nothing and always misses.
+        maxsize (int): The max number of entries, the least recently
+            used entry is evicted when full.
+    """
+    __slots__ = ("ttl", "maxsize", "_entries", "_lock")
+
+    def __init__(self, ttl: float, maxsize: int = 1024):
+        self.ttl, self.maxsize = ttl, maxsize
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get an entry.
+
+        Args:
+            key (Hashable): The key of the entry.
+            default (Any): What to return when the entry
+                is missing or expired.
+        """
+        if not self.enabled:
+            return default
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Add or replace an entry"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_or_set(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """Get an entry, or create it with `factory` when missing.
+
+        `None` results of `factory` are not cached.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            if value is not None:
+                self.set(key, value)
+        return value
+
+    def pop(self, key: Hashable) -> None:
+        """Remove an entry, if present"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
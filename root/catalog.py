@@ -0,0 +1,274 @@
+"""Named dashboard queries.
+
+Dashboards run the same few aggregations with different date ranges.
+Rather than sending their pipelines to /saviors/data, they run a
+`NamedQuery` of `CATALOG` by name, with typed parameters:
+
+    GET /saviors/queries/emissions_by_month?start=2024-01-01&scope=2
+
+Parameters are parsed and checked against their `Param`, and the query's
+pipeline is built from them. Every query is checked by `root.guards` once
+when it's registered, so a catalog query is never rejected at request time.
+Queries run through `Savior.get_data_cursor`, which scopes them to the
+savior, with the index of their `hint`, and their results are cached per
+parameter set, see `root.data_cache`.
+
+New queries are added with `register`.
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable
+from exceptions import InvalidRequestDataError, ResourceNotFoundError
+from root import guards
+import indexes
+
+@dataclass(frozen=True, slots=True)
+class Param:
+    """A parameter of a named query.
+
+    Attributes:
+        type (type): One of datetime, int or str, values are parsed to it.
+        description (str): What the parameter does.
+        default (Any): The value when it's not given, None leaves it out.
+        minimum (int): Optional. The smallest value of an int parameter.
+        maximum (int): Optional. The largest value of an int parameter.
+    """
+    type: type
+    description: str
+    default: Any = None
+    minimum: int | None = None
+    maximum: int | None = None
+
+    def parse(self, name: str, value: Any) -> Any:
+        """Parse a value of the parameter, e.g from a query string.
+
+        Raises:
+            InvalidRequestDataError: When the value isn't valid.
+        """
+        if self.type is datetime:
+            if isinstance(value, str):
+                try:
+                    value = datetime.fromisoformat(value)
+                except ValueError as e:
+                    raise InvalidRequestDataError(
+                        f"{name} must be an ISO8601 date"
+                    ) from e
+            if not isinstance(value, datetime):
+                raise InvalidRequestDataError(f"{name} must be an ISO8601 date")
+            return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+        if self.type is int:
+            try:
+                value = int(value)
+            except (TypeError, ValueError) as e:
+                raise InvalidRequestDataError(f"{name} must be an integer") from e
+            if (self.minimum is not None and value < self.minimum) or (
+                self.maximum is not None and value > self.maximum
+            ):
+                raise InvalidRequestDataError(
+                    f"{name} must be from {self.minimum} to {self.maximum}"
+                )
+            return value
+        return str(value)
+
+    def to_dict(self) -> dict:
+        return {
+            "type": {datetime: "date"}.get(self.type, self.type.__name__),
+            "description": self.description,
+            "default": self.default,
+        }
+
+@dataclass(frozen=True, slots=True)
+class NamedQuery:
+    """An aggregation of a collection, built from its parameters.
+
+    Attributes:
+        name (str): The name the query is run by.
+        description (str): What the query returns.
+        collection (str): The collection aggregated.
+        build (Callable): Returns the pipeline given the parsed parameters.
+            The first stage must be a $match, the savior's filters are added to it.
+        params (dict): The query's parameters by name.
+        hint (str): Optional. The name of the index the query should use.
+    """
+    name: str
+    description: str
+    collection: str
+    build: Callable[[dict], list]
+    params: dict[str, Param] = field(default_factory=dict)
+    hint: str | None = None
+
+    def parse_params(self, values: dict) -> dict:
+        """Parse the query's parameters, ignoring unknown ones.
+
+        Raises:
+            InvalidRequestDataError: When a value is invalid.
+        """
+        return {
+            name: param.parse(name, values[name]) if name in values else param.default
+            for name, param in self.params.items()
+        }
+
+    def pipeline(self, values: dict) -> list:
+        """Build the pipeline of the query from unparsed parameter values"""
+        return self.build(self.parse_params(values))
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "description": self.description,
+            "params": {name: param.to_dict() for name, param in self.params.items()},
+        }
+
+CATALOG: dict[str, NamedQuery] = {}
+
+def register(query: NamedQuery) -> NamedQuery:
+    """Add a query to `CATALOG`, checking its pipeline with `root.guards`.
+
+    Raises:
+        QueryRejectedError: When the query's pipeline breaks the guards' limits.
+        ValueError: When its hint isn't a declared index of its collection.
+    """
+    if query.hint is not None and query.hint not in {
+        model.document["name"] for model in indexes.INDEXES.get(query.collection, [])
+    }:
+        raise ValueError(f"{query.hint} isn't a declared index of {query.collection}")
+    pipeline = query.build(
+        {name: param.default for name, param in query.params.items()}
+    )
+    guards.check_pipeline(query.collection, pipeline)
+    CATALOG[query.name] = query
+    return query
+
+def get(name: str) -> NamedQuery:
+    """Get a query of the catalog.
+
+    Raises:
+        ResourceNotFoundError: When there's no query named `name`.
+    """
+    try:
+        return CATALOG[name]
+    except KeyError as e:
+        raise ResourceNotFoundError(f"No query named {name}") from e
+
+def _date_range(field: str, params: dict) -> dict:
+    """A $match filter of `field` between the start and end params"""
+    date_range = {}
+    if params.get("start") is not None:
+        date_range["$gte"] = params["start"]
+    if params.get("end") is not None:
+        date_range["$lt"] = params["end"]
+    return {field: date_range} if date_range else {}
+
+def _log_match(params: dict) -> dict:
+    match = _date_range("source_file.upload_date", params)
+    if params.get("scope") is not None:
+        match["scope"] = params["scope"]
+    return {"$match": match}
+
+DATE_PARAMS = {
+    "start": Param(datetime, "Only emissions uploaded at or after this date"),
+    "end": Param(datetime, "Only emissions uploaded before this date"),
+}
+
+register(
+    NamedQuery(
+        name="emissions_by_month",
+        description="The co2e and number of logs uploaded each month, oldest first",
+        collection="logs",
+        params={**DATE_PARAMS, "scope": Param(str, "Only emissions of this scope")},
+        build=lambda params: [
+            _log_match(params),
+            {
+                "$group": {
+                    "_id": {
+                        "$dateTrunc": {"date": "$source_file.upload_date", "unit": "month"}
+                    },
+                    "co2e": {"$sum": "$co2e"},
+                    "count": {"$sum": 1},
+                }
+            },
+            {"$project": {"_id": 0, "month": "$_id", "co2e": 1, "count": 1}},
+            {"$sort": {"month": 1}},
+        ],
+        hint="savior_id_upload_date",
+    )
+)
+
+register(
+    NamedQuery(
+        name="emissions_by_scope",
+        description="The co2e and number of logs of each scope",
+        collection="logs",
+        params=DATE_PARAMS,
+        build=lambda params: [
+            _log_match(params),
+            {"$group": {"_id": "$scope", "co2e": {"$sum": "$co2e"}, "count": {"$sum": 1}}},
+            {"$project": {"_id": 0, "scope": "$_id", "co2e": 1, "count": 1}},
+            {"$sort": {"scope": 1}},
+        ],
+        hint="savior_id_upload_date",
+    )
+)
+
+register(
+    NamedQuery(
+        name="emissions_by_category",
+        description="The co2e and number of logs of each category",
+        collection="logs",
+        params={**DATE_PARAMS, "scope": Param(str, "Only emissions of this scope")},
+        build=lambda params: [
+            _log_match(params),
+            {"$group": {"_id": "$category", "co2e": {"$sum": "$co2e"}, "count": {"$sum": 1}}},
+            {"$project": {"_id": 0, "category": "$_id", "co2e": 1, "count": 1}},
+            {"$sort": {"co2e": -1}},
+        ],
+        hint="savior_id_upload_date",
+    )
+)
+
+register(
+    NamedQuery(
+        name="top_activities",
+        description="The activities that emitted the most co2e",
+        collection="logs",
+        params={
+            **DATE_PARAMS,
+            "scope": Param(str, "Only emissions of this scope"),
+            "limit": Param(int, "The number of activities", default=10, minimum=1, maximum=100),
+        },
+        build=lambda params: [
+            _log_match(params),
+            {"$group": {"_id": "$activity", "co2e": {"$sum": "$co2e"}, "count": {"$sum": 1}}},
+            {"$sort": {"co2e": -1}},
+            {"$limit": params["limit"]},
+            {"$project": {"_id": 0, "activity": "$_id", "co2e": 1, "count": 1}},
+        ],
+        hint="savior_id_upload_date",
+    )
+)
+
+register(
+    NamedQuery(
+        name="product_emissions_by_month",
+        description="The co2e and number of products logged each month, oldest first",
+        collection="product_logs",
+        params={
+            "start": Param(datetime, "Only products logged at or after this date"),
+            "end": Param(datetime, "Only products logged before this date"),
+        },
+        build=lambda params: [
+            {"$match": _date_range("created_at", params)},
+            {
+                "$group": {
+                    "_id": {"$dateTrunc": {"date": "$created_at", "unit": "month"}},
+                    "co2e": {"$sum": "$co2e"},
+                    "count": {"$sum": 1},
+                }
+            },
+            {"$project": {"_id": 0, "month": "$_id", "co2e": 1, "count": 1}},
+            {"$sort": {"month": 1}},
+        ],
+        hint="savior_id_created_at_id",
+    )
+)
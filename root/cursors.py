@@ -0,0 +1,187 @@
+"""Open server cursors of /saviors/data queries, continued in batches.
+
+Large exports and infinite scrolling tables read a query's results a
+batch at a time. Rather than running the query again with a $skip for
+every batch, the first batch is returned with an opaque cursor id, and
+later batches are read from the same server cursor with getMore:
+
+    {"results": [...], "cursor": "Xb2k..."}
+
+`cursor` is None once the results are exhausted. A cursor is closed when
+it's exhausted, closed by its savior, idle for `CURSOR_IDLE_TTL` seconds,
+or when its savior opens more than `CURSOR_MAX_PER_SAVIOR` cursors, the
+least recently used one is closed then.
+
+Note: Cursors belong to the process that opened them, like `root.cache`,
+so when running more than one WSGI worker, requests continuing a cursor must
+be routed to the same worker, e.g with sticky sessions. Unknown cursors
+raise `ResourceNotFoundError`, and the query can be run again.
+
+Settings, see `config.Config`:
+    CURSOR_IDLE_TTL (float): Seconds an unused cursor stays open.
+    CURSOR_MAX_PER_SAVIOR (int): The most cursors a savior can keep open.
+    CURSOR_MAX_BATCH_SIZE (int): The largest batch that can be requested.
+"""
+
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from itertools import islice
+from typing import Hashable, Iterator
+from config import Config
+from exceptions import InvalidRequestDataError, ResourceNotFoundError
+
+config = Config()
+
+class _OpenCursor:
+    """A registered cursor, see `open_cursor`"""
+    __slots__ = ("savior_id", "documents", "batch_size", "last_used", "lock")
+
+    def __init__(self, savior_id: str, documents: Iterator, batch_size: int):
+        self.savior_id, self.documents = savior_id, documents
+        self.batch_size, self.last_used = batch_size, time.monotonic()
+        self.lock = threading.Lock()
+
+    def close(self) -> None:
+        close = getattr(self.documents, "close", None)
+        if close is not None:
+            close()
+
+# least recently used first
+_cursors: OrderedDict[str, _OpenCursor] = OrderedDict()
+_cursors_lock = threading.Lock()
+
+def validate_batch_size(batch_size: int) -> int:
+    """Assert a batch size is an integer between 1 and `CURSOR_MAX_BATCH_SIZE`.
+
+    Raises:
+        InvalidRequestDataError: When it isn't
+    """
+    if (
+        not isinstance(batch_size, int)
+        or isinstance(batch_size, bool)
+        or not 0 < batch_size <= config.cursor_max_batch_size
+    ):
+        raise InvalidRequestDataError(
+            f"batch_size must be an integer from 1 to {config.cursor_max_batch_size}"
+        )
+    return batch_size
+
+def _close_all(cursors: list[_OpenCursor]) -> None:
+    """Close unregistered cursors, once they aren't being read"""
+    for cursor in cursors:
+        with cursor.lock:
+            cursor.close()
+
+def _pop_idle(now: float) -> list[_OpenCursor]:
+    """Unregister cursors idle for longer than `CURSOR_IDLE_TTL`, call with the lock"""
+    idle = []
+    for cursor_id, cursor in list(_cursors.items()):
+        if now - cursor.last_used <= config.cursor_idle_ttl:
+            break  # the rest were used more recently
+        idle.append(_cursors.pop(cursor_id))
+    return idle
+
+def _read_batch(cursor_id: str, cursor: _OpenCursor, batch_size: int) -> dict:
+    """Read a batch from a cursor, unregistering it when exhausted or failed"""
+    try:
+        results = list(islice(cursor.documents, batch_size))
+    except Exception:
+        _unregister(cursor_id)
+        cursor.close()
+        raise
+    if len(results) < batch_size:
+        _unregister(cursor_id)
+        cursor.close()
+        cursor_id = None
+    return {"results": results, "cursor": cursor_id}
+
+def _unregister(cursor_id: str | None) -> None:
+    """Remove a cursor from the registry, without closing it"""
+    with _cursors_lock:
+        _cursors.pop(cursor_id, None)
+
+def open_cursor(savior_id: Hashable, documents: Iterator, batch_size: int) -> dict:
+    """Read the first batch of a query, keeping its cursor open for the rest.
+
+    Args:
+        savior_id (Hashable): The savior who ran the query.
+        documents (Iterator): The query's results, see `Savior.get_data_cursor`.
+        batch_size (int): The number of results per batch.
+
+    Returns:
+        A dict with fields: results, the first batch, and cursor,
+        the id to read the next batch with, None when exhausted
+
+    Raises:
+        InvalidRequestDataError: When the batch size is invalid.
+    """
+    batch_size = validate_batch_size(batch_size)
+    cursor_id = secrets.token_urlsafe(16)
+    cursor = _OpenCursor(str(savior_id), documents, batch_size)
+    now = time.monotonic()
+    with _cursors_lock:
+        to_close = _pop_idle(now)
+        _cursors[cursor_id] = cursor
+        owned = [key for key, c in _cursors.items() if c.savior_id == cursor.savior_id]
+        for key in owned[:-config.cursor_max_per_savior]:
+            to_close.append(_cursors.pop(key))
+    _close_all(to_close)
+    with cursor.lock:
+        return _read_batch(cursor_id, cursor, batch_size)
+
+def next_batch(
+    savior_id: Hashable, cursor_id: str, batch_size: int | None = None
+) -> dict:
+    """Read the next batch of an open cursor.
+
+    Args:
+        savior_id (Hashable): The savior who opened the cursor.
+        cursor_id (str): The id returned with the previous batch.
+        batch_size (int): Optional. Defaults to the size of the first batch.
+
+    Returns:
+        A dict with fields: results and cursor, see `open_cursor`
+
+    Raises:
+        ResourceNotFoundError: When the savior has no such cursor, e.g it expired.
+        InvalidRequestDataError: When the batch size is invalid.
+    """
+    now = time.monotonic()
+    with _cursors_lock:
+        to_close = _pop_idle(now)
+        cursor = _cursors.get(cursor_id)
+        if cursor is not None and cursor.savior_id == str(savior_id):
+            cursor.last_used = now
+            _cursors.move_to_end(cursor_id)
+        else:
+            cursor = None
+    _close_all(to_close)
+    if cursor is None:
+        raise ResourceNotFoundError(
+            f"No open cursor with id {cursor_id}, it may have expired, run the query again"
+        )
+    batch_size = cursor.batch_size if batch_size is None else validate_batch_size(batch_size)
+    with cursor.lock:
+        return _read_batch(cursor_id, cursor, batch_size)
+
+def close_cursor(savior_id: Hashable, cursor_id: str) -> bool:
+    """Close one of a savior's open cursors.
+
+    Returns:
+        Whether the cursor was open
+    """
+    with _cursors_lock:
+        cursor = _cursors.get(cursor_id)
+        if cursor is None or cursor.savior_id != str(savior_id):
+            return False
+        del _cursors[cursor_id]
+    with cursor.lock:
+        cursor.close()
+    return True
+
+def num_open(savior_id: Hashable) -> int:
+    """The number of cursors a savior has open"""
+    with _cursors_lock:
+        return sum(cursor.savior_id == str(savior_id) for cursor in _cursors.values())
@@ -0,0 +1,166 @@
+"""Versioned cache of /saviors/data results.
+
+Dashboards repeat the same few find filters and aggregation pipelines
+with `Savior.get_data`. Their results are cached per savior, collection
+and canonical form of the query, see `canonicalize`.
+
+Every key also holds the current data version of the savior's collection.
+Write paths `bump` the versions of the collections they write to, which
+makes all entries read before the write unreachable at once. Entries
+are only set once their results are completely read, and the versions
+they are set under are those from before the query ran, so a result that
+raced a write is never reachable.
+
+Versions are documents of the `data_versions` collection, shared by every
+WSGI worker, `{"_id": "<savior_id>/<collection>", "version": 3}`, so a
+write made by any worker makes stale entries of all workers unreachable.
+Entries themselves live in the process, see `root.cache`. Hits therefore
+aren't free of mongodb: every lookup, hits included, first reads the two
+versions of the collection by _id. Keeping versions in the process would
+need a change stream, which standalone servers don't have, or another
+broker to push writes of other workers, and polling them would let stale
+entries be served. A find by _id is cheap next to the query a hit saves.
+Versions aren't written while the cache is disabled.
+
+Settings, see `config.Config`:
+    DATA_CACHE_TTL (float): Seconds an entry lives, 0 disables the cache.
+    DATA_CACHE_SIZE (int): The max number of entries.
+    DATA_CACHE_MAX_DOCUMENTS (int): Larger results aren't cached.
+"""
+
+from typing import Any, Callable, Hashable, Iterable, Iterator
+from bson import json_util
+from bson.json_util import CANONICAL_JSON_OPTIONS
+from pymongo import UpdateOne
+from config import Config
+from database import mongo
+from root.cache import TTLCache
+
+config = Config()
+
+_MISSING = object()
+
+# versions of collections of all saviors, for writes to other saviors' data
+ALL_SAVIORS = "*"
+
+_cache = TTLCache(ttl=config.data_cache_ttl, maxsize=config.data_cache_size)
+
+def _version_id(owner: str, collection: str) -> str:
+    """The _id of a version document of `data_versions`"""
+    return f"{owner}/{collection}"
+
+def bump(savior_id: Hashable | None, *collections: str) -> None:
+    """Make cached results of collections unreachable.
+
+    Args:
+        savior_id (Hashable): The savior whose data was written to,
+            or None when the write touched data of any savior.
+        collections (str): The names of the collections written to.
+    """
+    if not _cache.enabled or not collections:
+        return
+    owner = ALL_SAVIORS if savior_id is None else str(savior_id)
+    mongo.db.data_versions.bulk_write(
+        [
+            UpdateOne(
+                {"_id": _version_id(owner, collection)}, 
+                {"$inc": {"version": 1}}, 
+                upsert=True,
+            )
+            for collection in collections
+        ],
+        ordered=False,
+    )
+
+def version(savior_id: Hashable, collection: str) -> tuple[int, int]:
+    """The current data version of a savior's collection, read from mongodb"""
+    ids = (_version_id(ALL_SAVIORS, collection), _version_id(str(savior_id), collection))
+    versions = {
+        document["_id"]: document["version"]
+        for document in mongo.db.data_versions.find({"_id": {"$in": ids}})
+    }
+    return tuple(versions.get(_id, 0) for _id in ids)
+
+def _sorted_filters(filters: Any) -> Any:
+    # top level fields are and-ed, so their order doesn't matter,
+    # unlike the order of embedded documents, or $sort stages
+    return dict(sorted(filters.items())) if isinstance(filters, dict) else filters
+
+def canonicalize(query_type: str, filters: dict | list) -> str | None:
+    """The canonical form of a find filter or aggregation pipeline.
+
+    Queries that differ only in the order of their top level
+    filters, including those of $match stages, share the same form.
+    Values are tagged with their bson type, e.g "1" and 1 differ.
+
+    Args:
+        query_type (Literal[aggregate, find]): The type of query.
+        filters (dict | list): The find filter or pipeline.
+
+    Returns:
+        The canonical form, None if it can't be encoded
+    """
+    if query_type == "find":
+        canonical = _sorted_filters(filters)
+    else:
+        canonical = [
+            {"$match": _sorted_filters(stage["$match"])}
+            if isinstance(stage, dict) and stage.keys() == {"$match"} else stage
+            for stage in filters
+        ] if isinstance(filters, list) else filters
+    try:
+        return json_util.dumps(
+            [query_type, canonical], json_options=CANONICAL_JSON_OPTIONS
+        )
+    except (TypeError, ValueError):
+        return None
+
+def _collect(key: Hashable, documents: Iterable) -> Iterator:
+    """Yield documents, caching them if they are all read"""
+    results = []
+    try:
+        for document in documents:
+            if results is not None:
+                results.append(document)
+                if len(results) > config.data_cache_max_documents:
+                    results = None
+            yield document
+        if results is not None:
+            _cache.set(key, tuple(results))
+    finally:
+        close = getattr(documents, "close", None)
+        if close is not None:
+            close()
+
+def cached(
+    savior_id: Hashable,
+    collection: str,
+    query_type: str,
+    filters: dict | list,
+    query: Callable[[], Iterable],
+) -> Iterable:
+    """Get the results of a query, from the cache when possible.
+
+    Args:
+        savior_id (Hashable): The savior querying their data.
+        collection (str): The name of the collection queried.
+        query_type (Literal[aggregate, find]): The type of query.
+        filters (dict | list): The find filter or pipeline, as requested.
+        query (Callable): Runs the query, returns its cursor.
+
+    Returns:
+        A tuple of the results on hits, otherwise an iterator over the
+        query's cursor, the results are cached once it's exhausted
+    """
+    canonical = canonicalize(query_type, filters) if _cache.enabled else None
+    if canonical is None:
+        return query()
+    key = (str(savior_id), collection, version(savior_id, collection), canonical)
+    results = _cache.get(key, _MISSING)
+    if results is not _MISSING:
+        return results
+    return _collect(key, query())
+
+def clear() -> None:
+    """Remove all entries"""
+    _cache.clear()
@@ -0,0 +1,287 @@
+"""Time bucketed rollups of logged emissions.
+
+Dashboards chart a savior's co2e over time, grouped by scope, category,
+ghg_category or team. Aggregating every log for each chart is slow, so
+logs are also added to buckets in `emission_rollups`, one bucket per
+savior, granularity (day or month), period and dimensions:
+
+    {
+        "savior_id": ...,
+        "granularity": "month",
+        "period": datetime(2024, 5, 1),
+        "scope": 2,
+        "category": "electricity",
+        "ghg_category": None,
+        "team": "operations",
+        "co2e": 1520.5,
+        "count": 31,
+        "last_update": ...,
+    }
+
+`count` is the number of logs in a bucket, `co2e` their co2e total. A log is
+bucketed by the upload date of its file, `source_file.upload_date`, or its
+`created_at` if it has no file, in UTC.
+
+Paths that insert logs `record` them, and paths that change or delete
+logs record what they remove with a `sign` of -1, so buckets are only ever
+incremented. A year to date chart `read`s 12 monthly buckets per group rather
+than all of the year's logs. Buckets of existing logs are created with
+`flask --app app emissions backfill`, while nothing records logs, see
+`backfill`. Until it ran, buckets miss the logs from before rollups were
+kept, readers that need every log check `is_backfilled` first.
+"""
+
+from datetime import datetime, timezone
+from numbers import Number
+from typing import Iterable, Literal
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.database import Database
+from exceptions import InvalidRequestDataError, ResourceConflictError
+import indexes
+
+Granularity = Literal["day", "month"]
+
+GRANULARITIES = ("day", "month")
+
+# the fields buckets are keyed, and can be grouped, by
+DIMENSIONS = ("scope", "category", "ghg_category", "team")
+
+# the fields of a log `record` reads
+LOG_PROJECTION = {
+    "savior_id": 1,
+    "co2e": 1,
+    "created_at": 1,
+    "source_file.upload_date": 1,
+    **{dimension: 1 for dimension in DIMENSIONS},
+}
+
+# how many logs are read at a time when backfilling
+BACKFILL_BATCH_SIZE = 5000
+
+# the collection buckets are rebuilt in before replacing `emission_rollups`
+BACKFILL_COLLECTION = "emission_rollups_backfill"
+
+# the _id of the document of `backfills` set once a backfill finished
+BACKFILL_ID = "emission_rollups"
+
+# a backfill is never undone, so once seen it isn't read again
+_backfilled = False
+
+def _log_date(log: dict) -> datetime | None:
+    """The date a log is bucketed by, in UTC"""
+    date = (log.get("source_file") or {}).get("upload_date") or log.get("created_at")
+    if isinstance(date, str):
+        try:
+            date = datetime.fromisoformat(date)
+        except ValueError:
+            return None
+    if not isinstance(date, datetime):
+        return None
+    if date.tzinfo is None:
+        return date.replace(tzinfo=timezone.utc)
+    return date.astimezone(timezone.utc)
+
+def _periods(date: datetime) -> dict[str, datetime]:
+    """The start of the day and month buckets a date falls into"""
+    day = date.replace(hour=0, minute=0, second=0, microsecond=0)
+    return {"day": day, "month": day.replace(day=1)}
+
+def _accumulate(increments: dict, logs: Iterable[dict], sign: int) -> None:
+    """Add logs to the increments of their buckets, in place"""
+    for log in logs:
+        date = _log_date(log)
+        if date is None:
+            continue
+        co2e = log.get("co2e")
+        co2e = co2e if isinstance(co2e, Number) else 0
+        dimensions = tuple(log.get(dimension) for dimension in DIMENSIONS)
+        for granularity, period in _periods(date).items():
+            totals = increments.setdefault(
+                (log["savior_id"], granularity, period, *dimensions), [0, 0]
+            )
+            totals[0] += sign * co2e
+            totals[1] += sign
+
+def _write(db: Database, increments: dict, collection: str = "emission_rollups") -> int:
+    """Apply accumulated increments to their buckets"""
+    now = datetime.now(tz=timezone.utc)
+    writes = [
+        UpdateOne(
+            dict(zip(("savior_id", "granularity", "period", *DIMENSIONS), key)),
+            {"$inc": {"co2e": co2e, "count": count}, "$set": {"last_update": now}},
+            upsert=True,
+        )
+        for key, (co2e, count) in increments.items()
+        if co2e or count
+    ]
+    if not writes:
+        return 0
+    db[collection].bulk_write(writes, ordered=False)
+    return len(writes)
+
+def record(db: Database, logs: Iterable[dict], sign: Literal[1, -1] = 1) -> int:
+    """Add logs to, or remove them from, their buckets.
+
+    Logs of one write usually share a few buckets, so their increments
+    are summed first and each bucket is written once.
+
+    Args:
+        db (Database): The database holding `emission_rollups`.
+        logs (Iterable): The logs, each with its savior_id.
+        sign (Literal[1, -1]): 1 when the logs were inserted,
+            -1 when they were deleted or are about to be replaced.
+
+    Returns:
+        The number of buckets written
+    """
+    increments = {}
+    _accumulate(increments, logs, sign)
+    written = _write(db, increments)
+    if sign < 0 and written:
+        db.emission_rollups.delete_many(
+            {
+                "savior_id": {"$in": list({key[0] for key in increments})},
+                "count": {"$lte": 0},
+            }
+        )
+    return written
+
+def _parse_date(date: str | datetime | None, name: str) -> datetime | None:
+    """Parse an ISO8601 date of a range, naive dates are in UTC"""
+    if isinstance(date, str):
+        try:
+            date = datetime.fromisoformat(date)
+        except ValueError as e:
+            raise InvalidRequestDataError(f"Invalid {name} date: {date}") from e
+    if date is not None and date.tzinfo is None:
+        return date.replace(tzinfo=timezone.utc)
+    return date
+
+def read(
+    db: Database,
+    savior_id: ObjectId,
+    granularity: Granularity = "month",
+    start: str | datetime | None = None,
+    end: str | datetime | None = None,
+    group_by: Iterable[str] = (),
+    filters: dict | None = None,
+) -> list[dict]:
+    """Get a savior's emissions over time from their buckets.
+
+    Args:
+        db (Database): The database holding `emission_rollups`.
+        savior_id (ObjectId): The savior whose emissions to get.
+        granularity (Literal[day, month]): The size of the periods.
+        start (str | datetime): Optional. Only periods starting at
+            or after this date, an ISO8601 string or datetime.
+        end (str | datetime): Optional. Only periods starting before this date.
+        group_by (Iterable): Optional. Dimensions to group each period by,
+            any of scope, category, ghg_category and team.
+        filters (dict): Optional. Dimensions and the value they must equal.
+
+    Returns:
+        A list of periods, oldest first, each with their period, co2e,
+        count and the values of the `group_by` dimensions
+
+    Raises:
+        InvalidRequestDataError: When the granularity, a dimension
+            or a date is invalid.
+    """
+    if granularity not in GRANULARITIES:
+        raise InvalidRequestDataError(f"Invalid granularity: {granularity}")
+    group_by, filters = list(group_by), filters or {}
+    invalid = set(group_by).union(filters).difference(DIMENSIONS)
+    if invalid:
+        raise InvalidRequestDataError(
+            f"Invalid dimensions: {', '.join(sorted(invalid))}"
+        )
+    match = {"savior_id": savior_id, "granularity": granularity, **filters}
+    start, end = _parse_date(start, "start"), _parse_date(end, "end")
+    if start is not None or end is not None:
+        match["period"] = {}
+        if start is not None:
+            match["period"]["$gte"] = start
+        if end is not None:
+            match["period"]["$lt"] = end
+    return list(
+        db.emission_rollups.aggregate(
+            [
+                {"$match": match},
+                {
+                    "$group": {
+                        "_id": {
+                            "period": "$period",
+                            **{dimension: f"${dimension}" for dimension in group_by},
+                        },
+                        "co2e": {"$sum": "$co2e"},
+                        "count": {"$sum": "$count"},
+                    }
+                },
+                {
+                    "$project": {
+                        "_id": 0,
+                        "period": "$_id.period",
+                        **{dimension: f"$_id.{dimension}" for dimension in group_by},
+                        "co2e": 1,
+                        "count": 1,
+                    }
+                },
+                {"$sort": {"period": 1}},
+            ]
+        )
+    )
+
+def backfill(db: Database) -> int:
+    """Rebuild all buckets from the logs and product logs.
+
+    Buckets are built in `BACKFILL_COLLECTION`, which then replaces
+    `emission_rollups` by a rename, so reads never see missing buckets.
+    Logs recorded while the logs are read would be lost by the rename,
+    so run it while uploads and product logs are stopped. When buckets
+    were written or removed meanwhile, the rebuilt buckets are dropped
+    and existing ones kept.
+
+    Returns:
+        The number of buckets written
+
+    Raises:
+        ResourceConflictError: When logs were recorded during the backfill.
+    """
+    started_at = datetime.now(tz=timezone.utc)
+    num_buckets = db.emission_rollups.estimated_document_count()
+    rebuilt = db[BACKFILL_COLLECTION]
+    rebuilt.drop()
+    rebuilt.create_indexes(indexes.INDEXES["emission_rollups"])
+    increments = {}
+    for collection in ("logs", "product_logs"):
+        _accumulate(
+            increments,
+            db[collection].find({}, LOG_PROJECTION, batch_size=BACKFILL_BATCH_SIZE),
+            sign=1,
+        )
+    written = _write(db, increments, collection=BACKFILL_COLLECTION)
+    # every record sets last_update, unless it removes an emptied bucket
+    if (
+        db.emission_rollups.count_documents({"last_update": {"$gte": started_at}}, limit=1)
+        or db.emission_rollups.estimated_document_count() != num_buckets
+    ):
+        rebuilt.drop()
+        raise ResourceConflictError(
+            "Emissions were recorded during the backfill, "
+            "retry it while uploads and product logs are stopped"
+        )
+    rebuilt.rename("emission_rollups", dropTarget=True)
+    db.backfills.replace_one(
+        {"_id": BACKFILL_ID},
+        {"_id": BACKFILL_ID, "finished_at": datetime.now(tz=timezone.utc)},
+        upsert=True,
+    )
+    return written
+
+def is_backfilled(db: Database) -> bool:
+    """Whether buckets hold every log, i.e `backfill` ran once"""
+    global _backfilled
+    if not _backfilled:
+        _backfilled = db.backfills.find_one({"_id": BACKFILL_ID}) is not None
+    return _backfilled
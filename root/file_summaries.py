@@ -0,0 +1,170 @@
+"""Per-file summaries of uploaded emission files.
+
+Every uploaded file inserts its rows to `logs`, and a summary document
+to `files`, keyed by the file's id (`source_file.id` of its logs). Listing
+files reads these few summaries instead of grouping all of a partner's logs.
+
+A summary holds the file's name, upload_date, row count (num_rows), co2e
+total, processed and unprocessed row counts and needs_processing, which is
+true while any row is unprocessed, i.e has no co2e.
+
+Summaries are written on upload from the logs in memory, see `summarize`.
+Paths that change existing logs, e.g calculating emissions, `refresh`
+the summaries of the files they touched from the logs of those files.
+Existing logs can be summarized with `flask --app app files backfill`.
+"""
+
+from datetime import datetime
+from numbers import Number
+from bson import ObjectId
+from pymongo import ReplaceOne, DeleteOne
+from pymongo.database import Database
+
+def summarize(
+    file_id: ObjectId,
+    savior_id: ObjectId,
+    name: str | None,
+    upload_date: datetime,
+    logs: list[dict],
+) -> dict:
+    """Create the summary of a file from its logs.
+
+    Args:
+        file_id (ObjectId): The id of the file.
+        savior_id (ObjectId): The partner that uploaded the file.
+        name (str): The filename.
+        upload_date (datetime): When the file was uploaded.
+        logs (list): All the logs of the file.
+
+    Returns:
+        The summary document
+    """
+    co2e, processed = 0, 0
+    for log in logs:
+        log_co2e = log.get("co2e")
+        if isinstance(log_co2e, Number):
+            co2e += log_co2e
+            processed += 1
+    return summary(
+        file_id=file_id,
+        savior_id=savior_id,
+        name=name,
+        upload_date=upload_date,
+        num_rows=len(logs),
+        co2e=co2e,
+        processed=processed,
+    )
+
+def summary(
+    file_id: ObjectId,
+    savior_id: ObjectId,
+    name: str | None,
+    upload_date: datetime,
+    num_rows: int,
+    co2e: float,
+    processed: int,
+) -> dict:
+    """Create the summary of a file from the totals of its logs.
+
+    For files whose logs aren't all in memory at once, see `summarize`.
+
+    Args:
+        num_rows (int): The number of logs of the file.
+        co2e (float): The co2e total of the logs.
+        processed (int): The number of logs with a co2e.
+
+    Returns:
+        The summary document
+    """
+    unprocessed = num_rows - processed
+    return {
+        "_id": file_id,
+        "savior_id": savior_id,
+        "name": name,
+        "upload_date": upload_date,
+        "num_rows": num_rows,
+        "co2e": co2e,
+        "processed": processed,
+        "unprocessed": unprocessed,
+        "needs_processing": unprocessed > 0,
+    }
+
+def _summary_pipeline(match: dict) -> list[dict]:
+    """Group logs into summaries, see `summarize`"""
+    return [
+        {"$match": match},
+        {
+            "$group": {
+                "_id": "$source_file.id",
+                "savior_id": {"$first": "$savior_id"},
+                "name": {"$first": "$source_file.name"},
+                "upload_date": {"$first": "$source_file.upload_date"},
+                "num_rows": {"$sum": 1},
+                "co2e": {"$sum": "$co2e"},
+                "processed": {
+                    "$sum": {"$cond": [{"$isNumber": "$co2e"}, 1, 0]}
+                },
+            }
+        },
+        {
+            "$addFields": {
+                "unprocessed": {"$subtract": ["$num_rows", "$processed"]},
+                "needs_processing": {"$lt": ["$processed", "$num_rows"]},
+            }
+        },
+    ]
+
+def refresh(
+    db: Database, savior_id: ObjectId, file_ids: list[ObjectId] | None = None
+) -> int:
+    """Rebuild summaries from the logs of their files.
+
+    The cost is bound by the size of the files, the logs are
+    read with the `source_file_id` index when `file_ids` are given.
+
+    Args:
+        db (Database): The database holding `logs` and `files`.
+        savior_id (ObjectId): The partner the files belong to.
+        file_ids (list): Optional. The files to refresh, defaults to all
+            of the partner's files. Summaries of files without logs are deleted.
+
+    Returns:
+        The number of summaries written or deleted
+    """
+    match = {"savior_id": savior_id, "source_file.id": {"$exists": True}}
+    if file_ids is not None:
+        file_ids = list(set(file_ids))
+        if not file_ids:
+            return 0
+        match["source_file.id"] = {"$in": file_ids}
+    summaries = list(db.logs.aggregate(_summary_pipeline(match)))
+    writes = [
+        ReplaceOne({"_id": summary["_id"]}, summary, upsert=True)
+        for summary in summaries
+    ]
+    summarized = {summary["_id"] for summary in summaries}
+    stale = (
+        db.files.distinct("_id", {"savior_id": savior_id})
+        if file_ids is None else file_ids
+    )
+    writes += [
+        DeleteOne({"_id": file_id, "savior_id": savior_id})
+        for file_id in stale if file_id not in summarized
+    ]
+    if not writes:
+        return 0
+    result = db.files.bulk_write(writes, ordered=False)
+    return result.upserted_count + result.modified_count + result.deleted_count
+
+def backfill(db: Database) -> int:
+    """Summarize the files of every partner with logs.
+
+    Returns:
+        The number of partners whose files were summarized
+    """
+    savior_ids = db.logs.distinct(
+        "savior_id", {"source_file.id": {"$exists": True}}
+    )
+    for savior_id in savior_ids:
+        refresh(db, savior_id)
+    return len(savior_ids)
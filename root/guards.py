@@ -0,0 +1,260 @@
+"""Guardrails of client supplied queries.
+
+`Savior.get_data` runs find filters and aggregation pipelines sent by
+clients, with the savior's own filters added. A single expensive query can
+pin a mongodb node and delay every other request, so queries are checked
+before they run, and bounded while they run:
+
+- Pipelines may only use the stages of `ALLOWED_STAGES`, which excludes
+  stages that read other collections ($lookup, $unionWith, ...), or write
+  ($out, $merge). Operators that run javascript are never allowed.
+- Pipelines are at most `DATA_MAX_PIPELINE_STAGES` long, with at most
+  `DATA_MAX_BLOCKING_STAGES` stages that hold all their input in memory,
+  e.g $group or $sort, counting those of $facet sub-pipelines.
+- The collection must have a declared index leading with savior_id, see
+  indexes.py, other collections would be scanned whole.
+- The client's leading $match, or find filter, before the savior's filters
+  are added, should filter on a field indexed after savior_id, e.g
+  source_file.upload_date of logs, see `is_indexed`. Other queries read
+  every document of the savior, so their cost is estimated by
+  `check_cost`, which counts the savior's documents, and they are
+  rejected when there are more than `DATA_MAX_SCANNED_DOCS`.
+- Results are capped at `DATA_MAX_RESULTS` documents, queries are stopped
+  by the server after `DATA_MAX_TIME_MS` and only use disk for large
+  sorts and groups when `DATA_ALLOW_DISK_USE` is set.
+
+Rejected queries raise `QueryRejectedError` (422), and queries that run out
+of time raise `QueryTimeoutError` (504).
+"""
+
+from typing import Any, Iterable, Iterator
+from bson import ObjectId
+from pymongo.collection import Collection
+from pymongo.errors import ExecutionTimeout, OperationFailure
+from config import Config
+from exceptions import QueryRejectedError, QueryTimeoutError
+import indexes
+
+config = Config()
+
+ALLOWED_STAGES = frozenset({
+    "$match",
+    "$project",
+    "$addFields",
+    "$set",
+    "$unset",
+    "$group",
+    "$sort",
+    "$limit",
+    "$skip",
+    "$count",
+    "$unwind",
+    "$bucket",
+    "$bucketAuto",
+    "$sortByCount",
+    "$replaceRoot",
+    "$replaceWith",
+    "$facet",
+})
+
+# stages that hold all of their input before they output anything
+BLOCKING_STAGES = frozenset({
+    "$group", "$sort", "$bucket", "$bucketAuto", "$sortByCount", "$facet"
+})
+
+# operators that run server side javascript
+FORBIDDEN_OPERATORS = frozenset({"$where", "$function", "$accumulator"})
+
+# the server's error code when a stage exceeds its memory limit without disk use
+_MEMORY_LIMIT_EXCEEDED = 292
+
+def _assert_no_forbidden_operators(value: Any) -> None:
+    """Reject javascript operators, anywhere in a filter or pipeline"""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key in FORBIDDEN_OPERATORS:
+                raise QueryRejectedError(f"The {key} operator isn't allowed")
+            _assert_no_forbidden_operators(item)
+    elif isinstance(value, list):
+        for item in value:
+            _assert_no_forbidden_operators(item)
+
+def _savior_index_keys(collection: str) -> list[list[str]]:
+    """The fields of each declared index of `collection` leading with savior_id"""
+    return [
+        list(model.document["key"])
+        for model in indexes.INDEXES.get(collection, [])
+        if next(iter(model.document["key"])) == "savior_id"
+    ]
+
+def _assert_savior_indexed(collection: str) -> None:
+    """Reject queries of collections no declared index scopes to a savior"""
+    if not _savior_index_keys(collection):
+        raise QueryRejectedError(f"Queries of {collection} aren't allowed")
+
+def is_indexed(collection: str, filters: dict) -> bool:
+    """Whether a client's filter narrows the savior's documents with an index.
+
+    Args:
+        collection (str): The name of the collection queried.
+        filters (dict): The client's filter, without the savior's filters.
+    """
+    indexed_fields = {keys[1] for keys in _savior_index_keys(collection) if len(keys) > 1}
+    return not indexed_fields.isdisjoint(filters)
+
+def check_cost(
+    collection: Collection, savior_id: ObjectId, max_scanned_docs: int | None = None
+) -> None:
+    """Estimate the cost of a query that isn't indexed past savior_id.
+
+    Such a query reads every document of the savior, so they are counted,
+    with the savior_id index, up to one more than the limit.
+
+    Args:
+        collection (Collection): The collection queried.
+        savior_id (ObjectId): The savior querying it.
+        max_scanned_docs (int): Optional. Overrides `DATA_MAX_SCANNED_DOCS`.
+
+    Raises:
+        QueryRejectedError: When the savior has too many documents.
+    """
+    limit = max_scanned_docs or config.data_max_scanned_docs
+    try:
+        num_docs = collection.count_documents(
+            {"savior_id": savior_id}, limit=limit + 1, maxTimeMS=config.data_max_time_ms
+        )
+    except ExecutionTimeout:
+        num_docs = limit + 1
+    if num_docs > limit:
+        raise QueryRejectedError(
+            f"Queries of more than {limit} documents of {collection.name} "
+            "must filter on an indexed field first"
+        )
+
+def _count_stages(pipeline: list) -> tuple[int, int]:
+    """Count the stages, and blocking stages, of a pipeline, including sub-pipelines.
+
+    Raises:
+        QueryRejectedError: When a stage isn't allowed.
+    """
+    num_stages = num_blocking = 0
+    for stage in pipeline:
+        if not isinstance(stage, dict) or len(stage) != 1:
+            raise QueryRejectedError("Every stage must have exactly one field")
+        name, spec = next(iter(stage.items()))
+        if name not in ALLOWED_STAGES:
+            raise QueryRejectedError(f"The {name} stage isn't allowed")
+        num_stages += 1
+        num_blocking += name in BLOCKING_STAGES
+        if name == "$facet":
+            for sub_pipeline in spec.values():
+                sub_stages, sub_blocking = _count_stages(sub_pipeline)
+                num_stages += sub_stages
+                num_blocking += sub_blocking
+    return num_stages, num_blocking
+
+def check_find(
+    collection: str,
+    filters: dict,
+    max_time_ms: int | None = None,
+    max_results: int | None = None,
+) -> dict:
+    """Check a find filter, and get the options to run it with.
+
+    The cost of filters that aren't indexed is checked separately,
+    see `is_indexed` and `check_cost`.
+
+    Args:
+        collection (str): The name of the collection queried.
+        filters (dict): The client's filter, without the savior's filters.
+        max_time_ms (int): Optional. Overrides `DATA_MAX_TIME_MS`.
+        max_results (int): Optional. Overrides `DATA_MAX_RESULTS`.
+
+    Returns:
+        The keyword arguments of `Collection.find`
+
+    Raises:
+        QueryRejectedError: When the filter breaks any of the limits.
+    """
+    _assert_no_forbidden_operators(filters)
+    _assert_savior_indexed(collection)
+    return {
+        "limit": max_results or config.data_max_results,
+        "max_time_ms": max_time_ms or config.data_max_time_ms,
+        "allow_disk_use": config.data_allow_disk_use,
+    }
+
+def check_pipeline(
+    collection: str,
+    pipeline: list,
+    max_time_ms: int | None = None,
+    max_results: int | None = None,
+) -> tuple[list, dict]:
+    """Check an aggregation pipeline, and get the options to run it with.
+
+    The cost of a leading $match that isn't indexed is checked
+    separately, see `is_indexed` and `check_cost`.
+
+    Args:
+        collection (str): The name of the collection aggregated.
+        pipeline (list): The pipeline, its leading $match can
+            include the savior's filters.
+        max_time_ms (int): Optional. Overrides `DATA_MAX_TIME_MS`.
+        max_results (int): Optional. Overrides `DATA_MAX_RESULTS`.
+
+    Returns:
+        The pipeline with its results capped, and the keyword
+        arguments of `Collection.aggregate`
+
+    Raises:
+        QueryRejectedError: When the pipeline breaks any of the limits.
+    """
+    num_stages, num_blocking = _count_stages(pipeline)
+    if num_stages > config.data_max_pipeline_stages:
+        raise QueryRejectedError(
+            f"Pipelines can have at most {config.data_max_pipeline_stages} stages"
+        )
+    if num_blocking > config.data_max_blocking_stages:
+        raise QueryRejectedError(
+            f"Pipelines can have at most {config.data_max_blocking_stages} "
+            "stages like $group, $sort, $bucket or $facet"
+        )
+    _assert_no_forbidden_operators(pipeline)
+    _assert_savior_indexed(collection)
+    return (
+        [*pipeline, {"$limit": max_results or config.data_max_results}],
+        {
+            "maxTimeMS": max_time_ms or config.data_max_time_ms,
+            "allowDiskUse": config.data_allow_disk_use,
+        },
+    )
+
+def translate_error(error: Exception) -> Exception:
+    """Map a server error of a guarded query to its `ExceptionWithStatusCode`.
+
+    Other errors are returned as is.
+    """
+    if isinstance(error, ExecutionTimeout):
+        return QueryTimeoutError("The query ran out of time")
+    if isinstance(error, OperationFailure) and error.code == _MEMORY_LIMIT_EXCEEDED:
+        return QueryRejectedError(
+            "The query used too much memory, sort or group fewer documents"
+        )
+    return error
+
+def guarded(documents: Iterable) -> Iterator:
+    """Iterate a guarded query's cursor, translating its errors.
+
+    The cursor is closed when the iterator is.
+    """
+    try:
+        yield from documents
+    except (ExecutionTimeout, OperationFailure) as e:
+        translated = translate_error(e)
+        if translated is e:
+            raise
+        raise translated from e
+    finally:
+        close = getattr(documents, "close", None)
+        if close is not None:
+            close()
@@ -0,0 +1,373 @@
+"""Chunked ingestion of uploaded emission files.
+
+Reading a whole upload into one DataFrame, and its logs into one list,
+holds the file in memory several times over, a large ledger export can
+run a worker out of memory. Instead, `file_chunks` parses an upload
+`INGEST_CHUNK_SIZE` rows at a time, and `Partner.ingest_emissions_file`
+validates, enriches and inserts each chunk before the next one is read,
+so memory stays the same whatever the size of the file. Werkzeug spools
+large uploads to disk, so the raw file isn't held in memory either.
+
+Csv files are read with pandas' chunked reader. Excel workbooks, xlsx
+and xlsm, are read with openpyxl in read only mode, which streams the
+rows of a sheet as plain values instead of building every cell's object
+model. Rows are read `INGEST_CHUNK_SIZE` at a time into the same
+chunks as csv files. Older xls workbooks have no streaming reader, they
+are still read whole by `api.helpers.file_to_df`.
+
+Workbooks with a sheet per scope or category can have every sheet, or
+some of them, ingested as files of their own, see `Partner.ingest_workbook`.
+The upload is saved to disk and its sheets are parsed in parallel, by
+`parse_sheets` on a pool of `INGEST_WORKERS` processes, which pickle their
+chunks to disk for the api process to insert one at a time. The scope and
+category of a sheet's logs are inferred from its name, see `sheet_fields`.
+
+The totals of an upload are kept in an `IngestResult` as chunks are
+inserted, and its file summary is written from them, see
+`file_summaries.summary`.
+
+Settings, see `config.Config`:
+    INGEST_CHUNK_SIZE (int): The rows parsed and inserted at a time.
+    INGEST_WORKERS (int): The processes sheets are parsed on.
+"""
+
+import os
+import re
+import shutil
+import tempfile
+import threading
+import zipfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait
+from contextlib import contextmanager
+from dataclasses import dataclass
+from itertools import batched, chain
+from numbers import Number
+from typing import IO, Generator, Iterable, Iterator
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+from bson import ObjectId
+from config import Config
+from exceptions import InvalidMediaTypeError, InvalidRequestDataError
+
+config = Config()
+
+# workbooks whose rows can be streamed, see `read_excel_chunks`
+EXCEL_EXTENSIONS = ("xlsx", "xlsm")
+
+# e.g "Scope 1 - Stationary combustion", "scope 2", "Business travel"
+_SHEET_SCOPE = re.compile(r"^\s*scope\s*([123])\b[\s\-:_|]*", re.IGNORECASE)
+# default sheet names, they say nothing about their rows
+_DEFAULT_SHEET_NAME = re.compile(r"^\s*sheet\s*\d*\s*$", re.IGNORECASE)
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+@dataclass(slots=True)
+class IngestResult:
+    """The totals of an ingested file.
+
+    Attributes:
+        file_id (ObjectId): The id of the file, its logs' source_file.id.
+        num_rows (int): The number of logs inserted.
+        co2e (float): The co2e total of the logs.
+        processed (int): The number of logs with a co2e.
+        num_chunks (int): The number of chunks inserted.
+    """
+    file_id: ObjectId
+    num_rows: int = 0
+    co2e: float = 0
+    processed: int = 0
+    num_chunks: int = 0
+
+    def add(self, logs: list[dict]) -> None:
+        """Count an inserted chunk of logs"""
+        for log in logs:
+            co2e = log.get("co2e")
+            if isinstance(co2e, Number):
+                self.co2e += co2e
+                self.processed += 1
+        self.num_rows += len(logs)
+        self.num_chunks += 1
+
+    def to_dict(self) -> dict:
+        return {
+            "file_id": self.file_id,
+            "num_rows": self.num_rows,
+            "co2e": self.co2e,
+            "processed": self.processed,
+            "num_chunks": self.num_chunks,
+        }
+
+def file_extension(filename: str) -> str:
+    """The lowercase extension of a filename, e.g csv"""
+    return filename.rpartition(".")[-1].lower() if "." in filename else ""
+
+def read_csv_chunks(file: IO, chunk_size: int | None = None) -> Iterator[pd.DataFrame]:
+    """Parse a csv file a chunk of rows at a time.
+
+    Args:
+        file (IO): The file, or its stream.
+        chunk_size (int): Optional. Defaults to `INGEST_CHUNK_SIZE`.
+
+    Raises:
+        InvalidRequestDataError: When the file isn't a valid csv.
+    """
+    try:
+        with pd.read_csv(file, chunksize=chunk_size or config.ingest_chunk_size) as reader:
+            yield from reader
+    except pd.errors.EmptyDataError as e:
+        raise InvalidRequestDataError("The file is empty") from e
+    except (pd.errors.ParserError, UnicodeDecodeError) as e:
+        raise InvalidRequestDataError(f"Unable to parse the file: {e}") from e
+
+def _is_blank(row: tuple) -> bool:
+    return all(value is None or value == "" for value in row)
+
+def _header(row: tuple) -> list[str]:
+    """Column names of a header row, named like pandas names blank ones"""
+    width = len(row)
+    while width and row[width - 1] is None:
+        width -= 1  # trailing empty cells of the sheet's dimensions
+    return [
+        f"Unnamed: {i}" if value is None else str(value) 
+        for i, value in enumerate(row[:width])
+    ]
+
+def rows_to_chunks(
+    rows: Iterable[tuple], chunk_size: int | None = None
+) -> Iterator[pd.DataFrame]:
+    """Turn rows of values into DataFrame chunks.
+
+    The first row that isn't blank is the header, blank rows are skipped.
+
+    Args:
+        rows (Iterable[tuple]): The rows of a sheet, as values.
+        chunk_size (int): Optional. Defaults to `INGEST_CHUNK_SIZE`.
+
+    Raises:
+        InvalidRequestDataError: When there's no header row.
+    """
+    rows = iter(rows)
+    header = next((_header(row) for row in rows if not _is_blank(row)), None)
+    if not header:
+        raise InvalidRequestDataError("The file is empty")
+    width, start = len(header), 0
+    filled = (row for row in rows if not _is_blank(row))
+    for batch in batched(filled, chunk_size or config.ingest_chunk_size):
+        # indexed by position in the sheet, like csv chunks are in their file
+        yield pd.DataFrame.from_records(
+            [(*row, *(None,) * (width - len(row)))[:width] for row in batch], 
+            columns=header,
+            index=pd.RangeIndex(start, start + len(batch)),
+        )
+        start += len(batch)
+
+def read_excel_chunks(
+    file: IO, chunk_size: int | None = None, sheet_name: str | None = None
+) -> Iterator[pd.DataFrame]:
+    """Stream the rows of a workbook's sheet a chunk at a time.
+
+    Args:
+        file (IO): The file, or its stream.
+        chunk_size (int): Optional. Defaults to `INGEST_CHUNK_SIZE`.
+        sheet_name (str): Optional. The sheet to read, defaults to the first.
+
+    Raises:
+        InvalidRequestDataError: When the file isn't a valid workbook,
+            or it has no sheet named `sheet_name`.
+    """
+    try:
+        workbook = load_workbook(file, read_only=True, data_only=True)
+    except (InvalidFileException, zipfile.BadZipFile, KeyError, OSError) as e:
+        raise InvalidRequestDataError(f"Unable to parse the file: {e}") from e
+    try:
+        if sheet_name is None:
+            sheet = workbook.worksheets[0]
+        elif sheet_name in workbook.sheetnames:
+            sheet = workbook[sheet_name]
+        else:
+            raise InvalidRequestDataError(f"The file has no sheet named {sheet_name}")
+        yield from rows_to_chunks(sheet.iter_rows(values_only=True), chunk_size=chunk_size)
+    finally:
+        workbook.close()
+
+def sheet_names(path: str | os.PathLike) -> list[str]:
+    """The names of the sheets of a workbook.
+
+    Raises:
+        InvalidRequestDataError: When the file isn't a valid workbook.
+    """
+    try:
+        workbook = load_workbook(path, read_only=True)
+    except (InvalidFileException, zipfile.BadZipFile, KeyError, OSError) as e:
+        raise InvalidRequestDataError(f"Unable to parse the file: {e}") from e
+    try:
+        return workbook.sheetnames
+    finally:
+        workbook.close()
+
+def sheet_fields(sheet_name: str) -> dict[str, str]:
+    """Infer the scope and category of a sheet's logs from its name.
+
+    Args:
+        sheet_name (str): e.g "Scope 1 - Stationary combustion".
+
+    Returns:
+        The scope and category named, each only when it is
+    """
+    fields = {}
+    match = _SHEET_SCOPE.match(sheet_name)
+    if match:
+        fields["scope"] = match.group(1)
+        sheet_name = sheet_name[match.end():]
+    category = sheet_name.strip()
+    if category and not _DEFAULT_SHEET_NAME.match(category):
+        fields["category"] = category
+    return fields
+
+def _sheet_chunks(
+    path: str, sheet_name: str, chunk_size: int | None
+) -> Iterator[pd.DataFrame]:
+    """Stream a sheet of a workbook on disk, empty sheets have no chunks"""
+    with open(path, "rb") as file:
+        try:
+            yield from read_excel_chunks(file, chunk_size=chunk_size, sheet_name=sheet_name)
+        except InvalidRequestDataError:
+            if sheet_name not in sheet_names(path):
+                raise
+            # the sheet is empty
+
+def _parse_sheet(
+    path: str, sheet_name: str, chunk_size: int | None, prefix: str
+) -> list[str]:
+    """Parse a sheet of a workbook on disk, pickling each chunk next to `prefix`.
+
+    Chunks go through disk rather than being sent back whole, so neither
+    the worker nor the api process holds the sheet in memory.
+
+    Returns:
+        The paths of the chunks, in order
+    """
+    paths = []
+    for i, chunk in enumerate(_sheet_chunks(path, sheet_name, chunk_size)):
+        paths.append(f"{prefix}-{i}.pkl")
+        chunk.to_pickle(paths[-1])
+    return paths
+
+def _load_chunks(paths: list[str]) -> Iterator[pd.DataFrame]:
+    """Read the pickled chunks of a sheet, removing each once read"""
+    for path in paths:
+        chunk = pd.read_pickle(path)
+        os.remove(path)
+        yield chunk
+
+def _get_pool() -> ProcessPoolExecutor:
+    """The pool sheets are parsed on, created when first used.
+
+    Workers are spawned rather than forked, forking copies the api's
+    threads and open connections.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=config.ingest_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+def parse_sheets(
+    path: str | os.PathLike, sheets: list[str], chunk_size: int | None = None
+) -> Iterator[tuple[str, Iterator[pd.DataFrame]]]:
+    """Parse sheets of a workbook in parallel.
+
+    Workers pickle the chunks of their sheet to a temporary directory,
+    which is removed once the iterator is exhausted or closed. Memory
+    holds a chunk per worker and the chunk being read, the parsed sheets
+    waiting to be read take disk space instead.
+
+    Args:
+        path (str | PathLike): The workbook, saved to disk.
+        sheets (list[str]): The names of the sheets to parse.
+        chunk_size (int): Optional. Defaults to `INGEST_CHUNK_SIZE`.
+
+    Returns:
+        An iterator of the name and chunks of each sheet with rows, in the
+        order they finish parsing. A sheet's chunks must be read before the
+        next sheet is.
+
+    Raises:
+        InvalidRequestDataError: When a sheet can't be parsed.
+    """
+    path = os.fspath(path)
+    if len(sheets) < 2 or config.ingest_workers < 2:
+        for sheet in sheets:
+            chunks = _sheet_chunks(path, sheet, chunk_size)
+            first = next(chunks, None)
+            if first is not None:
+                yield sheet, chain([first], chunks)
+        return
+    with tempfile.TemporaryDirectory(prefix="ingest-sheets-") as directory:
+        futures = {
+            _get_pool().submit(
+                _parse_sheet, path, sheet, chunk_size, os.path.join(directory, str(i))
+            ): sheet 
+            for i, sheet in enumerate(sheets)
+        }
+        try:
+            for future in as_completed(futures):
+                paths = future.result()
+                if paths:
+                    yield futures[future], _load_chunks(paths)
+        finally:
+            for future in futures:
+                future.cancel()
+            # sheets still parsing write to the directory until they finish
+            wait(futures)
+
+@contextmanager
+def saved_upload(file: IO, suffix: str = "") -> Generator[str, None, None]:
+    """Save an uploaded file to disk, for the processes parsing it.
+
+    The file is deleted on exit.
+
+    Yields:
+        The path of the saved file
+    """
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as saved:
+        shutil.copyfileobj(file, saved)
+    try:
+        yield saved.name
+    finally:
+        os.remove(saved.name)
+
+def read_dataframe(file: IO, filename: str) -> pd.DataFrame:
+    """Read a whole file supported by `file_chunks` into one DataFrame"""
+    chunks = list(file_chunks(file, filename))
+    return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+
+def file_chunks(
+    file: IO, filename: str, chunk_size: int | None = None
+) -> Iterator[pd.DataFrame]:
+    """Parse an uploaded file a chunk of rows at a time.
+
+    Args:
+        file (IO): The file, or its stream.
+        filename (str): The name of the file, its extension is its type.
+        chunk_size (int): Optional. Defaults to `INGEST_CHUNK_SIZE`.
+
+    Raises:
+        InvalidMediaTypeError: When the file type isn't supported.
+    """
+    extension = file_extension(filename)
+    if extension == "csv":
+        return read_csv_chunks(file, chunk_size=chunk_size)
+    if extension in EXCEL_EXTENSIONS:
+        return read_excel_chunks(file, chunk_size=chunk_size)
+    raise InvalidMediaTypeError(f"Chunked uploads aren't supported for {extension} files")
+
+def supports_chunks(filename: str) -> bool:
+    """Whether `file_chunks` can parse a file"""
+    return file_extension(filename) in ("csv", *EXCEL_EXTENSIONS)
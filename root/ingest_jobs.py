@@ -0,0 +1,241 @@
+"""Background file uploads.
+
+Parsing, validating and inserting a large upload can take minutes, longer
+than proxies keep a request open, and it holds a web worker meanwhile.
+Uploads sent with the async form field are `submit`ted as jobs instead:
+the raw file is stored in GridFS, in the `ingest_uploads` bucket, and a
+worker ingests it a chunk at a time, see `Partner.ingest_emissions_file`.
+A job is a document of `ingest_jobs`:
+
+    {
+        "_id": ...,
+        "savior_id": ...,
+        "user_id": ...,
+        "filename": "ledger.csv",
+        "upload_id": ...,
+        "form": {"scope": "2", ...},
+        "status": "running",
+        "progress": {"rows_parsed": 15000, "rows_inserted": 15000, "rows_failed": 0},
+        "file_id": None,
+        "error": None,
+        "errors": None,
+        "created_at": ...,
+        "started_at": ...,
+        "finished_at": ...,
+        "expires_at": ...,
+    }
+
+`progress` is updated after every chunk. The status of a job goes from
+queued to running, then to done, with the `file_id` of the uploaded file,
+or to failed, with its `error` and `status_code`. When rows are invalid,
+`errors` holds the errors of each column, see `root.validation`, and no
+row of the file is inserted.
+
+The raw file is removed once its job ran, jobs are removed by a TTL index
+`JOB_TTL` seconds after they're submitted, see indexes.py. Like `root.jobs`,
+uploads are ingested on celery workers when `CELERY_BROKER_URL` is set,
+otherwise on a thread pool of the api process. Uploads of jobs that never
+ran, e.g lost when that process exited, are removed by later submits.
+
+Settings, see `config.Config`:
+    INGEST_JOB_WORKERS (int): The threads of the in-process pool.
+    JOB_TTL (int): Seconds a job is kept.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import IO, Hashable
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask import current_app, has_app_context
+from gridfs import GridFSBucket
+from gridfs.errors import NoFile
+from pymongo.database import Database
+from config import Config
+from database import mongo
+from exceptions import (
+    ExceptionWithStatusCode,
+    FileValidationError,
+    InvalidMediaTypeError,
+    ResourceNotFoundError,
+)
+from root import ingest
+
+logger = logging.getLogger(__name__)
+
+config = Config()
+
+BUCKET_NAME = "ingest_uploads"
+
+# the form fields an upload's rows can take their columns from, see
+# `Partner._file_column_fallbacks`, and its task
+FORM_FIELDS = ("scope", "category", "unit_type", "ghg_category", "task_id")
+
+# the fields of a job sent to its savior
+JOB_PROJECTION = {"savior_id": 0, "user_id": 0, "upload_id": 0, "form": 0, "expires_at": 0}
+
+# uploads of expired jobs removed per submit
+_MAX_EXPIRED_REMOVED = 10
+
+_executor = ThreadPoolExecutor(
+    max_workers=config.ingest_job_workers, thread_name_prefix="ingest-job"
+)
+
+def _job_id(job_id: str | ObjectId) -> ObjectId:
+    """Parse a job's _id.
+
+    Raises:
+        ResourceNotFoundError: When it isn't an ObjectId, so there's no such job.
+    """
+    try:
+        return ObjectId(job_id)
+    except (InvalidId, TypeError) as e:
+        raise ResourceNotFoundError(f"No upload job with id {job_id}") from e
+
+def _dispatch(job_id: ObjectId) -> None:
+    """Run a job on celery when the app has it, otherwise on the thread pool"""
+    celery_app = current_app.extensions.get("celery") if has_app_context() else None
+    if celery_app is not None:
+        from queues.tasks import run_ingest_job
+        run_ingest_job.delay(str(job_id))
+    else:
+        _executor.submit(run, job_id)
+
+def _remove_expired_uploads(bucket: GridFSBucket, now: datetime) -> None:
+    """Remove the raw files of jobs that expired without running"""
+    expired = bucket.find(
+        {"metadata.expires_at": {"$lt": now}}, limit=_MAX_EXPIRED_REMOVED
+    )
+    for upload in expired:
+        try:
+            bucket.delete(upload._id)
+        except NoFile:
+            pass  # removed by another submit
+
+def submit(
+    db: Database,
+    savior_id: ObjectId,
+    user_id: str,
+    file: IO,
+    filename: str,
+    form: dict,
+) -> ObjectId:
+    """Store an uploaded file, and queue it to be ingested as a job.
+
+    Args:
+        db (Database): The database holding `ingest_jobs` and the bucket.
+        savior_id (ObjectId): The partner uploading the file.
+        user_id (str): The user of the partner uploading it.
+        file (IO): The uploaded file, or its stream.
+        filename (str): The name of the file, its extension is its type.
+        form (dict): The upload's form, only `FORM_FIELDS` are kept.
+
+    Returns:
+        The _id of the job
+
+    Raises:
+        InvalidMediaTypeError: When the file type can't be ingested
+            in chunks, see `ingest.supports_chunks`.
+    """
+    if not ingest.supports_chunks(filename):
+        raise InvalidMediaTypeError(
+            f"{ingest.file_extension(filename)} files can't be uploaded in the background"
+        )
+    now = datetime.now(tz=timezone.utc)
+    expires_at = now + timedelta(seconds=config.job_ttl)
+    bucket = GridFSBucket(db, bucket_name=BUCKET_NAME)
+    _remove_expired_uploads(bucket, now)
+    upload_id = bucket.upload_from_stream(
+        filename, file, metadata={"savior_id": savior_id, "expires_at": expires_at}
+    )
+    job_id = db.ingest_jobs.insert_one(
+        {
+            "savior_id": savior_id,
+            "user_id": user_id,
+            "filename": filename,
+            "upload_id": upload_id,
+            "form": {
+                field: form[field] for field in FORM_FIELDS if form.get(field) is not None
+            },
+            "status": "queued",
+            "progress": {"rows_parsed": 0, "rows_inserted": 0, "rows_failed": 0},
+            "file_id": None,
+            "error": None,
+            "errors": None,
+            "created_at": now,
+            "expires_at": expires_at,
+        }
+    ).inserted_id
+    _dispatch(job_id)
+    return job_id
+
+def run(job_id: ObjectId) -> None:
+    """Ingest the file of a queued job, storing its progress and outcome.
+
+    Jobs that aren't queued, e.g taken by another worker, are left alone.
+    """
+    # import lazily, partner imports the modules of every savior feature
+    from root.partner import Partner
+    db = mongo.db
+    job = db.ingest_jobs.find_one_and_update(
+        {"_id": job_id, "status": "queued"},
+        {"$set": {"status": "running", "started_at": datetime.now(tz=timezone.utc)}},
+    )
+    if job is None:
+        return
+    bucket = GridFSBucket(db, bucket_name=BUCKET_NAME)
+    partner = Partner(savior_id=job["savior_id"], user_id=job["user_id"])
+    def progress(counts: dict) -> None:
+        db.ingest_jobs.update_one({"_id": job_id}, {"$set": {"progress": counts}})
+    try:
+        with bucket.open_download_stream(job["upload_id"]) as upload:
+            result = partner.ingest_emissions_file(
+                chunks=ingest.file_chunks(upload, job["filename"]),
+                get_form_field=job["form"].get,
+                filename=job["filename"],
+                progress=progress,
+            )
+    except Exception as e:
+        logger.warning("Upload job %s failed: %s", job_id, e)
+        update = {
+            "status": "failed",
+            "error": str(e),
+            "errors": e.errors if isinstance(e, FileValidationError) else None,
+            "status_code": e.status_code if isinstance(e, ExceptionWithStatusCode) else 400,
+            # the inserted rows were rolled back
+            "progress.rows_inserted": 0,
+        }
+    else:
+        update = {"status": "done", "file_id": result.file_id}
+    finally:
+        try:
+            bucket.delete(job["upload_id"])
+        except NoFile:
+            pass
+    db.ingest_jobs.update_one(
+        {"_id": job_id},
+        {"$set": {**update, "finished_at": datetime.now(tz=timezone.utc)}},
+    )
+
+def get(db: Database, savior_id: Hashable, job_id: str | ObjectId) -> dict:
+    """Get the status and progress of one of a savior's upload jobs.
+
+    Args:
+        db (Database): The database holding `ingest_jobs`.
+        savior_id (ObjectId): The partner who uploaded the file.
+        job_id (str | ObjectId): The _id of the job.
+
+    Returns:
+        The job, see module docstring, without its savior_id, user_id,
+        upload_id, form and expires_at
+
+    Raises:
+        ResourceNotFoundError: When the savior has no such job, or it expired.
+    """
+    job = db.ingest_jobs.find_one(
+        {"_id": _job_id(job_id), "savior_id": savior_id}, JOB_PROJECTION
+    )
+    if job is None:
+        raise ResourceNotFoundError(f"No upload job with id {job_id}")
+    return job
@@ -0,0 +1,256 @@
+"""Asynchronous /saviors/data queries.
+
+Heavy analytics, e.g a year of logs grouped by several fields, can run
+longer than `DATA_MAX_TIME_MS` allows a request to hold its connection.
+Such queries are `submit`ted as jobs instead, and run on a worker pool
+with the longer limits of `JOB_MAX_TIME_MS`, `JOB_MAX_RESULTS` and
+`JOB_MAX_SCANNED_DOCS`. A job is a document of `query_jobs`:
+
+    {
+        "_id": ...,
+        "savior_id": ...,
+        "query_type": "aggregate",
+        "collection": "logs",
+        "filters": "[{\\"$match\\": ...}]",
+        "status": "done",
+        "error": None,
+        "num_results": 2400,
+        "num_pages": 3,
+        "created_at": ...,
+        "started_at": ...,
+        "finished_at": ...,
+        "expires_at": ...,
+    }
+
+`filters` is the query as extended json, queries can hold $-prefixed keys
+which can't be stored as is. The status of a job goes from queued to
+running, then to done or failed, failed jobs keep their `error` and its
+`status_code`. Results are stored in pages of `JOB_PAGE_SIZE` documents
+in `query_job_results`, `{"job_id", "page", "documents", "expires_at"}`.
+
+Jobs and their results are removed by TTL indexes `JOB_TTL` seconds after
+the job is submitted, see indexes.py. Jobs run on celery workers when
+`CELERY_BROKER_URL` is set, see queues/, otherwise on a thread pool of the
+api process. Jobs of that pool are lost if the process exits, they stay
+queued or running until they expire.
+
+Settings, see `config.Config`:
+    JOB_MAX_TIME_MS (int): The time limit of a job's query.
+    JOB_MAX_RESULTS (int): The most results a job keeps.
+    JOB_MAX_SCANNED_DOCS (int): The most documents a job's query reads
+        when it isn't indexed, see `guards.check_cost`.
+    JOB_PAGE_SIZE (int): The number of results per page.
+    JOB_TTL (int): Seconds a job and its results are kept.
+    JOB_WORKERS (int): The threads of the in-process pool.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from itertools import batched
+from typing import Hashable, Literal
+from bson import ObjectId, json_util
+from bson.errors import InvalidId
+from flask import current_app, has_app_context
+from pymongo.database import Database
+from config import Config
+from database import mongo
+from exceptions import (
+    ExceptionWithStatusCode,
+    InvalidRequestDataError,
+    ResourceConflictError,
+    ResourceNotFoundError,
+)
+
+logger = logging.getLogger(__name__)
+
+config = Config()
+
+STATUSES = ("queued", "running", "done", "failed")
+
+QUERY_TYPES = ("aggregate", "find")
+
+# the fields of a job sent to its savior
+JOB_PROJECTION = {"savior_id": 0, "filters": 0, "expires_at": 0}
+
+_executor = ThreadPoolExecutor(max_workers=config.job_workers, thread_name_prefix="job")
+
+def _job_id(job_id: str | ObjectId) -> ObjectId:
+    """Parse a job's _id.
+
+    Raises:
+        ResourceNotFoundError: When it isn't an ObjectId, so there's no such job.
+    """
+    try:
+        return ObjectId(job_id)
+    except (InvalidId, TypeError) as e:
+        raise ResourceNotFoundError(f"No job with id {job_id}") from e
+
+def _dispatch(job_id: ObjectId) -> None:
+    """Run a job on celery when the app has it, otherwise on the thread pool"""
+    celery_app = current_app.extensions.get("celery") if has_app_context() else None
+    if celery_app is not None:
+        from queues.tasks import run_query_job
+        run_query_job.delay(str(job_id))
+    else:
+        _executor.submit(run, job_id)
+
+def submit(
+    db: Database,
+    savior_id: ObjectId,
+    query_type: Literal["aggregate", "find"],
+    collection: str,
+    filters: dict | list,
+) -> ObjectId:
+    """Queue a query to run as a job.
+
+    Args:
+        db (Database): The database holding `query_jobs`.
+        savior_id (ObjectId): The savior querying their data.
+        query_type (Literal[aggregate, find]): The type of query.
+        collection (str): The name of the collection to query.
+        filters (dict | list): The find filter or pipeline,
+            see `Savior.get_data_cursor`.
+
+    Returns:
+        The _id of the job
+
+    Raises:
+        InvalidRequestDataError: When the query can't be run as a job.
+    """
+    if query_type not in QUERY_TYPES:
+        raise InvalidRequestDataError(f"Invalid query_type: {query_type}")
+    expected_type = list if query_type == "aggregate" else dict
+    if not isinstance(filters, expected_type) or (query_type == "aggregate" and not filters):
+        raise InvalidRequestDataError(f"Invalid filters for a {query_type} query")
+    if not isinstance(collection, str) or not collection:
+        raise InvalidRequestDataError(f"Invalid collection: {collection}")
+    now = datetime.now(tz=timezone.utc)
+    job_id = db.query_jobs.insert_one(
+        {
+            "savior_id": savior_id,
+            "query_type": query_type,
+            "collection": collection,
+            "filters": json_util.dumps(filters),
+            "status": "queued",
+            "error": None,
+            "num_results": 0,
+            "num_pages": 0,
+            "created_at": now,
+            "expires_at": now + timedelta(seconds=config.job_ttl),
+        }
+    ).inserted_id
+    _dispatch(job_id)
+    return job_id
+
+def run(job_id: ObjectId) -> None:
+    """Run a queued job, storing its results or error.
+
+    Jobs that aren't queued, e.g taken by another worker, are left alone.
+    """
+    # a Savior is only needed for its guarded queries, import it lazily
+    from root.savior import Savior
+    db = mongo.db
+    job = db.query_jobs.find_one_and_update(
+        {"_id": job_id, "status": "queued"},
+        {"$set": {"status": "running", "started_at": datetime.now(tz=timezone.utc)}},
+    )
+    if job is None:
+        return
+    num_results = num_pages = 0
+    try:
+        documents = Savior(job["savior_id"]).get_data_cursor(
+            query_type=job["query_type"],
+            collection=job["collection"],
+            filters=json_util.loads(job["filters"]),
+            max_time_ms=config.job_max_time_ms,
+            max_results=config.job_max_results,
+            max_scanned_docs=config.job_max_scanned_docs,
+        )
+        for page in batched(documents, config.job_page_size):
+            db.query_job_results.insert_one(
+                {
+                    "job_id": job_id,
+                    "page": num_pages,
+                    "documents": list(page),
+                    "expires_at": job["expires_at"],
+                }
+            )
+            num_results += len(page)
+            num_pages += 1
+    except Exception as e:
+        logger.warning("Query job %s failed: %s", job_id, e)
+        db.query_job_results.delete_many({"job_id": job_id})
+        update = {
+            "status": "failed",
+            "error": str(e),
+            "status_code": e.status_code if isinstance(e, ExceptionWithStatusCode) else 400,
+        }
+    else:
+        update = {"status": "done", "num_results": num_results, "num_pages": num_pages}
+    db.query_jobs.update_one(
+        {"_id": job_id},
+        {"$set": {**update, "finished_at": datetime.now(tz=timezone.utc)}},
+    )
+
+def get(db: Database, savior_id: Hashable, job_id: str | ObjectId) -> dict:
+    """Get the status of one of a savior's jobs.
+
+    Args:
+        db (Database): The database holding `query_jobs`.
+        savior_id (ObjectId): The savior who submitted the job.
+        job_id (str | ObjectId): The _id of the job.
+
+    Returns:
+        The job, see module docstring, without its savior_id, filters and expires_at
+
+    Raises:
+        ResourceNotFoundError: When the savior has no such job, or it expired.
+    """
+    job = db.query_jobs.find_one(
+        {"_id": _job_id(job_id), "savior_id": savior_id}, JOB_PROJECTION
+    )
+    if job is None:
+        raise ResourceNotFoundError(f"No job with id {job_id}")
+    return job
+
+def results(
+    db: Database, savior_id: Hashable, job_id: str | ObjectId, page: int = 0
+) -> dict:
+    """Get a page of the results of one of a savior's jobs.
+
+    Args:
+        db (Database): The database holding `query_jobs` and `query_job_results`.
+        savior_id (ObjectId): The savior who submitted the job.
+        job_id (str | ObjectId): The _id of the job.
+        page (int): The page to get, starting at 0.
+
+    Returns:
+        A dict with fields: job_id, page, num_pages, num_results, and
+        results, the documents of the page
+
+    Raises:
+        ResourceNotFoundError: When the savior has no such job, or page.
+        ResourceConflictError: When the job isn't done.
+        InvalidRequestDataError: When the page isn't a non negative integer.
+    """
+    job = get(db, savior_id, job_id)
+    if job["status"] != "done":
+        raise ResourceConflictError(f"Job {job_id} is {job['status']}, not done")
+    if not isinstance(page, int) or page < 0:
+        raise InvalidRequestDataError(f"Invalid page: {page}")
+    documents = []
+    if page or job["num_pages"]:
+        stored = db.query_job_results.find_one(
+            {"job_id": job["_id"], "page": page}, {"documents": 1}
+        )
+        if stored is None:
+            raise ResourceNotFoundError(f"Job {job_id} has no page {page}")
+        documents = stored["documents"]
+    return {
+        "job_id": job["_id"],
+        "page": page,
+        "num_pages": job["num_pages"],
+        "num_results": job["num_results"],
+        "results": documents,
+    }
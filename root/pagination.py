@@ -0,0 +1,81 @@
+"""Keyset pagination of savior collections.
+
+Paging with `.skip(n)` makes the server walk, and discard, `n` documents,
+so every next page is slower than the last. Instead, pages are sorted by
+`KEYSET_SORT` and each page returns a `next_cursor`, an opaque token of
+the (created_at, _id) of its last document. The next page starts right
+after it, with a bounded index scan no matter how deep it is.
+
+Note: Collections paged this way need an index on
+`savior_id, created_at, _id` in the order of `KEYSET_SORT`, see indexes.py.
+"""
+
+import base64
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from bson.errors import InvalidId
+from exceptions import InvalidRequestDataError
+
+# newest first, _id breaks ties of documents created at the same time
+KEYSET_SORT = [("created_at", -1), ("_id", -1)]
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MILLISECOND = timedelta(milliseconds=1)
+
+def _to_millis(date: datetime) -> int:
+    """Mongodb stores dates in milliseconds, naive dates are in UTC"""
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return (date - _EPOCH) // _MILLISECOND
+
+def encode_cursor(document: dict) -> str:
+    """Create the token of the page after `document`.
+
+    Args:
+        document (dict): The last document of a page, with
+            its `created_at` and `_id` fields.
+
+    Returns:
+        An opaque, url safe token
+    """
+    key = f"{_to_millis(document['created_at'])}:{document['_id']}"
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple[datetime, ObjectId]:
+    """Read a token created by `encode_cursor`.
+
+    Args:
+        cursor (str): The token.
+
+    Returns:
+        The created_at and _id of the document the token was made from
+
+    Raises:
+        InvalidRequestDataError: When the token is malformed
+    """
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        millis, _id = (
+            base64.urlsafe_b64decode(cursor + padding).decode().split(":")
+        )
+        return _EPOCH + int(millis) * _MILLISECOND, ObjectId(_id)
+    except (ValueError, OverflowError, InvalidId) as e:
+        raise InvalidRequestDataError("Invalid pagination cursor") from e
+
+def after(cursor: str) -> dict:
+    """The filters of documents that come after a token, see `KEYSET_SORT`.
+
+    The `created_at` bound is what the index scan starts from, the
+    `$or` only discards documents created at the same time as the token's.
+
+    Args:
+        cursor (str): A token created by `encode_cursor`.
+
+    Returns:
+        A dict of filters to find documents with
+    """
+    created_at, _id = decode_cursor(cursor)
+    return {
+        "created_at": {"$lte": created_at},
+        "$or": [{"created_at": {"$lt": created_at}}, {"_id": {"$lt": _id}}],
+    }
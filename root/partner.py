@@ -1,14 +1,26 @@
 """CRUD operations requested by partners"""
 
 from root.savior import Savior
+from root import (
+    pagination, 
+    file_summaries, 
+    product_rollups, 
+    emission_rollups, 
+    data_cache, 
+    ingest, 
+    ingest_jobs,
+    validation,
+)
 from bson import ObjectId
-from typing import Literal, override, Any
+from typing import IO, Literal, override, Any, Callable, Iterable
 from datetime import datetime, timezone
 from root.emissions import GHGCalculator
 from pandas import DataFrame
 import numpy as np
 from werkzeug.datastructures import ImmutableMultiDict
+from pymongo import ReturnDocument
 from pymongo.collection import Collection
+from pymongo.cursor import Cursor
 from pymongo.database import Database
 from exceptions import (
     InvalidRequestDataError,
@@ -38,14 +50,20 @@ class Partner(Savior):
     __slots__ = ("current_user_id")
     
     @override
-    def __init__(self, savior_id: str, user_id: str):
-        super().__init__(savior_id=savior_id)
+    def __init__(self, savior_id: str, user_id: str, context: dict | None = None):
+        # set first, the context is checked against the user's account
         self.current_user_id = user_id
+        super().__init__(savior_id=savior_id, context=context)
         
         
         
     @property
-    def savior(self) -> dict:
+    @override
+    def _account_id(self) -> str:
+        return str(self.current_user_id)
+        
+    @override
+    def _find_savior(self) -> dict | None:
         return self.db.partners.find_one(
             {"_id": ObjectId(self.current_user_id)}, 
             {
@@ -60,12 +78,18 @@ class Partner(Savior):
                 "company": 1,
                 "company_email": 1,
                 "measurement_categories": 1,
-                "region": 1
+                "region": 1,
+                "account_version": 1,
             }
         )            
     
+    @property
+    @override
+    def _context_company_id(self) -> str:
+        return str(self.savior_id)
+    
     def update_profile(self, updates: dict) -> bool:
-        """Update the profile
+        """Update the profile of the requesting user
         
         The fields allowed to update currently include:
             - username
@@ -88,34 +112,97 @@ class Partner(Savior):
             updates, {"username", "name", "password", "email", "measurement_categories"}
         )
         savior_id = self.savior_id
+        # the requesting user's account, their context is checked against it
+        account_id = ObjectId(self.current_user_id)
         new_username = updates.get("username")
         if new_username:
-            old_username = self.savior["username"]
+            old_username = self.context["username"]
             self.db.tasks.update_many(
                 {"savior_id": savior_id, "assignee": old_username},
                 {"$set": {"assignee": new_username}}
             )
-        return bool(
-            self.db.partners.update_one(
-                {"_id": savior_id}, {"$set": updates}
-            ).modified_count
-        )
+            # the username is part of the savior context
+            account = self.db.partners.find_one_and_update(
+                {"_id": account_id}, 
+                {"$set": updates, "$inc": {"account_version": 1}},
+                projection={"account_version": 1},
+                return_document=ReturnDocument.AFTER,
+            )
+            self._record_account_version(account)
+            modified = account is not None
+        else:
+            modified = bool(
+                self.db.partners.update_one(
+                    {"_id": account_id}, {"$set": updates}
+                ).modified_count
+            )
+        self._invalidate_savior()
+        if new_username:
+            self._bump_data_version("tasks")
+        return modified
         
-    def logs(self, limit: int = 0, skip: int = 0) -> list:
+    def invite_user(self, account: dict) -> ObjectId:
+        """Invite a company user
+        
+        The company level fields of the account are copied 
+        from the requesting partner's account.
+        
+        Args:
+            account (dict): The account to create, with fields:
+                - role: The role of the user
+                - username: The user's username
+                - email: The user's email, (not the company's email)
+                - password: The password of the user's account
+                - team (str): Optional. The team to assign the user to
+        
+        Returns:
+            The _id of the created user
+        """
+        savior = self.savior
+        _id = self.db.partners.insert_one(
+            {
+                "company_id": self.savior_id,
+                "company_email": savior.get("company_email"),
+                "region": savior.get("region"),
+                "company": savior.get("company"),
+                "role": account["role"],
+                "password": account["password"],
+                "username": account["username"],
+                "email": account["email"],
+                "joined": datetime.now(tz=timezone.utc),
+                "team": account.get("team", None),
+            }
+        ).inserted_id
+        # in case the new _id was looked up, and missed, before its creation
+        self._invalidate_savior(self._account_id, _id)
+        return _id
+        
+    def logs(
+        self, limit: int = 0, skip: int = 0, cursor: str | None = None
+    ) -> list | dict[str, list | bool | str | None]:
         """Partner's logs
         
         Args:
             limit (int): Limit the results returned
             skip (int): Skip results before limiting
+            cursor (str): Optional. Page with continuation tokens instead, 
+                an empty string requests the first page. See `Savior.paginate`
             
         Returns:
-            A list of log documents
+            A list of log documents, or when paging with `cursor`,
+            a dict with fields: logs, has_more, next_cursor
         """
-        print(self.savior_id)
-        return list(
+        if cursor is not None:
+            page = self.paginate("logs", limit=limit, cursor=cursor)
+            return {"logs": page.pop("results"), **page}
+        return list(self.logs_cursor(limit=limit, skip=skip))
+    
+    def logs_cursor(self, limit: int = 0, skip: int = 0) -> Cursor:
+        """A cursor of the partner's logs, newest first. See `logs`"""
+        return (
             self.db.logs
             .find({"savior_id": self.savior_id})
-            .sort([("created_at", -1)])
+            .sort(pagination.KEYSET_SORT)
             .skip(skip)
             .limit(limit)
         )
@@ -192,37 +279,12 @@ class Partner(Savior):
         Note: To get the logs of a partner use the logs method
         
         Returns:
-            a list of files with an added boolean field named needs_processing
+            a list of file summaries, see `root.file_summaries`
         """
         return list(
-            self.db.logs.aggregate([
-                {"$match": {"savior_id": self.savior_id}},
-                {
-                    "$addFields": {
-                        "needs_processing": {
-                            "$lt": ["$co2e", None]
-                        }
-                    }
-                },
-                {
-                    "$group": {
-                        "_id": "$source_file.id",
-                        "needs_processing": {
-                            "$addToSet": "$needs_processing"
-                        },
-                        "co2e": {"$sum": "$co2e"},
-                        "upload_date": {"$first": "$source_file.upload_date"},
-                    }
-                },
-                {
-                    "$addFields": {
-                        "needs_processing": {
-                            "$anyElementTrue": ["$needs_processing"]
-                        }
-                    },
-                },
-                {"$sort": {"needs_processing": 1}}
-            ])
+            self.db.files
+            .find({"savior_id": self.savior_id}, {"savior_id": 0})
+            .sort([("needs_processing", 1), ("upload_date", -1)])
         )
         
     def get_products(self, published_only: bool = False) -> list:
@@ -232,30 +294,28 @@ class Partner(Savior):
             published_only: If truthy only return published products
         
         Returns:  
-            A list of products, with their processes grouped by their stages
+            A list of products, with their co2e and number of processes. 
+            See `root.product_rollups`
         """
         _match = {"savior_id": self.savior_id}
         if published_only: _match["published"] = True
-        return list(self.db.products.aggregate(
-            [
-                {"$match": _match},
+        return list(
+            self.db.product_rollups.find(
+                _match,
                 {
-                    "$group": {
-                        "_id": "$product_id", 
-                        "co2e": {"$sum": "$co2e"},
-                        "keywords": {"$first": "$keywords"},
-                        "category": {"$first": "$category"},
-                        "product_id": {"$first": "$product_id"},
-                        "rating": {"$first": "$rating"},
-                        "created_at": {"$first": "$created"},
-                        "last_update": {"$first": "$last_update"},
-                        "image": {"$first": "$image"},
-                        "name": {"$first": "$name"}
-                    }
-                },
-                {"$sort": {"last_update": -1, "created_at": -1}}
-            ]
-        ))
+                    "co2e": 1,
+                    "num_processes": 1,
+                    "keywords": 1,
+                    "category": 1,
+                    "product_id": "$_id",
+                    "rating": 1,
+                    "created_at": 1,
+                    "last_update": 1,
+                    "image": 1,
+                    "name": 1,
+                }
+            ).sort([("last_update", -1), ("created_at", -1)])
+        )
         
     @staticmethod
     def get_product(
@@ -263,72 +323,64 @@ class Partner(Savior):
     ) -> dict:
         """Get a product, its stages and processes.
         
-        Perform an aggregation on products collection to return 
-        high level info from product, such as name last_update, etc,
-        as well as stage and process level info like activity, unit, etc.
+        Read the product's header from product_rollups, with high level 
+        info such as name, last_update and the co2e of the product and 
+        its stages, and its processes, with info like activity, unit, etc.
         
         Args:
             products_collection (pymongo.Collection): The mongodb products collection
-                to perform the aggregation upon.
+                holding the product's processes.
             product_id (str): The product_id of the product to get.
-            matches (dict): A dictionary containing any filters to 
-                add to the $match stage of the aggregation pipeline.
+            matches (dict): A dictionary containing any filters the product
+                must match, e.g published or savior_id.
             
         Returns:
             All the product's processes, emissions, etc    
         """
-        res = products_collection.aggregate([
-            {"$match": {**matches, "product_id": ObjectId(product_id)}},
-            {
-                "$group": {
-                    "_id": "$stage",
-                    "co2e": {"$sum": "$co2e"},
-                    "keywords": {"$first": "$keywords"},
-                    "published": {"$first": "$published"},
-                    "last_update": {"$first": "$created"},
-                    "name": {"$first": "$name"},
-                    "product_id": {"$first": "$product_id"},
-                    "unit_types": {"$first": "$unit_types"},
-                    "activity": {"$first": "$activity"},
-                    "stars": {"$first": "$stars"},
-                    "image": {"$first": "$image"},
-                    "processes": {"$push": {
-                    "_id": "$_id",
-                    "process": "$process",
-                    "activity": "$activity",
-                    "activity_id": "$activity_id",
-                    "activity_unit": "$activity_unit",
-                    "activity_unit_type": "$activity_unit_type",
-                    "activity_value": "$activity_value",
-                    "co2e": "$co2e"
-                    }},
-                },
-            },
+        product_id = ObjectId(product_id)
+        header = products_collection.database.product_rollups.find_one(
+            {**matches, "_id": product_id}
+        )
+        if header is None:
+            return {}
+        processes = {}
+        for process in products_collection.find(
+            {**matches, "product_id": product_id}, 
             {
-                "$group": {
-                    "_id": None, 
-                    "stages": {
-                        "$push": {
-                            "co2e": {"$sum": "$processes.co2e"},
-                            "num_processes": {"$size": "$processes"},
-                            "stage": "$_id",
-                            "processes": "$processes",
-                            "last_update": "$last_update",
-                        }
-                    },
-                    "image": {"$first": "$image"},
-                    "co2e": {"$sum": "$co2e"},
-                    "published": {"$first": "$published"},
-                    "unit_types": {"$first": "$unit_types"},
-                    "product_id": {"$first": "$product_id"},
-                    "activity": {"$first": "$activity"},
-                    "name": {"$first": "$name"},
-                    "stars": {"$first": "$stars"},
-                    "keywords": {"$first": "$keywords"}
-                }
+                "stage": 1,
+                "process": 1,
+                "activity": 1,
+                "activity_id": 1,
+                "activity_unit": 1,
+                "activity_unit_type": 1,
+                "activity_value": 1,
+                "co2e": 1,
             }
-        ])
-        return res.next() if res.alive else {}
+        ):
+            processes.setdefault(process.pop("stage"), []).append(process)
+        return {
+            "_id": None,
+            "stages": [
+                {
+                    "co2e": totals["co2e"],
+                    "num_processes": totals["num_processes"],
+                    "stage": stage,
+                    "processes": processes.get(stage, []),
+                    "last_update": totals["last_update"],
+                }
+                for stage, totals in header["stages"].items() 
+                if totals["num_processes"] > 0
+            ],
+            "image": header.get("image"),
+            "co2e": header["co2e"],
+            "published": header["published"],
+            "unit_types": header.get("unit_types"),
+            "product_id": product_id,
+            "activity": header.get("activity"),
+            "name": header.get("name"),
+            "stars": header.get("stars"),
+            "keywords": header.get("keywords"),
+        }
 
     def get_own_product(self, product_id: str) -> dict:
         """Get a product.
@@ -352,11 +404,21 @@ class Partner(Savior):
         Args:
             process_id (str): The _id of the process
         """
-        return bool(
-            self.db.products.delete_one(
-                {"_id": ObjectId(process_id)}
-            ).deleted_count
+        process = self.db.products.find_one_and_delete(
+            {"_id": ObjectId(process_id), "savior_id": self.savior_id},
+            projection={"product_id": 1, "stage": 1, "co2e": 1},
+        )
+        if process is None:
+            return False
+        product_rollups.apply_process_change(
+            self.db, 
+            product_id=process["product_id"], 
+            stage=process["stage"], 
+            co2e=-(process.get("co2e") or 0), 
+            num_processes=-1,
         )
+        self._bump_data_version("products", "product_rollups")
+        return True
     
     @staticmethod
     def calculate_emissions() -> dict[str, int]:
@@ -398,9 +460,10 @@ class Partner(Savior):
         self.protect_process_request(process=process_data)
         process_data["co2e"] = random.randint(0, 4)
         now = datetime.now(tz=timezone.utc)
-        return self.db.products.insert_one(
+        product_id = ObjectId(product_id)
+        process_id = self.db.products.insert_one(
             {
-                "product_id": ObjectId(product_id), 
+                "product_id": product_id, 
                 "stage": stage, 
                 **process_data, 
                 "savior_id": self.savior_id,
@@ -410,6 +473,16 @@ class Partner(Savior):
                 
             }
         ).inserted_id
+        product_rollups.apply_process_change(
+            self.db, 
+            product_id=product_id, 
+            stage=stage, 
+            co2e=process_data["co2e"], 
+            num_processes=1, 
+            now=now,
+        )
+        self._bump_data_version("products", "product_rollups")
+        return process_id
         
     def update_product_process(self, process_id: str, process_update: dict) -> bool:
         """Update a product's existing process
@@ -439,20 +512,53 @@ class Partner(Savior):
             requested_fields=process_update, allowed_fields=allowed_fields
         )
         process_update["co2e"] = random.randint(0, 4)
-        return self._perform_collection_update(
-            "products", 
-            find={"_id": ObjectId(process_id)}, 
-            update={"$set": process_update},
-            error_message=f"Process with id {process_id} not found"
+        now = datetime.now(tz=timezone.utc)
+        process = self.db.products.find_one_and_update(
+            {"_id": ObjectId(process_id), "savior_id": self.savior_id}, 
+            {"$set": {**process_update, "last_update": now}},
+            projection={"product_id": 1, "stage": 1, "co2e": 1},
+            return_document=ReturnDocument.BEFORE,
         )
+        if process is None:
+            raise ResourceNotFoundError(f"Process with id {process_id} not found")
+        product_rollups.apply_process_change(
+            self.db, 
+            product_id=process["product_id"], 
+            stage=process["stage"], 
+            co2e=process_update["co2e"] - (process.get("co2e") or 0), 
+            num_processes=0,
+            now=now,
+        )
+        self._bump_data_version("products", "product_rollups")
+        return True
     
     def calculate_file_emissions(self, data: list[dict]) -> int:
-        """Batch calculate emissions of uploaded files and insert the logs into db"""
-        ghg_calculator = GHGCalculator(region=self.savior["region"] or "US")
+        """Batch calculate emissions of uploaded files and insert the logs into db
+        
+        The summaries of the files the logs belong to are refreshed,
+        and the logs are moved to the emission rollups of their new co2e.
+        """
+        ghg_calculator = GHGCalculator(region=self.context["region"] or "US")
+        db = self.db
+        logs_filter = {
+            "savior_id": self.savior_id, 
+            "_id": {"$in": [ObjectId(doc["_id"]) for doc in data]},
+        }
+        file_ids = db.logs.distinct("source_file.id", logs_filter)
+        replaced_logs = list(
+            db.logs.find(logs_filter, {**emission_rollups.LOG_PROJECTION, "_id": 0})
+        )
         calculations = ghg_calculator.calculate_batches(
                 data, savior_id=self.savior_id, return_replacements=True
             )
-        return self.db.logs.bulk_write(calculations).inserted_count
+        inserted_count = db.logs.bulk_write(calculations).inserted_count
+        file_summaries.refresh(db, self.savior_id, file_ids=file_ids)
+        emission_rollups.record(db, replaced_logs, sign=-1)
+        emission_rollups.record(
+            db, db.logs.find(logs_filter, emission_rollups.LOG_PROJECTION)
+        )
+        self._bump_data_version("logs", "files", "emission_rollups")
+        return inserted_count
     
     @property
     def all_product_stages(self):
@@ -510,6 +616,10 @@ class Partner(Savior):
                 }
             )
         products_collection.insert_many(product_data)
+        self.db.product_rollups.insert_one(
+            product_rollups.build(product_id, product_data)
+        )
+        self._bump_data_version("products", "product_rollups")
         return product_id
 
     def assert_product_publishable(self, product_id: ObjectId) -> bool:
@@ -559,9 +669,12 @@ class Partner(Savior):
         res = self._perform_collection_update(
             "products", 
             find={"savior_id": savior_id, "product_id": product_id}, 
-            update={"$set": {"last_update": datetime.now(tz=timezone.utc), "published": True}},
+            update={"$set": {"last_update": now, "published": True}},
             error_message=f"Product with id {product_id} does not exist"
         )
+        self.db.product_rollups.update_one(
+            {"_id": product_id}, {"$set": {"last_update": now, "published": True}}
+        )
         products_collection.aggregate(
             [
                 {"$match": {"savior_id": savior_id, "product_id": product_id}},
@@ -592,6 +705,7 @@ class Partner(Savior):
                 {"$merge": {"into": "emission_factors"}}
             ]
         )
+        self._bump_data_version("products", "product_rollups", "emission_factors")
         return res
         
     def unpublish_product(self, product_id: str) -> bool:
@@ -612,14 +726,28 @@ class Partner(Savior):
         db.emission_factors.delete_one(
             {"savior_id": self.savior_id, "product_id": product_id}
         )
+        emission_rollups.record(
+            db, 
+            db.product_logs.find(
+                {"product_id": product_id}, emission_rollups.LOG_PROJECTION
+            ), 
+            sign=-1,
+        )
         db.product_logs.delete_many({"product_id": product_id})
         # db.stars.delete_many({"resource_id": product_id})
-        return self._perform_collection_update(
+        res = self._perform_collection_update(
             collection_name="products",
             find={"product_id": product_id},
             update={"$set": {"published": False}},
             error_message=f"Product with id {product_id} does not exist"
         )
+        db.product_rollups.update_one(
+            {"_id": product_id}, {"$set": {"published": False}}
+        )
+        self._bump_data_version("products", "product_rollups", "emission_factors")
+        # the deleted product logs are those of any user
+        data_cache.bump(None, "product_logs", "emission_rollups")
+        return res
 
     def update_product(self, updates: dict[str, str], product_id: str) -> bool:
         """Update a product
@@ -652,12 +780,18 @@ class Partner(Savior):
                 "A product with that name has already been created"
             )
         product_id = ObjectId(product_id)
-        return self._perform_collection_update(
+        updates = {k: v.strip() for (k, v) in updates.items()} #strip whitespace
+        res = self._perform_collection_update(
             collection_name="products",
             find={"savior_id": savior_id, "product_id": product_id}, 
-            update={"$set": {k: v.strip() for (k, v) in updates.items()}}, #strip whitespace
+            update={"$set": updates},
             error_message=f"Product with id {product_id} does not exist"
         )
+        self.db.product_rollups.update_one(
+            {"_id": product_id, "savior_id": savior_id}, {"$set": updates}
+        )
+        self._bump_data_version("products", "product_rollups")
+        return res
         
     def delete_product(self, product_id: str) -> bool:
         """Delete a product from the collection
@@ -678,12 +812,16 @@ class Partner(Savior):
             find={"product_id": product_id, "savior_id": self.savior_id},
             error_message=f"Product with id {product_id} does not exist",
         )
-        print("HEREEEE ", )
-        return bool(
+        self.db.product_rollups.delete_one(
+            {"_id": product_id, "savior_id": self.savior_id}
+        )
+        deleted = bool(
             self.db.products.delete_many(
                 {"product_id": product_id, "savior_id": self.savior_id}
             ).deleted_count
         )
+        self._bump_data_version("products", "product_rollups")
+        return deleted
         
     def get_tasks(self, query_params: dict={}) -> list:
         """Get tasks
@@ -713,7 +851,9 @@ class Partner(Savior):
     def create_task(self, task_data: dict) -> ObjectId:
         # raise Exception("Invalid data")
         # TODO: HAVE TO IMPLEMENT TASK INSERTION
-        return self.db.tasks.insert_one(task_data).inserted_id
+        task_id = self.db.tasks.insert_one(task_data).inserted_id
+        self._bump_data_version("tasks")
+        return task_id
         
     def complete_task(self, task_id: str, create_follow_up: bool = False) -> bool:
         """Complete a task
@@ -727,12 +867,14 @@ class Partner(Savior):
         Raises:
             Exception: If no task was found when updating
         """
-        return self._perform_collection_update(
+        res = self._perform_collection_update(
             collection_name="tasks",
             find={"_id": ObjectId(task_id)},
             update={"$set": {"complete": True}},
             error_message=f"Task {task_id} does not exist"
         )
+        self._bump_data_version("tasks")
+        return res
         
     def assign_task(self, task_id: str, assignee: str) -> bool:
         """Assign a task to a user
@@ -753,12 +895,14 @@ class Partner(Savior):
         if assignee not in possible_assingees:
             # raise ResourceNotFoundError(f"No user with the username {assignee} found")
             pass
-        return self._perform_collection_update(
+        res = self._perform_collection_update(
             collection_name="tasks",
             find={"savior_id": savior_id, "_id": ObjectId(task_id)},
             update={"$set": {"assignee": assignee}},
             error_message=f"Task with id {task_id} does not exist"
         )
+        self._bump_data_version("tasks")
+        return res
         
         
     def process_file_logs(
@@ -786,49 +930,71 @@ class Partner(Savior):
             MissingRequestDataError: When the request is missing any data.
             InvalidRequestDataError: When the request contains invalid data.
         """
-        import random 
-        savior_id = self.savior_id
-        db = self.db
         file_id = ObjectId()
         now = datetime.now(tz=timezone.utc)
+        self._insert_file_logs(file_logs, file_id=file_id, upload_date=now)
+        self.db.files.insert_one(
+            file_summaries.summarize(
+                file_id=file_id, 
+                savior_id=self.savior_id, 
+                name=file_logs[0]["source_file"].get("name"),
+                upload_date=now,
+                logs=file_logs,
+            )
+        )
+        self._finish_file_upload(task_id, create_follow_up_task=create_follow_up_task)
+        return file_id
+    
+    def _insert_file_logs(
+        self, file_logs: list[dict], file_id: ObjectId, upload_date: datetime
+    ) -> None:
+        """Calculate emissions of, stamp and insert logs of a file, see `process_file_logs`"""
+        import random 
+        savior_id, team = self.savior_id, self.savior.get("team")
         for log in file_logs:
             log.update(
                 {
                     "co2e": random.randint(0, 10), 
                     "savior_id": savior_id, 
+                    "team": team,
                 }
             )
-            log["source_file"].update({"id": file_id, "upload_date": now})
-        db.logs.insert_many(file_logs)
+            log["source_file"].update({"id": file_id, "upload_date": upload_date})
+        self.db.logs.insert_many(file_logs)
+        emission_rollups.record(self.db, file_logs)
+        
+    def _finish_file_upload(
+        self, task_id: str | None, create_follow_up_task: bool = False
+    ) -> None:
+        """Invalidate cached data of uploaded logs, and complete the upload's task"""
+        self._bump_data_version("logs", "files", "emission_rollups")
         if task_id:
             self.complete_task(
                 task_id=task_id,
                 create_follow_up=create_follow_up_task
             )
-        return file_id
-    
-    def handle_emissions_file(
-        self, file_df: DataFrame, get_form_field: ImmutableMultiDict.get, filename: str
-    ) -> ObjectId:
-        """Perform a file upload 
+            
+    @staticmethod
+    def _file_column_fallbacks(
+        columns: Iterable[str], get_form_field: ImmutableMultiDict.get
+    ) -> dict:
+        """Get the form fields to fill the columns missing from an uploaded file.
         
-        Insert file logs to 'logs' collection. 
-                
         Args:
-            file_df: The uploaded file as a pandas DataFrame
+            columns (Iterable): The columns of the file.
             get_form_field (ImmutableMultiDict.get): The `get` method of the requests form
-            filename: What to name the file when inserting as logs to mongodb
         
         Returns:
-            the id of the file created during the upload process
+            The values to assign to each log of the file, empty when
+            the file has all columns
         
         Raises:
-            MissingRequestDataError: When the request is missing data fields
+            MissingRequestDataError: When a column is missing and has no form field.
         """
         form_postable_fields = ("scope", "category", "unit_type")
         missing_columns, assigns = [], {}
         for required_col in ("activity", "value", "unit", *form_postable_fields):
-            if not required_col in file_df:
+            if not required_col in columns:
                 if required_col in form_postable_fields:
                     fallback = get_form_field(required_col)
                     if fallback:
@@ -842,16 +1008,240 @@ class Partner(Savior):
                 f"Missing data fields: {', '.join(missing_columns)}"
             )
         elif assigns:
-            file_df = file_df.assign(
-                **assigns,
-                ghg_category=get_form_field("ghg_category", None)
-            )
-        file_df.loc[:, "source_file"] = [{"name": filename}] * len(file_df)
-        documents = file_df.replace({np.nan: None}).to_dict("records")
+            assigns["ghg_category"] = get_form_field("ghg_category", None)
+        return assigns
+    
+    @staticmethod
+    def _validate_file_df(
+        file_df: DataFrame, assigns: dict
+    ) -> tuple[DataFrame, validation.ValidationReport]:
+        """Fill in the columns of an uploaded file's rows, and validate them.
+        
+        See `_file_column_fallbacks` and `validation.validate`.
+        """
+        if assigns:
+            file_df = file_df.assign(**assigns)
+        return validation.validate(file_df)
+    
+    @staticmethod
+    def _file_df_to_logs(file_df: DataFrame, filename: str) -> list[dict]:
+        """Turn validated rows of an uploaded file to logs"""
+        file_df.loc[:, "source_file"] = [{"name": filename} for _ in range(len(file_df))]
+        return file_df.replace({np.nan: None}).to_dict("records")
+    
+    def handle_emissions_file(
+        self, file_df: DataFrame, get_form_field: ImmutableMultiDict.get, filename: str
+    ) -> ObjectId:
+        """Perform a file upload 
+        
+        Insert file logs to 'logs' collection. 
+                
+        Args:
+            file_df: The uploaded file as a pandas DataFrame
+            get_form_field (ImmutableMultiDict.get): The `get` method of the requests form
+            filename: What to name the file when inserting as logs to mongodb
+        
+        Returns:
+            the id of the file created during the upload process
+        
+        Raises:
+            MissingRequestDataError: When the request is missing data fields
+            FileValidationError: When rows have invalid values
+        """
+        assigns = self._file_column_fallbacks(file_df.columns, get_form_field)
+        file_df, report = self._validate_file_df(file_df, assigns)
+        report.raise_for_errors()
+        documents = self._file_df_to_logs(file_df, filename)
         file_id = self.process_file_logs(
             file_logs=documents, task_id=get_form_field("task_id")
         )
         return file_id
+    
+    def ingest_emissions_file(
+        self, 
+        chunks: Iterable[DataFrame], 
+        get_form_field: ImmutableMultiDict.get, 
+        filename: str,
+        progress: Callable[[dict], Any] | None = None,
+    ) -> ingest.IngestResult:
+        """Perform a file upload a chunk of rows at a time.
+        
+        Like `handle_emissions_file`, but only one chunk of the file is held
+        in memory, and inserted, at a time. See `root.ingest`. Once a chunk
+        has invalid rows, the rest are only validated, so that the errors
+        of the whole file are reported, and nothing is inserted.
+        
+        Args:
+            chunks (Iterable[DataFrame]): The chunks of the uploaded file,
+                e.g from `ingest.file_chunks`
+            get_form_field (ImmutableMultiDict.get): The `get` method of the requests form
+            filename: What to name the file when inserting as logs to mongodb
+            progress (Callable): Optional. Called after each chunk with a dict
+                with fields: rows_parsed, rows_inserted and rows_failed, the
+                number of rows with invalid values, e.g see `root.ingest_jobs`
+        
+        Returns:
+            The counters of the upload, with the id of the file created
+        
+        Raises:
+            MissingRequestDataError: When the request is missing data fields
+            InvalidRequestDataError: When the file has no rows, or can't be parsed
+            FileValidationError: When rows have invalid values
+        """
+        result = ingest.IngestResult(file_id=ObjectId())
+        report = validation.ValidationReport()
+        now = datetime.now(tz=timezone.utc)
+        assigns, rows_parsed = None, 0
+        try:
+            for chunk in chunks:
+                if assigns is None:
+                    assigns = self._file_column_fallbacks(chunk.columns, get_form_field)
+                rows_parsed += len(chunk)
+                chunk, chunk_report = self._validate_file_df(chunk, assigns)
+                report.merge(chunk_report)
+                if not (report or chunk.empty):
+                    logs = self._file_df_to_logs(chunk, filename)
+                    self._insert_file_logs(logs, file_id=result.file_id, upload_date=now)
+                    result.add(logs)
+                if progress is not None:
+                    progress(
+                        {
+                            "rows_parsed": rows_parsed,
+                            "rows_inserted": result.num_rows,
+                            "rows_failed": report.num_invalid_rows,
+                        }
+                    )
+            report.raise_for_errors()
+        except BaseException:
+            if result.num_rows:
+                self._delete_file_logs(result.file_id)
+            raise
+        if not result.num_rows:
+            raise InvalidRequestDataError("The file has no rows")
+        self.db.files.insert_one(
+            file_summaries.summary(
+                file_id=result.file_id,
+                savior_id=self.savior_id,
+                name=filename,
+                upload_date=now,
+                num_rows=result.num_rows,
+                co2e=result.co2e,
+                processed=result.processed,
+            )
+        )
+        self._finish_file_upload(get_form_field("task_id"))
+        return result
+    
+    def ingest_workbook(
+        self, 
+        path: str, 
+        sheets: list[str], 
+        get_form_field: ImmutableMultiDict.get, 
+        filename: str,
+    ) -> list[ingest.IngestResult]:
+        """Upload sheets of a workbook, each as a file of its own.
+        
+        Sheets are parsed in parallel, see `ingest.parse_sheets`. Columns
+        a sheet doesn't have are filled with the scope and category named by 
+        the sheet, see `ingest.sheet_fields`, then with the form's fields.
+        Files are named after their workbook and sheet, e.g ledger.xlsx - Scope 2.
+        Either every sheet is inserted, or none are.
+        
+        Args:
+            path (str): The workbook, saved to disk.
+            sheets (list[str]): The names of the sheets to upload, or ["all"].
+            get_form_field (ImmutableMultiDict.get): The `get` method of the requests form
+            filename (str): The name of the workbook.
+        
+        Returns:
+            The counters of each sheet's upload, empty sheets are skipped
+        
+        Raises:
+            MissingRequestDataError: When a sheet is missing data fields
+            InvalidRequestDataError: When no sheets are given, a sheet
+                doesn't exist, can't be parsed, or no sheet has rows
+        """
+        names = ingest.sheet_names(path)
+        if sheets == ["all"]:
+            sheets = names
+        if not sheets:
+            raise InvalidRequestDataError("No sheets given")
+        unknown = [sheet for sheet in sheets if sheet not in names]
+        if unknown:
+            raise InvalidRequestDataError(f"Invalid sheets: {', '.join(unknown)}")
+        results = []
+        try:
+            for sheet, chunks in ingest.parse_sheets(path, sheets):
+                fields = ingest.sheet_fields(sheet)
+                def get_sheet_field(name: str, default: Any = None) -> Any:
+                    if name == "task_id":
+                        return None  # completed once every sheet is inserted
+                    return fields.get(name) or get_form_field(name, default)
+                results.append(
+                    self.ingest_emissions_file(
+                        chunks=chunks, 
+                        get_form_field=get_sheet_field, 
+                        filename=f"{filename} - {sheet}",
+                    )
+                )
+        except BaseException:
+            for result in results:
+                self._delete_file(result.file_id)
+            raise
+        if not results:
+            raise InvalidRequestDataError("The file has no rows")
+        self._finish_file_upload(get_form_field("task_id"))
+        return results
+    
+    def submit_file_job(self, file: IO, filename: str, form: dict) -> ObjectId:
+        """Upload an emissions file in the background.
+        
+        For files too large to ingest within a request, see `root.ingest_jobs`.
+        
+        Args:
+            file (IO): The uploaded file, or its stream.
+            filename (str): The name of the file, its extension is its type.
+            form (dict): The request's form, see `handle_emissions_file`.
+        
+        Returns:
+            The _id of the job, to poll with `get_file_job`
+        
+        Raises:
+            InvalidMediaTypeError: When the file type can't be uploaded in the background.
+        """
+        return ingest_jobs.submit(
+            self.db, 
+            self.savior_id, 
+            user_id=self.current_user_id, 
+            file=file, 
+            filename=filename, 
+            form=form,
+        )
+    
+    def get_file_job(self, job_id: str) -> dict:
+        """Get the status and progress of one of the partner's file uploads.
+        
+        Raises:
+            ResourceNotFoundError: When the partner has no such upload job.
+        """
+        return ingest_jobs.get(self.db, self.savior_id, job_id)
+    
+    def _delete_file(self, file_id: ObjectId) -> None:
+        """Delete an uploaded file's logs and summary"""
+        self._delete_file_logs(file_id)
+        self.db.files.delete_one({"_id": file_id, "savior_id": self.savior_id})
+        self._bump_data_version("files")
+    
+    def _delete_file_logs(self, file_id: ObjectId) -> None:
+        """Delete the logs of a partially inserted file, and remove them from rollups"""
+        match = {"savior_id": self.savior_id, "source_file.id": file_id}
+        emission_rollups.record(
+            self.db, 
+            self.db.logs.find(match, emission_rollups.LOG_PROJECTION), 
+            sign=-1,
+        )
+        self.db.logs.delete_many(match)
+        self._bump_data_version("logs", "emission_rollups")
 
     @staticmethod
     def get_partner(db: Database, partner_id: str) -> dict:
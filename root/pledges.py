@@ -1,5 +1,259 @@
+"""Progress of users' current pledges.
 
-    
-    
-    
-    
\ No newline at end of file
+A pledge is a user's promise to stay within `co2e` every `frequency`,
+a day, week, month or year. Rather than aggregating a user's product logs
+every time their progress is shown, counters of the current period are
+kept in `pledge_progress`, one document per user, keyed by their _id:
+
+    {
+        "_id": savior_id,
+        "frequency": "week",
+        "period": datetime(2024, 5, 6),
+        "co2e": 12.5,
+        "count": 4,
+        "streak": 3,
+    }
+
+`co2e` and `count` are the co2e and number of product logs of the current
+period, and `streak` is how many periods in a row, before the current
+one, stayed within the pledge. Periods start at midnight UTC, weeks on
+mondays.
+
+Every product log is `record`ed. The first log of a new period rolls the
+counters over, settling the previous period's streak. Periods without
+logs stayed within the pledge, so they extend the streak. Reading the
+progress rolls over a copy of the counters, they are only written when
+they don't exist yet, e.g for pledges made before counters were kept.
+"""
+
+import logging
+from datetime import datetime, timedelta, timezone
+from numbers import Number
+from typing import Literal
+from bson import ObjectId
+from pymongo.database import Database
+from exceptions import InvalidRequestDataError
+
+logger = logging.getLogger(__name__)
+
+Frequency = Literal["day", "week", "month", "year"]
+
+FREQUENCIES = ("day", "week", "month", "year")
+
+def validate_frequency(frequency: str) -> Frequency:
+    """Assert `frequency` is the frequency of a pledge.
+
+    Raises:
+        InvalidRequestDataError: When it isn't
+    """
+    if frequency not in FREQUENCIES:
+        raise InvalidRequestDataError(
+            f"Invalid pledge frequency: {frequency}, must be one of {', '.join(FREQUENCIES)}"
+        )
+    return frequency
+
+def _utc(date: datetime) -> datetime:
+    """Pymongo returns naive dates, which are in UTC"""
+    if date.tzinfo is None:
+        return date.replace(tzinfo=timezone.utc)
+    return date.astimezone(timezone.utc)
+
+def period_start(frequency: Frequency, date: datetime) -> datetime:
+    """The start of the period `date` falls into.
+
+    Args:
+        frequency (Literal[day, week, month, year]): The length of the period.
+        date (datetime): Any date of the period.
+
+    Returns:
+        The first moment of the period, in UTC
+    """
+    day = _utc(date).replace(hour=0, minute=0, second=0, microsecond=0)
+    if frequency == "day":
+        return day
+    if frequency == "week":
+        return day - timedelta(days=day.weekday())
+    if frequency == "month":
+        return day.replace(day=1)
+    return day.replace(month=1, day=1)
+
+def period_end(frequency: Frequency, start: datetime) -> datetime:
+    """The start of the period after the one starting at `start`"""
+    if frequency == "day":
+        return start + timedelta(days=1)
+    if frequency == "week":
+        return start + timedelta(weeks=1)
+    if frequency == "month":
+        return start.replace(
+            year=start.year + start.month // 12, month=start.month % 12 + 1
+        )
+    return start.replace(year=start.year + 1)
+
+def _periods_between(frequency: Frequency, start: datetime, end: datetime) -> int:
+    """How many periods apart two period starts are"""
+    if frequency == "day":
+        return (end - start).days
+    if frequency == "week":
+        return (end - start).days // 7
+    if frequency == "month":
+        return (end.year - start.year) * 12 + end.month - start.month
+    return end.year - start.year
+
+def _pledged_co2e(pledge: dict) -> float | None:
+    """The co2e of a pledge, None when it isn't a number"""
+    try:
+        return float(pledge["co2e"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def roll_over(counters: dict, pledge: dict, now: datetime) -> dict:
+    """Get the counters of the period `now` falls into.
+
+    Args:
+        counters (dict): The stored counters, see module docstring.
+        pledge (dict): The user's current pledge.
+        now (datetime): The current date.
+
+    Returns:
+        `counters` when they are of the current period, otherwise
+        new counters, with the streak of all elapsed periods settled
+    """
+    frequency = counters["frequency"]
+    period, current = _utc(counters["period"]), period_start(frequency, now)
+    if current <= period:
+        return counters
+    elapsed = _periods_between(frequency, period, current)
+    pledged = _pledged_co2e(pledge)
+    if pledged is not None and counters["co2e"] <= pledged:
+        streak = counters["streak"] + elapsed
+    else:
+        # the periods after the exceeded one, they had no logs
+        streak = elapsed - 1
+    return {**counters, "period": current, "co2e": 0, "count": 0, "streak": streak}
+
+def reset(
+    db: Database, savior_id: ObjectId, pledge: dict, now: datetime | None = None
+) -> dict:
+    """Count the current period from the user's product logs.
+
+    The streak starts over, for when a pledge is first made or
+    its frequency changes.
+
+    Args:
+        db (Database): The database holding `pledge_progress` and `product_logs`.
+        savior_id (ObjectId): The user's _id.
+        pledge (dict): The user's current pledge.
+        now (datetime): Optional. The current date.
+
+    Returns:
+        The new counters
+    """
+    frequency = validate_frequency(pledge["frequency"])
+    period = period_start(frequency, now or datetime.now(tz=timezone.utc))
+    totals = next(
+        db.product_logs.aggregate(
+            [
+                {"$match": {"savior_id": savior_id, "created_at": {"$gte": period}}},
+                {"$group": {"_id": None, "co2e": {"$sum": "$co2e"}, "count": {"$sum": 1}}},
+            ]
+        ),
+        {"co2e": 0, "count": 0},
+    )
+    counters = {
+        "_id": savior_id,
+        "frequency": frequency,
+        "period": period,
+        "co2e": totals["co2e"],
+        "count": totals["count"],
+        "streak": 0,
+    }
+    db.pledge_progress.replace_one({"_id": savior_id}, counters, upsert=True)
+    return counters
+
+def record(
+    db: Database,
+    savior_id: ObjectId,
+    pledge: dict | None,
+    co2e: float,
+    now: datetime | None = None,
+) -> None:
+    """Count a product log towards the user's current pledge.
+
+    Call after the log is inserted. Pledges made before frequencies were
+    validated may have an invalid one, they aren't counted rather than
+    failing the log.
+
+    Args:
+        db (Database): The database holding `pledge_progress`.
+        savior_id (ObjectId): The user's _id.
+        pledge (dict): The user's current pledge, nothing is counted without one.
+        co2e (float): The co2e of the log.
+        now (datetime): Optional. When the log was created.
+    """
+    if not pledge:
+        return
+    if pledge.get("frequency") not in FREQUENCIES:
+        logger.warning(
+            "Not counting a log of %s, invalid pledge frequency: %s",
+            savior_id, pledge.get("frequency"),
+        )
+        return
+    co2e = co2e if isinstance(co2e, Number) else 0
+    now = now or datetime.now(tz=timezone.utc)
+    counters = db.pledge_progress.find_one({"_id": savior_id})
+    if counters is None or counters["frequency"] != pledge["frequency"]:
+        reset(db, savior_id, pledge, now=now)  # counts the inserted log
+        return
+    current = roll_over(counters, pledge, now)
+    if current is not counters:
+        # only the first log of a period matches the previous period
+        db.pledge_progress.update_one(
+            {"_id": savior_id, "period": counters["period"]},
+            {
+                "$set": {
+                    "period": current["period"],
+                    "co2e": 0,
+                    "count": 0,
+                    "streak": current["streak"],
+                }
+            },
+        )
+    db.pledge_progress.update_one(
+        {"_id": savior_id, "period": current["period"]},
+        {"$inc": {"co2e": co2e, "count": 1}},
+    )
+
+def progress(
+    db: Database, savior_id: ObjectId, pledge: dict | None, now: datetime | None = None
+) -> dict | None:
+    """Get the progress of the user's current pledge.
+
+    Args:
+        db (Database): The database holding `pledge_progress`.
+        savior_id (ObjectId): The user's _id.
+        pledge (dict): The user's current pledge.
+        now (datetime): Optional. The current date.
+
+    Returns:
+        A dict with fields: frequency, period_start, period_end, co2e, count,
+        streak, pledged_co2e, and remaining_co2e, the co2e left to stay within the
+        pledge. None if the user has no pledge.
+    """
+    if not pledge:
+        return None
+    now = now or datetime.now(tz=timezone.utc)
+    counters = db.pledge_progress.find_one({"_id": savior_id})
+    if counters is None or counters["frequency"] != pledge["frequency"]:
+        counters = reset(db, savior_id, pledge, now=now)
+    counters = roll_over(counters, pledge, now)
+    start, pledged = _utc(counters["period"]), _pledged_co2e(pledge)
+    return {
+        "frequency": counters["frequency"],
+        "period_start": start,
+        "period_end": period_end(counters["frequency"], start),
+        "co2e": counters["co2e"],
+        "count": counters["count"],
+        "streak": counters["streak"],
+        "pledged_co2e": pledged,
+        "remaining_co2e": None if pledged is None else pledged - counters["co2e"],
+    }
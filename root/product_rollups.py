@@ -0,0 +1,147 @@
+"""Rollups of products and their stages.
+
+A product is stored as its processes, one `products` document each.
+Listing products or loading a product page used to group all of them.
+Instead, every product has a header document in `product_rollups`, keyed
+by its product_id, with the product level fields, its co2e total and
+num_processes, and the same totals per stage:
+
+    {
+        "_id": product_id,
+        "savior_id": ...,
+        "name": ...,
+        "published": False,
+        "co2e": 12,
+        "num_processes": 3,
+        "last_update": ...,
+        "stages": {"sourcing": {"co2e": 4, "num_processes": 1, "last_update": ...}},
+        ...
+    }
+
+`Partner` writes to a product's processes and its header together. Process
+writes apply their difference to the totals with `apply_process_change`, so
+headers are never rebuilt from all processes, except by `refresh`, which
+repairs a header, and `backfill` which creates headers of existing products.
+"""
+
+from datetime import datetime, timezone
+from bson import ObjectId
+from pymongo.database import Database
+
+# product level fields, the same for all processes of a product
+PRODUCT_FIELDS = (
+    "savior_id",
+    "name",
+    "keywords",
+    "category",
+    "published",
+    "rating",
+    "image",
+    "unit_types",
+    "activity",
+    "stars",
+    "created_at",
+)
+
+def build(product_id: ObjectId, processes: list[dict]) -> dict:
+    """Create the header of a product from its processes.
+
+    Args:
+        product_id (ObjectId): The product_id of the product.
+        processes (list): All processes of the product.
+
+    Returns:
+        The header document
+    """
+    first = processes[0]
+    header = {field: first.get(field) for field in PRODUCT_FIELDS}
+    stages, last_update = {}, None
+    for process in processes:
+        stage = stages.setdefault(
+            process["stage"], {"co2e": 0, "num_processes": 0, "last_update": None}
+        )
+        stage["co2e"] += process.get("co2e") or 0
+        stage["num_processes"] += 1
+        process_update = process.get("last_update")
+        if process_update is not None:
+            if stage["last_update"] is None or process_update > stage["last_update"]:
+                stage["last_update"] = process_update
+            if last_update is None or process_update > last_update:
+                last_update = process_update
+    return {
+        **header,
+        "_id": product_id,
+        "published": bool(header["published"]),
+        "co2e": sum(stage["co2e"] for stage in stages.values()),
+        "num_processes": len(processes),
+        "last_update": last_update,
+        "stages": stages,
+    }
+
+def apply_process_change(
+    db: Database,
+    product_id: ObjectId,
+    stage: str,
+    co2e: float,
+    num_processes: int,
+    now: datetime | None = None,
+) -> bool:
+    """Add a process's change to the totals of its product and stage.
+
+    Args:
+        db (Database): The database holding `product_rollups`.
+        product_id (ObjectId): The product of the process.
+        stage (str): The stage of the process.
+        co2e (float): The difference in co2e, negative when it decreased.
+        num_processes (int): 1 when a process was created, -1 when deleted,
+            otherwise 0.
+        now (datetime): Optional. When the change happened.
+
+    Returns:
+        Whether the product has a header
+    """
+    now = now or datetime.now(tz=timezone.utc)
+    return bool(
+        db.product_rollups.update_one(
+            {"_id": product_id},
+            {
+                "$inc": {
+                    "co2e": co2e,
+                    "num_processes": num_processes,
+                    f"stages.{stage}.co2e": co2e,
+                    f"stages.{stage}.num_processes": num_processes,
+                },
+                "$set": {"last_update": now, f"stages.{stage}.last_update": now},
+            },
+        ).matched_count
+    )
+
+def refresh(db: Database, product_id: ObjectId) -> dict | None:
+    """Rebuild the header of a product from its processes.
+
+    Args:
+        db (Database): The database holding `products` and `product_rollups`.
+        product_id (ObjectId): The product to rebuild.
+
+    Returns:
+        The header, None if the product has no processes
+        in which case its header is deleted
+    """
+    processes = list(db.products.find({"product_id": product_id}))
+    if not processes:
+        db.product_rollups.delete_one({"_id": product_id})
+        return None
+    header = build(product_id, processes)
+    db.product_rollups.replace_one({"_id": product_id}, header, upsert=True)
+    return header
+
+def backfill(db: Database) -> int:
+    """Rebuild the headers of all products.
+
+    Returns:
+        The number of products
+    """
+    product_ids = db.products.distinct("product_id")
+    for product_id in product_ids:
+        refresh(db, product_id)
+    return len(product_ids)
@@ -3,15 +3,38 @@
 Implements common functionalities for user and partner CRUD operations.
 """
 
+import time
 from datetime import datetime, timezone
-import pymongo
-from typing import Literal, Any
+from typing import Literal, Any, Iterator
 from pymongo.collection import Collection
+from pymongo.cursor import Cursor
+from pymongo.command_cursor import CommandCursor
+from pymongo.errors import ExecutionTimeout, OperationFailure
 from bson import ObjectId
 from typing import Type
 from exceptions import (
     ResourceNotFoundError, MissingRequestDataError, InvalidRequestDataError
 )
+from database import mongo
+from root.cache import TTLCache
+from root import pagination, emission_rollups, data_cache, guards, jobs, cursors, catalog
+from config import Config
+
+config = Config()
+profile_cache = TTLCache(
+    ttl=config.profile_cache_ttl, maxsize=config.profile_cache_size
+)
+# The jwt claim holding a savior context, and the version of its layout
+CONTEXT_CLAIM = "ctx"
+CONTEXT_VERSION = 1
+# The latest `account_version` this process wrote, per account _id. A context
+# older than `jwt_context_max_age` is never trusted, so neither is kept longer.
+# Note: Versions aren't shared between processes, with more than one worker a
+# profile update makes contexts stale on the worker that wrote it right away,
+# and on the others once they're older than `jwt_context_max_age`
+account_versions = TTLCache(
+    ttl=config.jwt_context_max_age, maxsize=config.profile_cache_size
+)
 
 class Savior:
     """Create a `Savior` instance.
@@ -21,29 +44,164 @@ class Savior:
     and static methods for direct usage.
     
     Attributes:
-        _close (Callable): A lambda function to close
-                the MongoClient that was created when initiating
-                this class.
         db (pymongo.Database): The mongodb database holding all
-            collections a partner or user will access.
+            collections a partner or user will access. It's backed
+            by the process-wide client of `database.mongo`.
         savior_id (str): The relevant _id of the savior's account.
             Will be used to query collections.
+        savior (dict): The requesting savior's account. It's read once
+            per instance, i.e per request, and optionally cached across
+            requests for `Config.profile_cache_ttl` seconds.
+        context (dict): The fields of the account most views need,
+            see `make_context`. Taken from jwt claims when fresh,
+            otherwise from `savior`.
         """
     __slots__ = (
         "savior_id", 
         "db",
-        "_close"
+        "_savior",
+        "_context",
+        "_context_from_claims",
     )
     
-    def __init__(self, savior_id: str):
+    def __init__(self, savior_id: str, context: dict | None = None):
         """Initializes a Savior instance.
         
         Args:
             savior_id (str): The account _id of the savior to initialize.
+            context (dict): Optional. A savior context from jwt claims,
+                it's ignored when stale, see `is_fresh_context`.
+        """
+        self.db, self.savior_id = mongo.db, ObjectId(savior_id)
+        self._savior = None
+        self._context_from_claims = self.is_fresh_context(
+            context, account_id=self._account_id
+        )
+        self._context = context if self._context_from_claims else None
+        
+    @property
+    def _account_id(self) -> str:
+        """The _id of the requesting account, keys the profile cache"""
+        return str(self.savior_id)
+    
+    def _find_savior(self) -> dict | None:
+        """Read the requesting savior's account from the db.
+        
+        Implemented by subclasses, see `savior`.
+        """
+        raise NotImplementedError
+        
+    @property
+    def savior(self) -> dict | None:
+        if self._savior is None:
+            savior = profile_cache.get_or_set(self._account_id, self._find_savior)
+            self._savior = dict(savior) if savior is not None else None
+        return self._savior
+    
+    def _invalidate_savior(self, *account_ids: str) -> None:
+        """Forget cached accounts after they are written to.
+        
+        Args:
+            *account_ids (str): The _ids of the written accounts.
+                Defaults to the requesting account's.
+        """
+        self._savior, self._context = None, None
+        self._context_from_claims = False
+        for account_id in account_ids or (self._account_id,):
+            profile_cache.pop(str(account_id))
+            
+    def _record_account_version(self, account: dict | None) -> None:
+        """Remember the `account_version` of a written account.
+        
+        Contexts of the account issued before the write are stale
+        from then on, at least in this process.
+        
+        Args:
+            account (dict): The written account, with its _id
+                and `account_version` fields.
+        """
+        if account is None:
+            return None
+        account_id = str(account["_id"])
+        version = account.get("account_version", 0)
+        account_versions.set(
+            account_id, max(version, account_versions.get(account_id, 0))
+        )
+        
+    @staticmethod
+    def make_context(account: dict, company_id: str | None = None) -> dict:
+        """Create a savior context to embed in jwt claims.
+        
+        Args:
+            account (dict): The account of the savior.
+            company_id (str): Optional. The company of a partner,
+                defaults to the `company_id` field of `account`.
+        
+        Returns:
+            A compact dict of the account's role, region, company_id,
+            username and spriving flag, along with the version of its 
+            layout (v), the account's version (av), and when it was issued (iat)
+        """
+        company_id = company_id or account.get("company_id")
+        return {
+            "v": CONTEXT_VERSION,
+            "av": account.get("account_version", 0),
+            "iat": int(time.time()),
+            "role": account.get("role"),
+            "region": account.get("region"),
+            "company_id": str(company_id) if company_id else None,
+            "username": account.get("username"),
+            "spriving": account.get("spriving", False),
+        }
+        
+    @staticmethod
+    def is_fresh_context(context: dict | None, account_id: str) -> bool:
+        """Whether a savior context from jwt claims can be trusted.
+        
+        A context is stale when its layout changed, when it's older than
+        `Config.jwt_context_max_age`, or when this process wrote a newer
+        version of the account. Other processes don't know of the newer
+        version, there the context is trusted until it's too old.
+        
+        Args:
+            context (dict): The context to check.
+            account_id (str): The _id of the account the context belongs to.
+        """
+        if not isinstance(context, dict) or context.get("v") != CONTEXT_VERSION:
+            return False
+        if time.time() - context.get("iat", 0) > config.jwt_context_max_age:
+            return False
+        return context.get("av", 0) >= account_versions.get(account_id, 0)
+    
+    @property
+    def _context_company_id(self) -> str | None:
+        """The company_id of the context, see `make_context`"""
+        return None
+    
+    @property
+    def context(self) -> dict:
+        if self._context is None:
+            self._context = self.make_context(
+                self.savior or {}, company_id=self._context_company_id
+            )
+        return self._context
+    
+    @property
+    def context_is_stale(self) -> bool:
+        """Whether the jwt claims need a fresh context.
+        
+        True when the context wasn't taken from claims, 
+        or when the account was written to since.
+        """
+        return not self._context_from_claims
+        
+    def _close(self) -> None:
+        """Release the savior's resources.
+        
+        The MongoClient is shared by the whole process so 
+        there is nothing to close, see `database.mongo`.
         """
-        client = pymongo.MongoClient()
-        self._close = lambda: client.close()
-        self.db, self.savior_id = client.spt, ObjectId(savior_id)
+        return None
     
     def _get_insert(self, document: dict={}) -> dict:
         """Prepare a document for a collection insert.
@@ -61,6 +219,60 @@ class Savior:
             "savior_id": self.savior_id,
         }
         
+    def _bump_data_version(self, *collections: str) -> None:
+        """Make cached results of the savior's collections stale.
+        
+        Call after writing to the collections, see `root.data_cache`.
+        """
+        data_cache.bump(self.savior_id, *collections)
+        
+    def paginate(
+        self, 
+        collection: str, 
+        limit: int = 0, 
+        skip: int = 0, 
+        cursor: str | None = None,
+        projection: dict | None = None,
+    ) -> dict[str, list | bool | str | None]:
+        """Page through the savior's documents of a collection, newest first.
+        
+        Pages are either continued with the `next_cursor` of the previous
+        page, or, as a legacy mode, by skipping documents. See `root.pagination`.
+        
+        Args:
+            collection (str): The name of the collection to page through.
+            limit (int): The size of a page, 0 returns all documents.
+            skip (int): How many documents to skip. Ignored when `cursor` is given.
+            cursor (str): Optional. The `next_cursor` of the previous page.
+            projection (dict): Optional. The fields to return.
+            
+        Returns:
+            A dict with fields:
+                - results: The documents of the page
+                - has_more: Whether there are more pages
+                - next_cursor: The token of the next page, None when there is none
+        """
+        filters = {"savior_id": self.savior_id}
+        if cursor:
+            filters.update(pagination.after(cursor))
+            skip = 0
+        res = list(
+            self.db[collection]
+            .find(filters, projection)
+            .sort(pagination.KEYSET_SORT)
+            .skip(skip)
+            .limit(limit + 1 if limit != 0 else limit)
+        )
+        if limit:
+            res, has_more = res[:limit], bool(res[limit:])
+        else:
+            has_more = False
+        return {
+            "results": res,
+            "has_more": has_more,
+            "next_cursor": pagination.encode_cursor(res[-1]) if has_more else None,
+        }
+
     @staticmethod
     def string_to_date(date_string: str) -> datetime:
         """Turn an ISO8601 string to a datetime object.
@@ -244,38 +456,286 @@ class Savior:
     ) -> list:
         """Perform an aggregate or find method on a `pymongo.Collection`.
         
+        See `get_data_cursor`, this returns all of its results as a list.
+        """
+        return list(
+            self.get_data_cursor(
+                query_type=query_type, collection=collection, filters=filters
+            )
+        )
+        
+    def get_cached_data(
+        self, 
+        query_type: Literal["aggregate", "find"],
+        collection: str,
+        filters: dict | list = {},
+    ) -> tuple | Iterator:
+        """Perform an aggregate or find method, cached by its results.
+        
+        Repeated queries are served from memory, until the savior 
+        writes to the collection. See `root.data_cache`.
+        
+        Args:
+            query_type (Literal["aggregate", "find"]): The type of method 
+                to perform on the collection.
+            collection (str): The name of the collection to query.
+            filters (list | dict): A pipeline list to call on the collection
+                if aggregating, or a filters dictionary to find from the collection.
+        
+        Returns:
+            A tuple of cached results, or an iterator over the query's cursor
+        """
+        return data_cache.cached(
+            self.savior_id,
+            collection,
+            query_type,
+            filters,
+            query=lambda: self.get_data_cursor(
+                query_type=query_type, collection=collection, filters=filters
+            ),
+        )
+        
+    def run_named_query(self, name: str, params: dict = {}) -> tuple | Iterator:
+        """Run a query of the catalog on the savior's data.
+        
+        See `root.catalog`, results are cached like those of `get_cached_data`.
+        
+        Args:
+            name (str): The name of the query.
+            params (dict): The query's parameters, unparsed, e.g from a query string.
+        
+        Returns:
+            A tuple of cached results, or an iterator over the query's cursor
+        
+        Raises:
+            ResourceNotFoundError: When there's no such query.
+            InvalidRequestDataError: When a parameter is invalid.
+        """
+        query = catalog.get(name)
+        pipeline = query.pipeline(params)
+        return data_cache.cached(
+            self.savior_id,
+            query.collection,
+            "aggregate",
+            pipeline,
+            query=lambda: self.get_data_cursor(
+                query_type="aggregate", 
+                collection=query.collection, 
+                filters=pipeline, 
+                hint=query.hint,
+            ),
+        )
+        
+    def get_data_batch(
+        self, 
+        query_type: Literal["aggregate", "find"],
+        collection: str,
+        filters: dict | list = {},
+        batch_size: int = 1000,
+    ) -> dict:
+        """Perform an aggregate or find method, and get the first batch of results.
+        
+        The query's server cursor is kept open, later batches are read 
+        from it with `get_more_data` instead of running the query again.
+        See `root.cursors`.
+        
+        Args:
+            query_type (Literal["aggregate", "find"]): The type of method 
+                to perform on the collection.
+            collection (str): The name of the collection to query.
+            filters (list | dict): A pipeline list to call on the collection
+                if aggregating, or a filters dictionary to find from the collection.
+            batch_size (int): The number of results per batch.
+        
+        Returns:
+            A dict with fields: results, and cursor, the id
+            of the next batch, None when there are no more results
+        
+        Raises:
+            InvalidRequestDataError: When the batch size is invalid.
+        """
+        batch_size = cursors.validate_batch_size(batch_size)
+        return cursors.open_cursor(
+            self.savior_id,
+            self.get_data_cursor(
+                query_type=query_type, 
+                collection=collection, 
+                filters=filters, 
+                batch_size=batch_size,
+            ),
+            batch_size=batch_size,
+        )
+        
+    def get_more_data(self, cursor_id: str, batch_size: int | None = None) -> dict:
+        """Get the next batch of results of a query started with `get_data_batch`.
+        
+        Raises:
+            ResourceNotFoundError: When the cursor isn't open, e.g it expired.
+        """
+        return cursors.next_batch(self.savior_id, cursor_id, batch_size=batch_size)
+    
+    def close_data_cursor(self, cursor_id: str) -> bool:
+        """Close a cursor opened by `get_data_batch` before it's exhausted"""
+        return cursors.close_cursor(self.savior_id, cursor_id)
+        
+    def submit_data_job(
+        self, 
+        query_type: Literal["aggregate", "find"],
+        collection: str,
+        filters: dict | list = {},
+    ) -> ObjectId:
+        """Run an aggregate or find method in the background.
+        
+        For queries that take too long for `get_data`, see `root.jobs`.
+        
+        Args:
+            query_type (Literal["aggregate", "find"]): The type of method 
+                to perform on the collection.
+            collection (str): The name of the collection to query.
+            filters (list | dict): A pipeline list to call on the collection
+                if aggregating, or a filters dictionary to find from the collection.
+        
+        Returns:
+            The _id of the job, to poll with `get_data_job`
+        
+        Raises:
+            InvalidRequestDataError: When the query can't be run as a job.
+        """
+        return jobs.submit(
+            self.db, 
+            self.savior_id, 
+            query_type=query_type, 
+            collection=collection, 
+            filters=filters,
+        )
+        
+    def get_data_job(self, job_id: str) -> dict:
+        """Get the status of one of the savior's data jobs.
+        
+        Raises:
+            ResourceNotFoundError: When the savior has no such job.
+        """
+        return jobs.get(self.db, self.savior_id, job_id)
+    
+    def get_data_job_results(self, job_id: str, page: int = 0) -> dict:
+        """Get a page of the results of one of the savior's data jobs.
+        
+        See `root.jobs.results`.
+        """
+        return jobs.results(self.db, self.savior_id, job_id, page=page)
+        
+    def get_emissions(
+        self,
+        granularity: emission_rollups.Granularity = "month",
+        start: str | None = None,
+        end: str | None = None,
+        group_by: list[str] = [],
+        filters: dict | None = None,
+    ) -> list[dict]:
+        """Get the savior's emissions over time.
+        
+        Read from the time bucketed emission rollups rather 
+        than the logs themselves, see `root.emission_rollups`.
+        
+        Args:
+            granularity (Literal[day, month]): The size of the periods.
+            start (str): Optional. ISO8601 date the periods start at or after.
+            end (str): Optional. ISO8601 date the periods start before.
+            group_by (list): Optional. Dimensions to group each period by.
+            filters (dict): Optional. Dimensions and the value they must equal.
+        
+        Returns:
+            A list of periods and their co2e and log count, oldest first
+        
+        Raises:
+            InvalidRequestDataError: When any argument is invalid.
+        """
+        return emission_rollups.read(
+            self.db, 
+            self.savior_id, 
+            granularity=granularity, 
+            start=start, 
+            end=end, 
+            group_by=group_by, 
+            filters=filters,
+        )
+        
+    def get_data_cursor(
+        self, 
+        query_type: Literal["aggregate", "find"],
+        collection: str,
+        filters: dict | list = {},
+        max_time_ms: int | None = None,
+        max_results: int | None = None,
+        batch_size: int | None = None,
+        hint: str | None = None,
+        max_scanned_docs: int | None = None,
+    ) -> Iterator:
+        """Perform an aggregate or find method on a `pymongo.Collection`.
+        
         Given the filters collection name and query_type, craft an
         aggregation or find query to call on a pymongo collection.
         The requesting savior can only access their own data.
         Dates in $match stages when query_type is 'aggregation' 
         are parsed and transformed to `datetime` objects.
         
+        Queries are checked and bounded by `root.guards` before they run.
+        When the client's filters don't use an index past savior_id, and 
+        no index is hinted, the cost of the query is estimated first, see 
+        `guards.check_cost`.
+        
         Args:
             query_type (Literal["aggregate", "find"]): The type of method 
                 to perform on the collection.
             collection (str): The name of the collection to query.
             filters (list | dict): A pipeline list to call on the collection
                 if aggregating, or a filters dictionary to find from the collection.
+            max_time_ms (int): Optional. Overrides the guards' time limit.
+            max_results (int): Optional. Overrides the guards' result cap.
+            batch_size (int): Optional. The number of documents
+                the server returns per batch.
+            hint (str): Optional. The name of the index to use.
+            max_scanned_docs (int): Optional. Overrides the guards' 
+                limit of documents read by queries that aren't indexed.
                 
         Returns:
-            The result of the find or aggregation  
+            An iterator over the cursor of the find or aggregation  
         
         Raises:
             InvalidRequestDataError: When `query_type` is not equal to aggregate or find.
+            QueryRejectedError: When the query breaks the limits of `root.guards`.
+            QueryTimeoutError: When the query runs out of time.
         """
         _collection = self.db[collection]
         required_filters = {"savior_id": self.savior_id}
+        def check_cost(client_filters: dict) -> None:
+            if hint is None and not guards.is_indexed(collection, client_filters):
+                guards.check_cost(
+                    _collection, self.savior_id, max_scanned_docs=max_scanned_docs
+                )
         if query_type == "find":
+            client_filters = dict(filters)
             if collection == "logs":
                 required_filters.update(
                     {"co2e": {"$exists": True, **filters.get("co2e", {})}}
                 )
             filters.update(required_filters)
-            return list(_collection.find(
-                {"savior_id": self.savior_id, **filters},
-            ))
+            query = {"savior_id": self.savior_id, **filters}
+            options = guards.check_find(
+                collection, 
+                client_filters, 
+                max_time_ms=max_time_ms, 
+                max_results=max_results,
+            )
+            check_cost(client_filters)
+            return guards.guarded(
+                _collection.find(
+                    query, **options, batch_size=batch_size or 0, hint=hint
+                )
+            )
         elif query_type == "aggregate":
             entrypoint = filters[0]
+            client_filters = dict(entrypoint.get("$match", {}))
             if "$match" in entrypoint:
                 match = entrypoint["$match"]
                 if collection == "logs":
@@ -286,12 +746,28 @@ class Savior:
                 if "source_file.upload_date" in match:
                     date_range = match["source_file.upload_date"]
                     for accumulator, date in entrypoint["$match"]["source_file.upload_date"].items():
-                        date_range[accumulator] = self.string_to_date(date)
+                        date_range[accumulator] = (
+                            date if isinstance(date, datetime) else self.string_to_date(date)
+                        )
                         match["source_file.upload_date"] = date_range
             else:
                 filters = [{"$match": required_filters}] + filters
-            res = list(_collection.aggregate(filters))
-            return res[0] if len(res) == 1 and query_type == "find" else res
+            pipeline, options = guards.check_pipeline(
+                collection, filters, max_time_ms=max_time_ms, max_results=max_results
+            )
+            check_cost(client_filters)
+            if batch_size:
+                options["batchSize"] = batch_size
+            if hint:
+                options["hint"] = hint
+            try:
+                cursor = _collection.aggregate(pipeline, **options)
+            except (ExecutionTimeout, OperationFailure) as e:
+                translated = guards.translate_error(e)
+                if translated is e:
+                    raise
+                raise translated from e
+            return guards.guarded(cursor)
         else: 
             raise InvalidRequestDataError("query_type must be one of aggregate or find")
         
@@ -299,49 +775,75 @@ class Savior:
     def collection_text_search(
         collection: Collection, 
         query_params: dict, 
-        matches: dict = {},
-        projections: dict = {},
+        matches: dict | None = None,
+        projections: dict | None = None,
         result_dict_field: str = "results",
-    ) -> dict[str, list | bool]:
+    ) -> dict[str, list | bool | int]:
         """Fulfill a text search request on a collection.
         
+        Results are sorted by relevance when searching, then by
+        last update. Only the requested page is projected, and when a 
+        total is requested, the page and the total are computed in 
+        one round trip with a $facet stage.
+        
         Args:
             collection (Collection): The collection to perform text search upon.
             query_params (dict): A dictionary containing the query params from 
-                the request.
+                the request. Special params are:
+                    - q: The text to search for
+                    - limit: The size of a page, 0 means all results
+                    - skip: How many results to skip
+                    - total: When true, also count all matching documents
+                Any other params are added to the $match stage.
             matches (dict): Any matches to add to the aggregation pipeline's
                 initial $match stage
-            projections (dict): Any projections to add to the aggregation pipeline's
-                final $project stage
+            projections (dict): The fields to project the results with,
+                a relevance field is added when searching
             result_dict_field (str): What to name the key of the return
         
         Returns:
             A dict with keys has_more and `result_dict_field` argument.
-            They are boolean and list values, respectively 
+            They are boolean and list values, respectively. When a total is
+            requested, a total key with the count of all matching documents
         """
-        sort = {"last_update": -1}
-        if "q" in query_params:
-            query_params["$text"] = {"$search": query_params.pop("q")}
-            projections.update({"relevance": {"$meta": "textScore"}})
-            sort["relevance"] = -1
+        query_params = dict(query_params)
+        matches, projections = dict(matches or {}), dict(projections or {})
         limit = int(query_params.pop("limit", 0))
         skip = int(query_params.pop("skip", 0))
+        with_total = str(query_params.pop("total", "")).lower() in ("1", "true")
+        search = query_params.pop("q", None)
         matches.update(query_params)
-        pipeline = [
-            {"$match": matches},
-            {"$project": projections}, 
-            {"$sort": sort}
-        ]
-        if limit:
-            pipeline.append({"$limit": limit + 1})
+        sort = {"last_update": -1, "_id": -1}
+        if search:
+            matches["$text"] = {"$search": search}
+            relevance = {"$meta": "textScore"}
+            sort = {"relevance": relevance, **sort}
+            projections["relevance"] = relevance
+        page = []
         if skip:
-            pipeline.append({"$skip": skip})
-        res = list(collection.aggregate(pipeline))  
+            page.append({"$skip": skip})
+        if limit:
+            page.append({"$limit": limit + 1})
+        if projections:
+            page.append({"$project": projections})
+        pipeline = [{"$match": matches}, {"$sort": sort}]
+        if with_total:
+            pipeline.append(
+                {"$facet": {"results": page, "total": [{"$count": "total"}]}}
+            )
+            facets = collection.aggregate(pipeline).next()
+            res = facets["results"]
+            total = facets["total"][0]["total"] if facets["total"] else 0
+        else:
+            res = list(collection.aggregate(pipeline + page))
         if limit:
             res, has_more = res[:limit], bool(res[limit:])
         else:
             has_more = False
-        return {result_dict_field: res, "has_more": has_more}
+        res = {result_dict_field: res, "has_more": has_more}
+        if with_total:
+            res["total"] = total
+        return res
         
     # def handle_emission_factor(
     #     self,
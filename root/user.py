@@ -2,7 +2,9 @@
 
 from numbers import Number
 from root.savior import Savior
+from root import emission_rollups, pledges
 from bson import ObjectId
+from pymongo import ReturnDocument
 from pymongo.cursor import Cursor
 from datetime import datetime, timezone
 from typing import override
@@ -18,15 +20,15 @@ class User(Savior):
     """
     
     @override
-    def __init__(self, savior_id: str):
+    def __init__(self, savior_id: str, context: dict | None = None):
         """Initialize a savior class for a user.
         
         See `Savior` initializer for more.
         """
-        super().__init__(savior_id=savior_id)
+        super().__init__(savior_id=savior_id, context=context)
         
-    @property
-    def savior(self):
+    @override
+    def _find_savior(self) -> dict | None:
         return self.db.users.find_one(
             {"_id": self.savior_id}, 
             {
@@ -35,10 +37,39 @@ class User(Savior):
                 "username": 1, 
                 "savior_id": "$_id", 
                 "spriving": 1,
+                "account_version": 1,
                 "_id": 0,
              },
         )
         
+    def _update_account(self, update: dict, bump_version: bool = False) -> bool:
+        """Update the user's account and invalidate its cached profile.
+        
+        Args:
+            update (dict): The update document to perform.
+            bump_version (bool): Whether the update changes fields of
+                the savior context, which makes issued contexts stale.
+                See `Savior.make_context`
+        
+        Returns:
+            A boolean indicating if the update modified the account
+        """
+        if bump_version:
+            account = self.db.users.find_one_and_update(
+                {"_id": self.savior_id},
+                {**update, "$inc": {"account_version": 1}},
+                projection={"account_version": 1},
+                return_document=ReturnDocument.AFTER,
+            )
+            self._record_account_version(account)
+            modified = account is not None
+        else:
+            modified = bool(
+                self.db.users.update_one({"_id": self.savior_id}, update).modified_count
+            )
+        self._invalidate_savior()
+        return modified
+        
     @classmethod
     def skip_limit_cursor(
         self, cursor: Cursor, limit: int, skip: int
@@ -68,16 +99,18 @@ class User(Savior):
             res, has_more = res, False
         return res, has_more
         
-    def logs(self, limit=0, skip=0) -> dict[str, list | bool]:
-        """The user's logs, sorted by date"""
-        res, has_more = self.skip_limit_cursor(
-            self.db.product_logs.find(
-                {"savior_id": self.savior_id}
-            ).sort([("created_at", -1)]),
-            skip=skip,
-            limit=limit
-        )
-        return {"logs": res, "has_more": has_more}
+    def logs(
+        self, limit: int = 0, skip: int = 0, cursor: str | None = None
+    ) -> dict[str, list | bool | str | None]:
+        """The user's logs, sorted by date.
+        
+        See `Savior.paginate` for the arguments.
+        
+        Returns:
+            A dict with fields: logs, has_more, next_cursor
+        """
+        page = self.paginate("product_logs", limit=limit, skip=skip, cursor=cursor)
+        return {"logs": page.pop("results"), **page}
         
     def log_product_emissions(self, product_id: str, value: int = 1) -> dict:
         """Log emissions for a product.
@@ -124,6 +157,15 @@ class User(Savior):
                 f"A product with the id {product_id} does not exist"
             )
         db.product_logs.insert_one(res)
+        emission_rollups.record(db, [res])
+        pledges.record(
+            db, 
+            self.savior_id, 
+            pledge=self.savior.get("current_pledge"), 
+            co2e=res.get("co2e"), 
+            now=res["created_at"],
+        )
+        self._bump_data_version("product_logs", "emission_rollups")
         return res 
         
     
@@ -147,10 +189,8 @@ class User(Savior):
         self.protect_request_fields(
             updates, {"username", "name","password", "email"}
         )
-        return bool(
-            self.db.users.update_one(
-                {"_id": self.savior_id}, {"$set": updates}
-            ).modified_count
+        return self._update_account(
+            {"$set": updates}, bump_version="username" in updates
         )
         
     def handle_stars(self, product_id: str, delete: bool) -> bool:
@@ -198,17 +238,21 @@ class User(Savior):
                     upsert=True,
                 )
                 res = res.upserted_id or res.modified_count
+            self._bump_data_version("stars")
             return bool(res)
         
-    def starred_products(self, limit: int = 0, skip: int = 0) -> dict[str, bool | list]:
-        """Get starred products, sorted by descending date"""
-        res, has_more = self.skip_limit_cursor(
-            self.db.stars.find({"savior_id": self.savior_id})
-            .sort([("created_at", -1)]),
-            limit=limit,
-            skip=skip
-        )
-        return {"starred": res, "has_more": has_more}
+    def starred_products(
+        self, limit: int = 0, skip: int = 0, cursor: str | None = None
+    ) -> dict[str, bool | list | str | None]:
+        """Get starred products, sorted by descending date.
+        
+        See `Savior.paginate` for the arguments.
+        
+        Returns:
+            A dict with fields: starred, has_more, next_cursor
+        """
+        page = self.paginate("stars", limit=limit, skip=skip, cursor=cursor)
+        return {"starred": page.pop("results"), **page}
             
     def pledge(self, pledge_document: dict[str, str | Number]) -> bool:
         """Create or update the current pledge.
@@ -229,6 +273,7 @@ class User(Savior):
         Raises:
             Exception: If frequnecy or co2e is not present in the request, or if fields other 
                 than ones specified above are present.
+            InvalidRequestDataError: If frequency is not one of the above.
         """
         self.protect_and_require_fields(
             pledge_document, 
@@ -236,29 +281,58 @@ class User(Savior):
             allowed_fields={"frequency", "co2e", "message"},
             invalid_fields_error_prefix="Can't intepret fields"
         )
-        return bool(
-            self.db.users.update_one(
-                {"_id": self.savior_id}, {"$set": {"current_pledge": pledge_document}},
-            ).modified_count
+        pledges.validate_frequency(pledge_document["frequency"])
+        previous_pledge = self.savior.get("current_pledge") or {}
+        updated = self._update_account({"$set": {"current_pledge": pledge_document}})
+        if previous_pledge.get("frequency") != pledge_document["frequency"]:
+            pledges.reset(self.db, self.savior_id, pledge_document)
+        return updated
+        
+    def pledge_progress(self) -> dict | None:
+        """Get the progress of the current pledge.
+        
+        Read from counters of the current period, see `root.pledges`.
+        
+        Returns:
+            A dict with fields: frequency, period_start, period_end, co2e, count, 
+            streak, pledged_co2e, remaining_co2e. None without a current pledge.
+        """
+        return pledges.progress(
+            self.db, self.savior_id, pledge=self.savior.get("current_pledge")
         )
         
         
     def get_times_logged(self, since_date: str) -> int: 
         """Get the amount of times a user has logged
         
+        Only logs of the day `since_date` falls on are counted, the 
+        following days are read from the user's daily emission rollups.
+        See `root.emission_rollups`. Until the rollups are backfilled,
+        all logs since `since_date` are counted.
+        
         Args:
             since_date (str): The date to start from when counting logs
             
         Returns:
             An int of how many times the user has logged a product.
         """
-        print("HERERERE", self.string_to_date(since_date))
-        return self.db.product_logs.count_documents( 
+        since_date = self.string_to_date(since_date)
+        if not emission_rollups.is_backfilled(self.db):
+            return self.db.product_logs.count_documents(
+                {"savior_id": self.savior_id, "created_at": {"$gt": since_date}}
+            )
+        next_day = pledges.period_end("day", pledges.period_start("day", since_date))
+        times_logged = self.db.product_logs.count_documents( 
             {
              "savior_id": self.savior_id,
-             "created_at": {"$gt": self.string_to_date(since_date)}
+             "created_at": {"$gt": since_date, "$lt": next_day}
             }
         )
+        return times_logged + sum(
+            day["count"] for day in emission_rollups.read(
+                self.db, self.savior_id, granularity="day", start=next_day
+            )
+        )
         
     def start_spriving(self) -> bool: 
         """Start spriving, AKA subscribe to a membership
@@ -266,10 +340,8 @@ class User(Savior):
         Returns:
             A boolean indicating if the update was successful
         """
-        return bool(
-            self.db.users.update_one(
-                {"_id": self.savior_id}, {"$set": {"spriving": True}}
-            ).modified_count
+        return self._update_account(
+            {"$set": {"spriving": True}}, bump_version=True
         )
     
     def stop_spriving(self) -> bool:
@@ -278,10 +350,8 @@ class User(Savior):
         Returns:
             A boolean indicating if the update was successful
         """
-        return bool(
-            self.db.users.update_one(
-                {"_id": self.savior_id}, {"$set": {"spriving": False}}
-            ).modified_count
+        return self._update_account(
+            {"$set": {"spriving": False}}, bump_version=True
         )
         
     def undo_pledge(self) -> bool:
@@ -289,11 +359,7 @@ class User(Savior):
         
         Returns:
             A boolean indicating if the update was successful"""
-        return bool(
-            self.db.users.update_one(
-                {"savior_id": self.savior_id}, 
-                {"$set": {"current_pledge": None}}
-            )
-        )
+        self.db.pledge_progress.delete_one({"_id": self.savior_id})
+        return self._update_account({"$set": {"current_pledge": None}})
     
     
\ No newline at end of file
@@ -0,0 +1,194 @@
+"""Columnar validation of uploaded emission files.
+
+Rows of an upload used to only have their columns checked, a bad value
+failed later, one log at a time, or never. `validate` checks the columns
+of a DataFrame, before its rows are turned into logs, with vectorized
+pandas operations, a million rows take milliseconds rather than a python
+loop. It checks that:
+
+- activity, value, unit, unit_type, scope and category aren't blank.
+- value is a number, and isn't negative.
+- unit is one of the `UNITS` of its unit_type, compared case insensitively,
+  e.g a weight in kg, or money in a 3 letter currency code. Unit types
+  not listed, e.g containeroverdistance, are left to the calculator.
+- scope is 1, 2 or 3, and ghg_category, when given, one of `GHG_CATEGORIES`.
+- rows aren't blank, rows without any value are reported once, as blank.
+
+Categories are named freely by partners, so they are only checked to not
+be blank. Valid values are normalized: value is a number, and scope is
+"1", "2" or "3". Units are kept as they are spelled, the calculator's
+api is case sensitive, e.g kWh, see `emissions.GHGCalculator`.
+
+Errors are collected in a `ValidationReport`, per column and error, with
+the indices of the rows, which are the rows' positions in the file.
+"""
+
+from dataclasses import dataclass, field
+import numpy as np
+import pandas as pd
+from exceptions import FileValidationError
+
+REQUIRED_COLUMNS = ("activity", "value", "unit", "unit_type", "scope", "category")
+
+SCOPES = ("1", "2", "3")
+
+GHG_CATEGORIES = ("1", "2", *(f"3.{i}" for i in range(1, 15)))
+
+# the units of the calculator's simple unit types, lowercase. Other unit
+# types, e.g number or weightoverdistance, accept any unit
+UNITS: dict[str, frozenset[str]] = {
+    "weight": frozenset({"g", "kg", "t", "tonne", "ton", "lb", "oz"}),
+    "energy": frozenset(
+        {
+            "wh", "kwh", "mwh", "gwh", "twh", "j", "kj", "mj", "gj", "tj", 
+            "btu", "mmbtu", "therm",
+        }
+    ),
+    "distance": frozenset({"m", "km", "mi", "nmi", "ft"}),
+    "volume": frozenset(
+        {"ml", "l", "m3", "gal", "gallon_us", "gallons_us", "bbl", "ft3", "standard_cubic_foot"}
+    ),
+    "time": frozenset({"ms", "s", "m", "min", "h", "day", "year"}),
+    "area": frozenset({"m2", "km2", "ft2", "ha"}),
+    "data": frozenset({"mb", "gb", "tb"}),
+}
+
+# how many row indices are kept per error
+MAX_REPORTED_ROWS = 20
+
+@dataclass(slots=True)
+class ColumnError:
+    """An error of a column, and the rows it was found in.
+
+    Attributes:
+        count (int): The number of rows with the error.
+        rows (list[int]): The first `MAX_REPORTED_ROWS` of them.
+    """
+    count: int = 0
+    rows: list[int] = field(default_factory=list)
+
+@dataclass(slots=True)
+class ValidationReport:
+    """The errors of a file, by column and error message.
+
+    Reports of a file's chunks are merged with `merge`, in file order.
+
+    Attributes:
+        errors (dict): The error of each column and message.
+        num_invalid_rows (int): The number of rows with any error.
+    """
+    errors: dict[tuple[str, str], ColumnError] = field(default_factory=dict)
+    num_invalid_rows: int = 0
+
+    def __bool__(self) -> bool:
+        return bool(self.errors)
+
+    def add(self, column: str, message: str, rows: pd.Index) -> None:
+        """Record an error of some rows, nothing is recorded when there are none"""
+        if not len(rows):
+            return
+        error = self.errors.setdefault((column, message), ColumnError())
+        error.count += len(rows)
+        missing = MAX_REPORTED_ROWS - len(error.rows)
+        if missing > 0:
+            error.rows.extend(int(row) for row in rows[:missing])
+
+    def merge(self, other: "ValidationReport") -> None:
+        self.num_invalid_rows += other.num_invalid_rows
+        for (column, message), error in other.errors.items():
+            merged = self.errors.setdefault((column, message), ColumnError())
+            merged.count += error.count
+            merged.rows.extend(error.rows[:MAX_REPORTED_ROWS - len(merged.rows)])
+
+    def to_dict(self) -> dict[str, list[dict]]:
+        """The errors of each column, each with its message, count and rows"""
+        columns = {}
+        for (column, message), error in self.errors.items():
+            columns.setdefault(column, []).append(
+                {"error": message, "count": error.count, "rows": error.rows}
+            )
+        return columns
+
+    def __str__(self) -> str:
+        return "; ".join(
+            f"{column} {message} in {error.count} row{'s' * (error.count != 1)}, "
+            f"e.g row {', '.join(map(str, error.rows[:5]))}"
+            for (column, message), error in self.errors.items()
+        )
+
+    def raise_for_errors(self) -> None:
+        """
+        Raises:
+            FileValidationError: When there are any errors.
+        """
+        if self:
+            raise FileValidationError(f"Invalid file data: {self}", errors=self.to_dict())
+
+def _blank(column: pd.Series) -> pd.Series:
+    """Whether each value is missing or an empty string"""
+    if column.dtype == object or pd.api.types.is_string_dtype(column):
+        return column.isna() | (column.astype(str).str.strip() == "")
+    return column.isna()
+
+def _lower(column: pd.Series) -> pd.Series:
+    return column.astype(str).str.strip().str.lower()
+
+def _scope(column: pd.Series) -> pd.Series:
+    """Scopes as strings, e.g 2, 2.0 and " 2" are "2" """
+    numbers = pd.to_numeric(column, errors="coerce")
+    as_int = numbers.where(numbers == np.floor(numbers)).astype("Int64").astype(str)
+    return as_int.where(numbers.notna(), column.astype(str).str.strip())
+
+def validate(df: pd.DataFrame) -> tuple[pd.DataFrame, ValidationReport]:
+    """Validate and normalize the rows of an uploaded file.
+
+    Args:
+        df (DataFrame): The rows, with every column of `REQUIRED_COLUMNS`,
+            e.g after form field fallbacks are assigned.
+
+    Returns:
+        The rows, with valid values normalized and blank rows dropped,
+        and the report of their errors
+    """
+    report, invalid = ValidationReport(), []
+    def add(column: str, message: str, rows: pd.Index) -> None:
+        report.add(column, message, rows)
+        invalid.append(rows)
+
+    blank = pd.DataFrame({column: _blank(df[column]) for column in df.columns})
+    blank_rows = blank.all(axis=1) if len(df.columns) else pd.Series(True, index=df.index)
+    add("row", "is blank", df.index[blank_rows])
+    df, blank = df[~blank_rows], blank[~blank_rows]
+    for column in REQUIRED_COLUMNS:
+        add(column, "is blank", df.index[blank[column]])
+    df = df.copy()
+
+    values = pd.to_numeric(df["value"], errors="coerce")
+    add("value", "must be a number", df.index[values.isna() & ~blank["value"]])
+    add("value", "must not be negative", df.index[values < 0])
+    df["value"] = values
+
+    unit_types, units = _lower(df["unit_type"]), _lower(df["unit"])
+    valid_unit = pd.Series(True, index=df.index)
+    for unit_type, type_units in UNITS.items():
+        of_type = unit_types == unit_type
+        valid_unit &= ~of_type | units.isin(type_units)
+    valid_unit &= (unit_types != "money") | units.str.fullmatch(r"[a-z]{3}")
+    add(
+        "unit", "doesn't match its unit_type", df.index[~valid_unit & ~blank["unit"]]
+    )
+
+    scopes = _scope(df["scope"])
+    add("scope", "must be 1, 2 or 3", df.index[~scopes.isin(SCOPES) & ~blank["scope"]])
+    df["scope"] = scopes.where(~blank["scope"], None)
+
+    if "ghg_category" in df:
+        categories = df["ghg_category"].astype(str).str.strip()
+        given = ~_blank(df["ghg_category"])
+        add(
+            "ghg_category",
+            f"must be one of {', '.join(GHG_CATEGORIES)}",
+            df.index[given & ~categories.isin(GHG_CATEGORIES)],
+        )
+    report.num_invalid_rows = len(df.index[:0].append(invalid).unique())
+    return df, report
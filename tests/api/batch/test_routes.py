@@ -0,0 +1,29 @@
+import pytest
+
+def test_batch_post(partner_auth, assert_route):
+    requests = [
+        {"path": "/saviors"},
+        {"path": "/tasks", "id": "tasks"},
+        {"path": "/saviors/files"},
+        {"path": "/saviors/emissions", "query": {"granularity": "year"}},
+        {"path": "/not-an-endpoint"},
+    ]
+    responses = assert_route(
+        "/batch", "post", partner_auth, list, json={"requests": requests}
+    )
+    assert [response["id"] for response in responses] == [0, "tasks", 2, 3, 4]
+    assert [response["status"] for response in responses] == [200, 200, 200, 400, 404]
+    assert isinstance(responses[0]["content"], dict)
+    assert isinstance(responses[1]["content"], list)
+    assert responses[1]["content"] == assert_route("/tasks", "get", partner_auth, list)
+    
+@pytest.mark.parametrize(
+    "requests",
+    [[], [{"path": "/batch"}], [{"path": "saviors"}], [{"path": "/saviors", "method": "TRACE"}]]
+)
+def test_batch_post_invalid(requests, partner_auth, assert_route):
+    with pytest.raises(Exception):
+        assert_route("/batch", "post", partner_auth, list, json={"requests": requests})
+        
+def test_batch_post_unauthorized(api):
+    assert api.post("/batch", json={"requests": [{"path": "/saviors"}]}).status_code == 401
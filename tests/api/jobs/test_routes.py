@@ -0,0 +1,39 @@
+import time
+import pytest
+from root import jobs
+
+@pytest.fixture
+def run_inline(monkeypatch):
+    monkeypatch.setattr(jobs, "_dispatch", jobs.run)
+
+def test_jobs(partner_auth, assert_route, run_inline):
+    job_id = assert_route(
+        "/jobs", 
+        "post", 
+        partner_auth, 
+        str, 
+        json={"query_type": "find", "collection": "logs", "filters": {"scope": 1}},
+    )
+    job = assert_route(f"/jobs/{job_id}", "get", partner_auth, dict)
+    assert job["status"] == "done"
+    page = assert_route(f"/jobs/{job_id}/results", "get", partner_auth, dict)
+    assert len(page["results"]) == job["num_results"]
+    
+def test_job_thread_pool(partner_auth, assert_route):
+    job_id = assert_route(
+        "/jobs", 
+        "post", 
+        partner_auth, 
+        str, 
+        json={"query_type": "aggregate", "collection": "logs", "filters": [{"$match": {}}]},
+    )
+    for _ in range(50):
+        job = assert_route(f"/jobs/{job_id}", "get", partner_auth, dict)
+        if job["status"] in ("done", "failed"):
+            break
+        time.sleep(0.1)
+    assert job["status"] == "done"
+    
+def test_job_not_found(partner_auth, assert_route):
+    with pytest.raises(Exception):
+        assert_route("/jobs/not-an-id", "get", partner_auth, dict)
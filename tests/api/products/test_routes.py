@@ -133,4 +133,16 @@ def test_delete_product(
 #         "delete",
 #         partner_auth,
 #         bool 
-#     )
\ No newline at end of file
+#     )
+def test_search_products_pages(api):
+    def _search(**query_string):
+        res = api.get("/products", query_string=query_string)
+        assert res.status_code == 200
+        return decode_response(res)["content"]
+    everything = _search(total="true")
+    assert everything["total"] == len(everything["products"])
+    for skip in range(everything["total"]):
+        page = _search(limit=1, skip=skip, total="true")
+        assert page["products"] == everything["products"][skip:skip + 1]
+        assert page["has_more"] == (skip + 1 < everything["total"])
+        assert page["total"] == everything["total"]
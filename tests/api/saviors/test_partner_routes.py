@@ -3,6 +3,7 @@ from bson import ObjectId
 import pytest
 from tests.utils import decode_response
 from root.partner import Partner
+from root import file_summaries
 
 @fixture(scope="module")
 def mock_product(mock_partner_account, mock_product_csv):
@@ -134,8 +135,11 @@ def partner_routes_startup(db, mock_partner_account):
     ]
     logs += unprocessed_logs
     db.logs.insert_many(logs)
+    # the logs are inserted directly, not by an upload
+    file_summaries.refresh(db, savior_id, file_ids=[FILE_ID])
     yield
     db.logs.delete_many({"savior_id": mock_partner_account["_id"]})
+    db.files.delete_many({"savior_id": mock_partner_account["_id"]})
 
 @pytest.mark.parametrize(
     ("endpoint", "api_kwargs", "assertion"),
@@ -225,8 +229,52 @@ def test_post_files(
             "file": create_file("success.csv", file_data)
         })
         assert res.status_code >= 200 < 300
-        file_id = decode_response(res)["content"]
+        body = decode_response(res)
+        file_id = body["content"]
         inserted = list(db.logs.find({"source_file.id": ObjectId(file_id)}))
         assert len(inserted) == len(file_data)
+        assert body["num_rows"] == len(file_data)
+        assert body["co2e"] == sum(log["co2e"] for log in inserted)
         for log in inserted:
-            assert log.keys() & form_data.keys()
\ No newline at end of file
+            assert log.keys() & form_data.keys()
+
+
+def test_post_files_sheets_of_csv(partner_auth, api, create_file):
+    res = api.post(
+        "/saviors/files",
+        headers=partner_auth,
+        data={
+            "sheets": "all",
+            "scope": "2",
+            "category": "random",
+            "file": create_file(
+                "sheets.csv",
+                [{"activity": "test", "value": 10, "unit_type": "weight", "unit": "kg"}],
+            ),
+        },
+    )
+    assert res.status_code == 400
+    assert "sheets" in decode_response(res)["content"]
+
+
+def test_post_files_async(partner_auth, api, create_file, assert_route, monkeypatch):
+    from root import ingest_jobs
+    monkeypatch.setattr(ingest_jobs, "_dispatch", ingest_jobs.run)
+    res = api.post(
+        "/saviors/files",
+        headers=partner_auth,
+        data={
+            "async": "true",
+            "scope": "2",
+            "category": "random",
+            "file": create_file(
+                "async.csv",
+                [{"activity": "test", "value": 10, "unit_type": "weight", "unit": "kg"}],
+            ),
+        },
+    )
+    assert res.status_code == 202
+    job_id = decode_response(res)["content"]
+    job = assert_route(f"/saviors/files/jobs/{job_id}", "get", partner_auth, dict)
+    assert job["status"] == "done"
+    assert job["progress"]["rows_inserted"] == 1
@@ -104,6 +104,27 @@ def test_partner_logs_get(assert_route, partner_auth):
         list,
     )
     
+@pytest.mark.parametrize(
+    ("query_string", "raises"),
+    [
+        ({}, False),
+        ({"granularity": "day", "group_by": "scope,category"}, False),
+        ({"start": "2024-01-01", "end": "2025-01-01", "category": "test"}, False),
+        ({"granularity": "year"}, True),
+        ({"group_by": "activity"}, True),
+    ]
+)
+def test_emissions_get(query_string, raises, assert_route, partner_auth):
+    test = lambda: assert_route(
+        "/saviors/emissions", "get", partner_auth, list, query_string=query_string
+    )
+    if raises:
+        with pytest.raises(Exception):
+            test()
+    else:
+        for period in test():
+            assert period.keys() >= {"period", "co2e", "count"}
+    
 get_data_route_params = lambda logs_collection: (
     ("collection", "query_type", "filters", "expected_return_instance", "raises"),
     [
@@ -115,7 +136,14 @@ get_data_route_params = lambda logs_collection: (
             list,
             False
         ),
-        (logs_collection, "aggregate", {}, list, True)
+        (logs_collection, "aggregate", {}, list, True),
+        (
+            logs_collection, 
+            "aggregate", 
+            [{"$lookup": {"from": "users", "as": "users", "pipeline": []}}], 
+            list, 
+            True
+        ),
     ]
     
 )
@@ -186,4 +214,33 @@ def test_users_data_get(
         res = test()
         savior_id = str(mock_user_account["_id"])
         for log in res:
-            assert savior_id == log["savior_id"]
\ No newline at end of file
+            assert savior_id == log["savior_id"]
+
+
+def test_data_batches(assert_route, partner_auth):
+    query = {"collection": "logs", "query_type": "find", "filters": {}}
+    expected = assert_route("/saviors/data", "post", partner_auth, list, json=query)
+    batch = assert_route(
+        "/saviors/data", "post", partner_auth, dict, json={**query, "batch_size": 1}
+    )
+    results = batch["results"]
+    while batch["cursor"] is not None:
+        batch = assert_route(f"/saviors/data/{batch['cursor']}", "get", partner_auth, dict)
+        results.extend(batch["results"])
+    assert len(results) == len(expected)
+    with pytest.raises(Exception):
+        assert_route("/saviors/data/not-a-cursor", "get", partner_auth, dict)
+    
+def test_queries_get(assert_route, partner_auth):
+    queries = assert_route("/saviors/queries", "get", partner_auth, list)
+    assert {query["name"] for query in queries} >= {"emissions_by_month", "top_activities"}
+    results = assert_route(
+        "/saviors/queries/top_activities", 
+        "get", 
+        partner_auth, 
+        list, 
+        query_string={"limit": "3"},
+    )
+    assert len(results) <= 3
+    with pytest.raises(Exception):
+        assert_route("/saviors/queries/not_a_query", "get", partner_auth, list)
@@ -69,6 +69,14 @@ def test_times_logged_get(since_date, assert_route, user_auth):
         query_string={"since_date": since_date}
     )
     
+def test_pledge_progress_get(assert_route, user_auth):
+    assert_route(
+        "/saviors/pledge-progress",
+        "get",
+        user_auth,
+        (dict, type(None)),
+    )
+    
 def test_sprivers_post(assert_route, user_auth):
     assert_route(
         "/saviors/sprivers",
@@ -0,0 +1,48 @@
+import gzip
+import zlib
+import pytest
+from flask import Response
+from api import compression
+
+BODY = b'{"content": [' + b", ".join([b'{"co2e": 1.5, "unit": "kg"}'] * 500) + b"]}"
+
+@pytest.mark.parametrize(
+    ("accept_encoding", "expected_encoding"),
+    [
+        ("gzip, deflate", "gzip"),
+        ("deflate", "deflate"),
+        ("gzip;q=0.5, deflate", "deflate"),
+        ("*", "gzip"),
+        ("br", None),
+        ("gzip;q=0", None),
+        ("", None),
+    ]
+)
+def test_negotiate(accept_encoding, expected_encoding, flask_app):
+    with flask_app.test_request_context(
+        headers={"Accept-Encoding": accept_encoding}
+    ):
+        assert compression.negotiate() == expected_encoding
+        
+@pytest.mark.parametrize(
+    ("encoding", "decompress"), 
+    [("gzip", gzip.decompress), ("deflate", zlib.decompress)]
+)
+def test_compress_response(encoding, decompress, flask_app):
+    with flask_app.test_request_context(headers={"Accept-Encoding": encoding}):
+        res = compression.compress_response(Response(BODY))
+        assert res.headers["Content-Encoding"] == encoding
+        assert "Accept-Encoding" in res.vary
+        assert decompress(res.get_data()) == BODY
+        streamed = compression.compress_response(
+            Response(iter([BODY[:100], BODY[100:]]))
+        )
+        assert streamed.headers["Content-Encoding"] == encoding
+        assert decompress(streamed.get_data()) == BODY
+        
+def test_compress_response_min_size(flask_app):
+    with flask_app.test_request_context(headers={"Accept-Encoding": "gzip"}):
+        small = BODY[:flask_app.config["COMPRESS_MIN_SIZE"] - 1]
+        res = compression.compress_response(Response(small))
+        assert "Content-Encoding" not in res.headers
+        assert res.get_data() == small
@@ -0,0 +1,44 @@
+import json
+import pytest
+import numpy as np
+import pandas as pd
+from bson import ObjectId, Decimal128
+from datetime import datetime, date, timezone
+from api import encoder
+from exceptions import ResourceNotFoundError
+
+NOW = datetime.now(tz=timezone.utc)
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        ObjectId(),
+        NOW,
+        datetime(2024, 1, 1),
+        date(2024, 1, 1),
+        Decimal128("1.10"),
+        np.int64(3),
+        np.int32(-3),
+        np.float32(1.5),
+        np.float64(0.1),
+        np.bool_(True),
+        pd.Timestamp(NOW),
+        ResourceNotFoundError("Not found"),
+        KeyError("key"),
+        {"nested": [{"_id": ObjectId(), "created_at": NOW, "co2e": 1.5}]},
+        {"unicode": "ñ", "nan": float("nan"), "none": None},
+    ]
+)
+def test_dumps_matches_default_str(content):
+    content = {"content": content}
+    assert encoder.dumps(content) == json.dumps(content, default=str)
+
+@pytest.mark.parametrize("num_docs", [0, 1, 3, 7])
+def test_iterencode_content_matches_dumps(num_docs):
+    documents = [
+        {"_id": ObjectId(), "created_at": NOW, "co2e": i} for i in range(num_docs)
+    ]
+    chunks = list(encoder.iterencode_content(iter(documents), batch_size=3))
+    assert "".join(chunks) == encoder.dumps({"content": documents})
+    # the opening, closing and one chunk per batch
+    assert len(chunks) == 2 + -(-num_docs // 3)
@@ -1,4 +1,5 @@
 import pytest
+from bson import ObjectId
 import api.helpers as helpers
 from pymongo import MongoClient
 from flask import Response
@@ -129,6 +130,20 @@ def test_savior_route_auth_requirements(api, partner_auth, user_auth):
     res = _call({}, "users")
     assert res.status_code == 401
         
+def test_send_stream(flask_app):
+    documents = [{"_id": ObjectId(), "index": i} for i in range(3)]
+    closed = []
+    def cursor():
+        try:
+            yield from documents
+        finally:
+            closed.append(True)
+    with flask_app.app_context():
+        res = helpers.send_stream(status=200, content=cursor())
+        assert res.is_streamed
+        assert res.get_data() == helpers.send(content=documents, status=200).get_data()
+        assert closed
+        
 @pytest.mark.parametrize(
     ("filename", "to_file_fn", "should_raise"),
     [
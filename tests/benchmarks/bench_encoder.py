@@ -0,0 +1,88 @@
+"""Benchmark response encoding, `api.encoder.dumps` against `json.dumps(default=str)`.
+
+Run from the repository root, no database needed:
+    python -m tests.benchmarks.bench_encoder --docs 50000
+
+Payloads mimic the shapes of the largest responses,
+partner logs, files and the company tree.
+"""
+
+import argparse
+import json
+import timeit
+from datetime import datetime, timezone
+import numpy as np
+from bson import ObjectId
+from api import encoder
+
+def logs_payload(num_docs: int) -> dict:
+    now = datetime.now(tz=timezone.utc)
+    file_id = ObjectId()
+    return {"content": [
+        {
+            "_id": ObjectId(),
+            "savior_id": ObjectId(),
+            "created_at": now,
+            "co2e": 12.5,
+            "co2e_per_unit": np.float32(0.25),
+            "scope": np.int64(3),
+            "unit": "kg",
+            "ghg_category": "3.1",
+            "source_file": {"id": file_id, "name": "logs.csv", "upload_date": now},
+        }
+        for _ in range(num_docs)
+    ]}
+
+def files_payload(num_docs: int) -> dict:
+    now = datetime.now(tz=timezone.utc)
+    return {"content": [
+        {
+            "id": ObjectId(),
+            "name": f"file-{i}.xlsx",
+            "upload_date": now,
+            "num_rows": i,
+            "unprocessed": 0,
+            "co2e": 100.0,
+        }
+        for i in range(num_docs)
+    ]}
+
+def company_tree_payload(num_docs: int) -> dict:
+    company_id, now = ObjectId(), datetime.now(tz=timezone.utc)
+    return {"content": [
+        {
+            "_id": ObjectId(),
+            "company_id": company_id,
+            "username": f"user-{i}",
+            "role": "member",
+            "team": "operations",
+            "joined": now,
+        }
+        for i in range(num_docs)
+    ]}
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    print(f"{'payload':<14}{'default=str ms':>16}{'encoder ms':>12}{'speedup':>9}")
+    for name, payload in (
+        ("logs", logs_payload(args.docs)),
+        ("files", files_payload(args.docs)),
+        ("company-tree", company_tree_payload(args.docs)),
+    ):
+        assert encoder.dumps(payload) == json.dumps(payload, default=str)
+        baseline = min(timeit.repeat(
+            lambda: json.dumps(payload, default=str), number=1, repeat=args.repeat
+        ))
+        encoded = min(timeit.repeat(
+            lambda: encoder.dumps(payload), number=1, repeat=args.repeat
+        ))
+        print(
+            f"{name:<14}{baseline * 1000:>16.1f}{encoded * 1000:>12.1f}"
+            f"{baseline / encoded:>8.2f}x"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Benchmark the plans of `Savior` queries on a larger seeded dataset.
+
+Run from the repository root with a local mongod:
+    python -m tests.benchmarks.bench_query_plans --logs 100000
+
+Prints, for every command issued by each case in tests/query_plans.py,
+the server execution time, keys and documents examined and any violations.
+"""
+
+import argparse
+import time
+from pymongo import MongoClient
+import indexes
+from root.partner import Partner
+from root.user import User
+from tests.query_plans import (
+    CASES, SEEDED_COLLECTIONS, QueryContext, explain_recorded, recording, seed, unseed
+)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logs", type=int, default=100_000)
+    parser.add_argument("--files", type=int, default=50)
+    parser.add_argument("--db", default="spt")
+    args = parser.parse_args()
+    client = MongoClient()
+    db = client[args.db]
+    indexes.create_indexes(db, collections=SEEDED_COLLECTIONS)
+    seeded = seed(db, num_logs=args.logs, num_files=args.files)
+    print(f"{'case':<48}{'wall ms':>9}{'server ms':>11}{'keys':>9}{'docs':>9}{'returned':>10}  violations")
+    try:
+        with recording() as recorder:
+            partner_id, user_id = str(seeded.partner_id), str(seeded.user_id)
+            context = QueryContext(
+                db=db,
+                partner=Partner(savior_id=partner_id, user_id=partner_id),
+                user=User(savior_id=user_id),
+                seeded=seeded,
+            )
+            for case in CASES:
+                recorder.clear()
+                start = time.perf_counter()
+                case.call(context)
+                wall_ms = (time.perf_counter() - start) * 1000
+                reports = explain_recorded(
+                    db,
+                    recorder,
+                    allow_blocking_sort=case.allow_blocking_sort,
+                    max_examined_ratio=case.max_examined_ratio,
+                )
+                for report in reports:
+                    print(
+                        f"{case.name:<48}{wall_ms:>9.1f}{report.execution_time_ms:>11}"
+                        f"{report.keys_examined:>9}{report.docs_examined:>9}"
+                        f"{report.n_returned:>10}  {', '.join(report.violations) or '-'}"
+                    )
+    finally:
+        unseed(db, seeded)
+        client.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,443 @@
+"""Explain-plan harness for the queries issued by `Savior` classes.
+
+Each `QueryCase` calls a `Savior` method while a pymongo command listener
+records every find and aggregate it sends. Every recorded command is then
+re-run as an `explain` with executionStats verbosity and its plan is checked for:
+    - COLLSCAN stages.
+    - Blocking, in-memory sorts. These are a SORT stage in the query plan,
+      or a $sort stage of the aggregation pipeline. Cases that sort on computed
+      or grouped values have no index to sort with and allow them.
+    - More than `max_examined_ratio` documents examined per document
+      returned by the access path (the topmost scan or fetch stage).
+
+Used by tests/root/test_query_plans.py, and by tests/benchmarks/bench_query_plans.py
+to report plan statistics on a larger seeded dataset.
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime, timezone, timedelta
+from contextlib import contextmanager
+from typing import Any, Callable, Generator
+from pymongo import monitoring
+from pymongo.database import Database
+from bson import ObjectId, SON
+from database import MongoRegistry, mongo
+from root.partner import Partner
+from root import file_summaries, product_rollups, emission_rollups
+from root.savior import Savior
+from root.user import User
+
+MAX_EXAMINED_RATIO = 2
+
+# seeded collections, and the indexes the harness creates for them
+SEEDED_COLLECTIONS = [
+    "logs", "files", "products", "product_rollups", "product_logs", "stars",
+    "emission_factors", "emission_rollups", "tasks"
+]
+
+# stages that read documents or index keys, from the outermost in
+ACCESS_STAGES = (
+    "FETCH", "TEXT_MATCH", "TEXT_OR", "IXSCAN", "COLLSCAN", "IDHACK", "COUNT_SCAN"
+)
+
+_EXPLAINABLE_COMMANDS = {"find", "aggregate"}
+# command fields added by the driver, they can't be sent with explain
+_DRIVER_FIELDS = {"lsid", "txnNumber", "$db", "$clusterTime", "$readPreference"}
+
+class CommandRecorder(monitoring.CommandListener):
+    """Records the find and aggregate commands sent by a client"""
+
+    def __init__(self):
+        self.commands: list[tuple[str, dict]] = []
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        if event.command_name in _EXPLAINABLE_COMMANDS:
+            self.commands.append((event.database_name, SON(event.command)))
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        pass
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        pass
+
+    def clear(self) -> None:
+        self.commands.clear()
+
+@contextmanager
+def recording(registry: MongoRegistry = mongo) -> Generator[CommandRecorder, None, None]:
+    """Record the commands sent by the client of `registry`.
+
+    Note: The registry's client is recreated with the listener,
+    so create `Savior` instances inside of the context.
+    """
+    recorder, options = CommandRecorder(), registry.options
+    registry.configure(event_listeners=[recorder])
+    try:
+        yield recorder
+    finally:
+        registry.close()
+        registry.options = options
+
+@dataclass(slots=True)
+class PlanReport:
+    """The result of checking an explained command
+
+    Attributes:
+        command (str): The command name and collection, e.g aggregate logs.
+        stages (list): All plan and pipeline stage names.
+        docs_examined (int): The total documents examined.
+        keys_examined (int): The total index keys examined.
+        n_returned (int): Documents returned by the access path.
+        execution_time_ms (int): The server's execution time.
+        violations (list): What is wrong with the plan, empty if nothing.
+    """
+    command: str
+    stages: list[str] = field(default_factory=list)
+    docs_examined: int = 0
+    keys_examined: int = 0
+    n_returned: int = 0
+    execution_time_ms: int = 0
+    violations: list[str] = field(default_factory=list)
+
+def explain(db: Database, command: dict) -> dict:
+    """Explain a recorded command with executionStats verbosity"""
+    command = SON(
+        (key, value) for key, value in command.items() if key not in _DRIVER_FIELDS
+    )
+    return db.command(SON([("explain", command), ("verbosity", "executionStats")]))
+
+def _plan_stages(node: Any) -> Generator[str, None, None]:
+    """Every stage name of a plan tree, not including rejected plans"""
+    if isinstance(node, dict):
+        if "stage" in node:
+            yield node["stage"]
+        for key, value in node.items():
+            if key != "rejectedPlans":
+                yield from _plan_stages(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _plan_stages(value)
+
+def _access_stage(node: Any) -> dict | None:
+    """The outermost stage that reads documents or keys"""
+    if isinstance(node, dict):
+        if node.get("stage") in ACCESS_STAGES:
+            return node
+        for key in ("inputStage", "inputStages", "queryPlan"):
+            found = _access_stage(node.get(key))
+            if found:
+                return found
+    elif isinstance(node, list):
+        for value in node:
+            found = _access_stage(value)
+            if found:
+                return found
+    return None
+
+def _query_layers(explained: dict) -> Generator[dict, None, None]:
+    """The find-layer explains, one per pushed down cursor"""
+    if "queryPlanner" in explained:
+        yield explained
+    for stage in explained.get("stages", []):
+        if "$cursor" in stage:
+            yield stage["$cursor"]
+    for shard in explained.get("shards", {}).values():
+        yield from _query_layers(shard)
+
+def analyze(
+    explained: dict,
+    command: str,
+    allow_blocking_sort: bool = False,
+    max_examined_ratio: float = MAX_EXAMINED_RATIO,
+) -> PlanReport:
+    """Check an explain output for plan regressions.
+
+    Args:
+        explained (dict): The output of `explain`.
+        command (str): A label of the explained command.
+        allow_blocking_sort (bool): Whether in-memory sorts are expected.
+        max_examined_ratio (float): The max documents examined per
+            document returned by the access path.
+
+    Returns:
+        A `PlanReport`, its violations are empty if the plan is healthy
+    """
+    report = PlanReport(command=command)
+    for layer in _query_layers(explained):
+        winning_plan = layer["queryPlanner"]["winningPlan"]
+        report.stages.extend(_plan_stages(winning_plan))
+        stats = layer.get("executionStats", {})
+        report.docs_examined += stats.get("totalDocsExamined", 0)
+        report.keys_examined += stats.get("totalKeysExamined", 0)
+        report.execution_time_ms += stats.get("executionTimeMillis", 0)
+        access = _access_stage(stats.get("executionStages"))
+        if access is None and "GROUP" in report.stages:
+            # a slot based plan with a pushed down $group only reports
+            # groups returned, the examined ratio can't be measured
+            report.n_returned += stats.get("totalDocsExamined", 0)
+        else:
+            report.n_returned += (access or stats).get("nReturned", 0)
+    report.stages.extend(
+        name for stage in explained.get("stages", [])
+        for name in stage if name != "$cursor"
+    )
+    if "COLLSCAN" in report.stages:
+        report.violations.append("COLLSCAN")
+    if not allow_blocking_sort and (
+        "SORT" in report.stages or "$sort" in report.stages
+    ):
+        report.violations.append("in-memory SORT")
+    ratio = report.docs_examined / max(report.n_returned, 1)
+    if ratio > max_examined_ratio:
+        report.violations.append(
+            f"{ratio:.1f} documents examined per returned document"
+        )
+    return report
+
+def explain_recorded(
+    db: Database, recorder: CommandRecorder, **analyze_kwargs
+) -> list[PlanReport]:
+    """Explain and analyze every command in `recorder`"""
+    reports = []
+    for db_name, command in recorder.commands:
+        name = next(iter(command))
+        reports.append(
+            analyze(
+                explain(db.client[db_name], command),
+                command=f"{name} {command[name]}",
+                **analyze_kwargs
+            )
+        )
+    return reports
+
+@dataclass(slots=True)
+class Seeded:
+    """Ids of seeded documents, the queries of `QueryCase` target them"""
+    partner_id: ObjectId
+    user_id: ObjectId
+    file_id: ObjectId
+    product_id: ObjectId
+    search_term: str
+
+def seed(db: Database, num_logs: int = 200, num_files: int = 4) -> Seeded:
+    """Insert documents for a new partner and user.
+
+    Everything is inserted with the new partner or user _id
+    as savior_id, see `unseed` to delete them.
+
+    Args:
+        db (Database): The database to seed.
+        num_logs (int): How many logs to insert, spread over `num_files` files.
+        num_files (int): How many files the logs originate from.
+    """
+    partner_id, user_id = ObjectId(), ObjectId()
+    now = datetime.now(tz=timezone.utc)
+    file_ids = [ObjectId() for _ in range(num_files)]
+    logs = [
+        {
+            "savior_id": partner_id,
+            "activity": "electricity",
+            "value": i,
+            "unit": "kwh",
+            "unit_type": "energy",
+            "scope": "2",
+            "category": "Scope 2",
+            "co2e": i % 10,
+            "created_at": now - timedelta(minutes=i),
+            "source_file": {
+                "id": file_ids[i % num_files],
+                "name": f"file-{i % num_files}.csv",
+                "upload_date": now - timedelta(days=i % num_files),
+            },
+        } for i in range(num_logs)
+    ]
+    db.logs.insert_many(logs)
+    emission_rollups.record(db, logs)
+    file_summaries.refresh(db, partner_id, file_ids=file_ids)
+    product_ids = [ObjectId() for _ in range(5)]
+    db.products.insert_many([
+        {
+            "savior_id": partner_id,
+            "product_id": product_id,
+            "name": f"harness product {i}",
+            "stage": stage,
+            "process": stage,
+            "activity": "steel",
+            "co2e": 2,
+            "published": True,
+            "created_at": now,
+            "last_update": now,
+        }
+        for i, product_id in enumerate(product_ids)
+        for stage in ("sourcing", "assembly", "processing", "transport")
+    ])
+    for product_id in product_ids:
+        product_rollups.refresh(db, product_id)
+    search_term = f"harness{partner_id}"
+    db.emission_factors.insert_many([
+        {
+            "savior_id": partner_id,
+            "product_id": product_id,
+            "source": "partners",
+            "name": f"{search_term} widget {i}",
+            "activity": "widget",
+            "co2e": 8,
+            "created_at": now,
+            "last_update": now - timedelta(minutes=i),
+        } for i, product_id in enumerate(product_ids)
+    ])
+    db.product_logs.insert_many([
+        {
+            "savior_id": user_id,
+            "product_id": product_ids[i % len(product_ids)],
+            "co2e": 8,
+            "value": 1,
+            "created_at": now - timedelta(minutes=i),
+        } for i in range(50)
+    ])
+    db.stars.insert_many([
+        {
+            "savior_id": user_id,
+            "resource_id": product_id,
+            "created_at": now - timedelta(minutes=i),
+        } for i, product_id in enumerate(product_ids)
+    ])
+    return Seeded(
+        partner_id=partner_id,
+        user_id=user_id,
+        file_id=file_ids[0],
+        product_id=product_ids[0],
+        search_term=search_term,
+    )
+
+def unseed(db: Database, seeded: Seeded) -> None:
+    """Delete the documents inserted by `seed`"""
+    savior_ids = [seeded.partner_id, seeded.user_id]
+    for collection_name in SEEDED_COLLECTIONS:
+        db[collection_name].delete_many({"savior_id": {"$in": savior_ids}})
+
+@dataclass(slots=True)
+class QueryContext:
+    """What a `QueryCase` needs to issue its queries"""
+    db: Database
+    partner: Partner
+    user: User
+    seeded: Seeded
+
+@dataclass(slots=True)
+class QueryCase:
+    """A `Savior` method call to explain
+
+    Attributes:
+        name (str): The test id of the case.
+        call (Callable): Issues the queries given a `QueryContext`.
+        allow_blocking_sort (bool): Whether the queries sort
+            on values no index can provide.
+        max_examined_ratio (float): See `analyze`.
+    """
+    name: str
+    call: Callable[[QueryContext], Any]
+    allow_blocking_sort: bool = False
+    max_examined_ratio: float = MAX_EXAMINED_RATIO
+
+def _date_range_pipeline(context: QueryContext) -> list:
+    start = datetime.now(tz=timezone.utc) - timedelta(days=1, hours=1)
+    return [
+        {"$match": {"source_file.upload_date": {"$gte": start.isoformat(timespec="microseconds")}}},
+        {"$group": {"_id": "$scope", "co2e": {"$sum": "$co2e"}}},
+    ]
+
+CASES = [
+    # sorted by a grouped value
+    QueryCase("Partner.files", lambda c: c.partner.files, allow_blocking_sort=True),
+    # sorted by the computed processed field
+    QueryCase(
+        "Partner.get_file_logs",
+        lambda c: c.partner.get_file_logs(c.seeded.file_id),
+        allow_blocking_sort=True,
+    ),
+    QueryCase("Partner.get_products", lambda c: c.partner.get_products()),
+    QueryCase(
+        "Partner.get_product",
+        lambda c: Partner.get_product(
+            c.db.products, c.seeded.product_id, matches={"published": True}
+        ),
+    ),
+    QueryCase(
+        "Partner.get_own_product",
+        lambda c: c.partner.get_own_product(c.seeded.product_id),
+    ),
+    QueryCase("User.logs", lambda c: c.user.logs(limit=10, skip=10)),
+    QueryCase(
+        "User.logs next page",
+        lambda c: c.user.logs(limit=10, cursor=c.user.logs(limit=10)["next_cursor"]),
+    ),
+    QueryCase(
+        "Partner.logs next page",
+        lambda c: c.partner.logs(limit=10, cursor=c.partner.logs(limit=10, cursor="")["next_cursor"]),
+    ),
+    QueryCase("User.starred_products", lambda c: c.user.starred_products(limit=2)),
+    # sorted by text score
+    QueryCase(
+        "Savior.collection_text_search",
+        lambda c: Savior.collection_text_search(
+            c.db.emission_factors,
+            query_params={"q": c.seeded.search_term, "limit": "2"},
+            matches={"product_id": {"$exists": True}},
+            projections={"name": 1, "co2e": 1, "last_update": 1},
+        ),
+        allow_blocking_sort=True,
+    ),
+    # sorted by text score
+    QueryCase(
+        "Savior.collection_text_search with a total",
+        lambda c: Savior.collection_text_search(
+            c.db.emission_factors,
+            query_params={"q": c.seeded.search_term, "limit": "2", "skip": "2", "total": "true"},
+            matches={"product_id": {"$exists": True}},
+            projections={"name": 1, "co2e": 1, "last_update": 1},
+        ),
+        allow_blocking_sort=True,
+    ),
+    QueryCase(
+        "Savior.collection_text_search without a query",
+        lambda c: Savior.collection_text_search(
+            c.db.emission_factors,
+            query_params={"limit": "2"},
+            matches={"product_id": {"$exists": True}},
+            projections={"name": 1, "co2e": 1, "last_update": 1},
+        ),
+    ),
+    QueryCase(
+        "Savior.get_data find",
+        lambda c: c.partner.get_data("find", "logs", {"scope": "2"}),
+    ),
+    QueryCase(
+        "Savior.get_data aggregate",
+        lambda c: c.partner.get_data("aggregate", "logs", _date_range_pipeline(c)),
+    ),
+    # sorted by grouped values
+    QueryCase(
+        "Savior.run_named_query emissions_by_month",
+        lambda c: list(
+            c.partner.run_named_query(
+                "emissions_by_month", 
+                {"start": (datetime.now(tz=timezone.utc) - timedelta(days=2)).isoformat()},
+            )
+        ),
+        allow_blocking_sort=True,
+    ),
+    QueryCase(
+        "Savior.run_named_query top_activities",
+        lambda c: list(c.partner.run_named_query("top_activities", {"limit": "3"})),
+        allow_blocking_sort=True,
+    ),
+    QueryCase(
+        "Savior.get_emissions",
+        lambda c: c.partner.get_emissions(
+            granularity="month", 
+            start=datetime.now(tz=timezone.utc) - timedelta(days=365), 
+            group_by=["scope"],
+        ),
+    ),
+]
@@ -0,0 +1,43 @@
+import time
+from root.cache import TTLCache
+
+class TestTTLCache:
+
+    def test_get_and_set(self):
+        cache = TTLCache(ttl=60)
+        assert cache.get("missing") is None
+        cache.set("key", {"value": 1})
+        assert cache.get("key") == {"value": 1}
+        cache.pop("key")
+        assert cache.get("key", "default") == "default"
+
+    def test_expiry(self):
+        cache = TTLCache(ttl=0.01)
+        cache.set("key", 1)
+        time.sleep(0.02)
+        assert cache.get("key") is None
+        assert len(cache) == 0
+
+    def test_disabled(self):
+        cache = TTLCache(ttl=0)
+        cache.set("key", 1)
+        assert cache.get("key") is None
+        assert cache.get_or_set("key", lambda: 2) == 2
+
+    def test_evicts_least_recently_used(self):
+        cache = TTLCache(ttl=60, maxsize=2)
+        cache.set("first", 1)
+        cache.set("second", 2)
+        cache.get("first")
+        cache.set("third", 3)
+        assert cache.get("second") is None
+        assert cache.get("first") == 1
+
+    def test_get_or_set(self):
+        cache, calls = TTLCache(ttl=60), []
+        factory = lambda: calls.append(1) or "value"
+        assert cache.get_or_set("key", factory) == "value"
+        assert cache.get_or_set("key", factory) == "value"
+        assert len(calls) == 1
+        assert cache.get_or_set("none", lambda: None) is None
+        assert cache.get("none", "missing") == "missing"
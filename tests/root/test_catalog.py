@@ -0,0 +1,57 @@
+import pytest
+from datetime import datetime, timezone
+from root import catalog
+from exceptions import (
+    InvalidRequestDataError, QueryRejectedError, ResourceNotFoundError
+)
+
+def test_catalog_queries_are_scoped():
+    for query in catalog.CATALOG.values():
+        pipeline = query.pipeline({})
+        assert "$match" in pipeline[0]
+        assert "savior_id" not in pipeline[0]["$match"]
+        
+def test_pipeline_params():
+    pipeline = catalog.get("top_activities").pipeline(
+        {"start": "2024-01-01", "scope": "2", "limit": "5", "unknown": "1"}
+    )
+    assert pipeline[0]["$match"] == {
+        "source_file.upload_date": {"$gte": datetime(2024, 1, 1, tzinfo=timezone.utc)},
+        "scope": "2",
+    }
+    assert {"$limit": 5} in pipeline
+    assert {"$limit": 10} in catalog.get("top_activities").pipeline({})
+    
+@pytest.mark.parametrize(
+    "params", [{"start": "last week"}, {"limit": "ten"}, {"limit": "0"}, {"limit": "101"}]
+)
+def test_invalid_params(params):
+    with pytest.raises(InvalidRequestDataError):
+        catalog.get("top_activities").pipeline(params)
+        
+def test_unknown_query():
+    with pytest.raises(ResourceNotFoundError):
+        catalog.get("not_a_query")
+        
+def test_register_checks_queries():
+    lookup = catalog.NamedQuery(
+        name="lookup",
+        description="",
+        collection="logs",
+        build=lambda params: [
+            {"$match": {}}, {"$lookup": {"from": "users", "as": "users", "pipeline": []}}
+        ],
+    )
+    with pytest.raises(QueryRejectedError):
+        catalog.register(lookup)
+    with pytest.raises(ValueError):
+        catalog.register(
+            catalog.NamedQuery(
+                name="unindexed",
+                description="",
+                collection="logs",
+                build=lambda params: [{"$match": {}}],
+                hint="not_an_index",
+            )
+        )
+    assert "lookup" not in catalog.CATALOG and "unindexed" not in catalog.CATALOG
@@ -0,0 +1,76 @@
+import pytest
+from bson import ObjectId
+from root import cursors
+from config import Config
+from exceptions import InvalidRequestDataError, ResourceNotFoundError
+
+class Documents:
+    """An iterator that records whether it was closed, like a guarded cursor"""
+    def __init__(self, n: int):
+        self.documents, self.closed = iter(range(n)), False
+        
+    def __iter__(self):
+        return self
+    
+    def __next__(self):
+        return next(self.documents)
+    
+    def close(self):
+        self.closed = True
+
+def test_batches():
+    savior_id, documents = ObjectId(), Documents(5)
+    batch = cursors.open_cursor(savior_id, documents, batch_size=2)
+    assert batch["results"] == [0, 1]
+    batch = cursors.next_batch(savior_id, batch["cursor"])
+    assert batch["results"] == [2, 3]
+    with pytest.raises(ResourceNotFoundError):
+        cursors.next_batch(ObjectId(), batch["cursor"])
+    batch = cursors.next_batch(savior_id, batch["cursor"], batch_size=3)
+    assert batch == {"results": [4], "cursor": None}
+    assert documents.closed
+    assert cursors.num_open(savior_id) == 0
+    
+def test_exhausted_first_batch():
+    documents = Documents(1)
+    assert cursors.open_cursor(ObjectId(), documents, batch_size=2) == {
+        "results": [0], "cursor": None
+    }
+    assert documents.closed
+    
+def test_close_cursor():
+    savior_id, documents = ObjectId(), Documents(5)
+    cursor_id = cursors.open_cursor(savior_id, documents, batch_size=1)["cursor"]
+    assert not cursors.close_cursor(ObjectId(), cursor_id)
+    assert cursors.close_cursor(savior_id, cursor_id)
+    assert documents.closed
+    with pytest.raises(ResourceNotFoundError):
+        cursors.next_batch(savior_id, cursor_id)
+        
+def test_max_per_savior(monkeypatch):
+    monkeypatch.setattr(Config, "cursor_max_per_savior", 2)
+    savior_id = ObjectId()
+    opened = [Documents(5) for _ in range(3)]
+    cursor_ids = [
+        cursors.open_cursor(savior_id, documents, batch_size=1)["cursor"]
+        for documents in opened
+    ]
+    assert [documents.closed for documents in opened] == [True, False, False]
+    assert cursors.num_open(savior_id) == 2
+    with pytest.raises(ResourceNotFoundError):
+        cursors.next_batch(savior_id, cursor_ids[0])
+    for cursor_id in cursor_ids[1:]:
+        cursors.close_cursor(savior_id, cursor_id)
+        
+def test_idle_cursors_expire(monkeypatch):
+    savior_id, documents = ObjectId(), Documents(5)
+    cursor_id = cursors.open_cursor(savior_id, documents, batch_size=1)["cursor"]
+    monkeypatch.setattr(Config, "cursor_idle_ttl", -1)
+    with pytest.raises(ResourceNotFoundError):
+        cursors.next_batch(savior_id, cursor_id)
+    assert documents.closed
+    
+@pytest.mark.parametrize("batch_size", [0, -1, "10", True, 10 ** 9])
+def test_invalid_batch_size(batch_size):
+    with pytest.raises(InvalidRequestDataError):
+        cursors.validate_batch_size(batch_size)
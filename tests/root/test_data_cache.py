@@ -0,0 +1,77 @@
+import pytest
+from bson import ObjectId
+from root import data_cache
+from root.cache import TTLCache
+
+@pytest.fixture
+def cache(monkeypatch, db):
+    monkeypatch.setattr(data_cache, "_cache", TTLCache(ttl=60))
+    yield
+    db.data_versions.delete_many({})
+    
+def test_canonicalize():
+    assert data_cache.canonicalize("find", {"a": 1, "b": 2}) == data_cache.canonicalize(
+        "find", {"b": 2, "a": 1}
+    )
+    assert data_cache.canonicalize("find", {"a": 1}) != data_cache.canonicalize(
+        "find", {"a": "1"}
+    )
+    assert data_cache.canonicalize(
+        "aggregate", [{"$match": {"a": 1, "b": 2}}, {"$sort": {"a": 1, "b": 1}}]
+    ) == data_cache.canonicalize(
+        "aggregate", [{"$match": {"b": 2, "a": 1}}, {"$sort": {"a": 1, "b": 1}}]
+    )
+    assert data_cache.canonicalize(
+        "aggregate", [{"$sort": {"a": 1, "b": 1}}]
+    ) != data_cache.canonicalize(
+        "aggregate", [{"$sort": {"b": 1, "a": 1}}]
+    )
+    
+def test_cached(cache):
+    savior_id, queries = ObjectId(), []
+    def _query():
+        queries.append(1)
+        return iter([{"co2e": 1}, {"co2e": 2}])
+    def _get():
+        return list(data_cache.cached(savior_id, "logs", "find", {"scope": 1}, _query))
+    
+    assert _get() == _get() == [{"co2e": 1}, {"co2e": 2}]
+    assert len(queries) == 1
+    data_cache.bump(ObjectId(), "logs")
+    data_cache.bump(savior_id, "files")
+    _get()
+    assert len(queries) == 1
+    data_cache.bump(savior_id, "logs")
+    _get()
+    assert len(queries) == 2
+    data_cache.bump(None, "logs")
+    _get()
+    assert len(queries) == 3
+    
+def test_partially_read_results_arent_cached(cache):
+    savior_id, queries = ObjectId(), []
+    def _query():
+        queries.append(1)
+        return iter([{"co2e": 1}, {"co2e": 2}])
+    results = data_cache.cached(savior_id, "logs", "find", {}, _query)
+    next(results)
+    results.close()
+    list(data_cache.cached(savior_id, "logs", "find", {}, _query))
+    assert len(queries) == 2
+    
+def test_writes_of_other_workers(cache, db):
+    savior_id, queries = ObjectId(), []
+    def _query():
+        queries.append(1)
+        return iter([{"co2e": 1}])
+    def _get():
+        return list(data_cache.cached(savior_id, "logs", "find", {}, _query))
+    
+    _get()
+    # versions are shared, e.g bumped by another worker's write
+    db.data_versions.update_one(
+        {"_id": f"{savior_id}/logs"}, {"$inc": {"version": 1}}, upsert=True
+    )
+    _get()
+    assert len(queries) == 2
+    assert data_cache.version(savior_id, "logs") == (0, 1)
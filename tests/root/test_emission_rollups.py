@@ -0,0 +1,59 @@
+import pytest
+from bson import ObjectId
+from datetime import datetime, timezone
+from root import emission_rollups
+from exceptions import InvalidRequestDataError, ResourceConflictError
+
+def test_accumulate():
+    savior_id = ObjectId()
+    may = datetime(2024, 5, 3, 12, tzinfo=timezone.utc)
+    logs = [
+        {"savior_id": savior_id, "scope": 2, "co2e": 2, "source_file": {"upload_date": may}},
+        {"savior_id": savior_id, "scope": 2, "co2e": 3, "created_at": may.replace(day=20)},
+        {"savior_id": savior_id, "scope": 2, "source_file": {"upload_date": may}},
+    ]
+    increments = {}
+    emission_rollups._accumulate(increments, logs, sign=1)
+    dimensions = (2, None, None, None)
+    assert increments == {
+        (savior_id, "day", datetime(2024, 5, 3, tzinfo=timezone.utc), *dimensions): [2, 2],
+        (savior_id, "day", datetime(2024, 5, 20, tzinfo=timezone.utc), *dimensions): [3, 1],
+        (savior_id, "month", datetime(2024, 5, 1, tzinfo=timezone.utc), *dimensions): [5, 3],
+    }
+    emission_rollups._accumulate(increments, logs[:1], sign=-1)
+    assert increments[
+        (savior_id, "month", datetime(2024, 5, 1, tzinfo=timezone.utc), *dimensions)
+    ] == [3, 2]
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"granularity": "year"},
+        {"group_by": ["activity"]},
+        {"filters": {"savior_id": "someone else"}},
+        {"start": "not a date"},
+    ]
+)
+def test_read_rejects_invalid_arguments(kwargs):
+    with pytest.raises(InvalidRequestDataError):
+        emission_rollups.read(None, ObjectId(), **kwargs)
+
+def test_backfill_aborts_on_concurrent_records(db, monkeypatch):
+    savior_id = ObjectId()
+    log = {
+        "savior_id": savior_id, "scope": 2, "co2e": 2, "created_at": datetime.now(tz=timezone.utc)
+    }
+    emission_rollups.record(db, [log])
+    accumulate = emission_rollups._accumulate
+    def accumulate_and_record(increments, logs, sign):
+        accumulate(increments, logs, sign)
+        emission_rollups.record(db, [log])
+    monkeypatch.setattr(emission_rollups, "_accumulate", accumulate_and_record)
+    try:
+        with pytest.raises(ResourceConflictError):
+            emission_rollups.backfill(db)
+        buckets = db.emission_rollups.find({"savior_id": savior_id})
+        assert [bucket["count"] for bucket in buckets] == [3, 3]
+        assert emission_rollups.BACKFILL_COLLECTION not in db.list_collection_names()
+    finally:
+        db.emission_rollups.delete_many({"savior_id": savior_id})
@@ -0,0 +1,26 @@
+from bson import ObjectId
+from datetime import datetime, timezone
+from root import file_summaries
+
+def test_summarize():
+    file_id, savior_id = ObjectId(), ObjectId()
+    now = datetime.now(tz=timezone.utc)
+    logs = [{"co2e": 2}, {"co2e": 3.5}, {"co2e": None}, {}]
+    summary = file_summaries.summarize(
+        file_id=file_id, savior_id=savior_id, name="test.csv", upload_date=now, logs=logs
+    )
+    assert summary == {
+        "_id": file_id,
+        "savior_id": savior_id,
+        "name": "test.csv",
+        "upload_date": now,
+        "num_rows": 4,
+        "co2e": 5.5,
+        "processed": 2,
+        "unprocessed": 2,
+        "needs_processing": True,
+    }
+    processed = file_summaries.summarize(
+        file_id=file_id, savior_id=savior_id, name=None, upload_date=now, logs=logs[:2]
+    )
+    assert not processed["needs_processing"]
@@ -0,0 +1,74 @@
+import pytest
+from bson import ObjectId
+from pymongo.errors import ExecutionTimeout
+from root import guards
+from config import Config
+from exceptions import QueryRejectedError, QueryTimeoutError
+
+SAVIOR_MATCH = {"$match": {"savior_id": ObjectId()}}
+
+def test_check_pipeline():
+    pipeline = [SAVIOR_MATCH, {"$group": {"_id": "$scope", "co2e": {"$sum": "$co2e"}}}]
+    guarded_pipeline, options = guards.check_pipeline("logs", pipeline)
+    assert guarded_pipeline[:-1] == pipeline
+    assert guarded_pipeline[-1] == {"$limit": guards.config.data_max_results}
+    assert options == {
+        "maxTimeMS": guards.config.data_max_time_ms,
+        "allowDiskUse": guards.config.data_allow_disk_use,
+    }
+    
+@pytest.mark.parametrize(
+    ("collection", "pipeline"),
+    [
+        # reads another collection
+        ("logs", [SAVIOR_MATCH, {"$lookup": {"from": "users", "as": "users", "pipeline": []}}]),
+        ("logs", [SAVIOR_MATCH, {"$facet": {"out": [{"$out": "logs_copy"}]}}]),
+        # runs javascript
+        ("logs", [{"$match": {**SAVIOR_MATCH["$match"], "$where": "sleep(1000)"}}]),
+        ("logs", [SAVIOR_MATCH, {"$group": {"_id": None, "x": {"$accumulator": {}}}}]),
+        # too long
+        ("logs", [SAVIOR_MATCH, *[{"$skip": 0}] * guards.config.data_max_pipeline_stages]),
+        ("logs", [SAVIOR_MATCH, *[{"$sort": {"co2e": 1}}] * (guards.config.data_max_blocking_stages + 1)]),
+        # no index leads with savior_id
+        ("users", [SAVIOR_MATCH]),
+    ]
+)
+def test_check_pipeline_rejects(collection, pipeline):
+    with pytest.raises(QueryRejectedError) as e:
+        guards.check_pipeline(collection, pipeline)
+    assert e.value.status_code == 422
+    
+def test_check_find():
+    options = guards.check_find("logs", SAVIOR_MATCH["$match"])
+    assert options["limit"] == guards.config.data_max_results
+    with pytest.raises(QueryRejectedError):
+        guards.check_find("logs", {**SAVIOR_MATCH["$match"], "$where": "true"})
+        
+def test_is_indexed():
+    assert guards.is_indexed("logs", {"source_file.upload_date": {"$gte": "2024"}})
+    assert not guards.is_indexed("logs", {"activity": "electricity"})
+    # savior_id is always added, it doesn't narrow the savior's documents
+    assert not guards.is_indexed("logs", SAVIOR_MATCH["$match"])
+    
+def test_check_cost(db, monkeypatch):
+    savior_id = ObjectId()
+    db.logs.insert_many([{"savior_id": savior_id, "co2e": i} for i in range(3)])
+    try:
+        guards.check_cost(db.logs, savior_id)
+        monkeypatch.setattr(Config, "data_max_scanned_docs", 2)
+        with pytest.raises(QueryRejectedError) as e:
+            guards.check_cost(db.logs, savior_id)
+        assert e.value.status_code == 422
+        guards.check_cost(db.logs, savior_id, max_scanned_docs=3)
+    finally:
+        db.logs.delete_many({"savior_id": savior_id})
+        
+def test_guarded_translates_timeouts():
+    def _documents():
+        yield {"co2e": 1}
+        raise ExecutionTimeout("operation exceeded time limit", code=50)
+    documents = guards.guarded(_documents())
+    assert next(documents) == {"co2e": 1}
+    with pytest.raises(QueryTimeoutError) as e:
+        next(documents)
+    assert e.value.status_code == 504
@@ -0,0 +1,102 @@
+import io
+import os
+import pytest
+from bson import ObjectId
+from openpyxl import Workbook
+from root import ingest
+from config import Config
+from exceptions import InvalidMediaTypeError, InvalidRequestDataError
+
+def test_read_csv_chunks():
+    csv = io.BytesIO(b"activity,value\n" + b"".join(b"a,%d\n" % i for i in range(5)))
+    chunks = list(ingest.file_chunks(csv, "ledger.CSV", chunk_size=2))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert list(chunks[-1]["value"]) == [4]
+    
+def test_empty_csv():
+    with pytest.raises(InvalidRequestDataError):
+        list(ingest.read_csv_chunks(io.BytesIO(b"")))
+        
+def test_unsupported_file():
+    assert not ingest.supports_chunks("ledger.pdf")
+    with pytest.raises(InvalidMediaTypeError):
+        ingest.file_chunks(io.BytesIO(b""), "ledger.pdf")
+        
+def test_ingest_result():
+    result = ingest.IngestResult(file_id=ObjectId())
+    result.add([{"co2e": 1}, {"co2e": 2.5}, {"co2e": None}])
+    result.add([{"co2e": 1}])
+    assert result.to_dict() == {
+        "file_id": result.file_id, 
+        "num_rows": 4, 
+        "co2e": 4.5, 
+        "processed": 3, 
+        "num_chunks": 2,
+    }
+    
+@pytest.fixture
+def workbook(tmp_path):
+    path = tmp_path / "ledger.xlsx"
+    book = Workbook(write_only=True)
+    sheet = book.create_sheet("scope 2")
+    sheet.append(["activity", "value", None])
+    for i in range(5):
+        sheet.append(["electricity", i])
+        if i == 2:
+            sheet.append([None, None])
+    book.save(path)
+    return path
+
+def test_read_excel_chunks(workbook):
+    with open(workbook, "rb") as file:
+        chunks = list(ingest.file_chunks(file, "ledger.xlsx", chunk_size=2))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert list(chunks[0].columns) == ["activity", "value"]
+    assert [value for chunk in chunks for value in chunk["value"]] == list(range(5))
+    with open(workbook, "rb") as file:
+        with pytest.raises(InvalidRequestDataError):
+            list(ingest.read_excel_chunks(file, sheet_name="scope 3"))
+            
+def test_read_invalid_excel():
+    with pytest.raises(InvalidRequestDataError):
+        list(ingest.read_excel_chunks(io.BytesIO(b"not a workbook")))
+    
+@pytest.mark.parametrize(
+    ("sheet_name", "fields"),
+    [
+        ("Scope 1 - Stationary combustion", {"scope": "1", "category": "Stationary combustion"}),
+        ("scope2", {"scope": "2"}),
+        ("SCOPE 3: Business travel", {"scope": "3", "category": "Business travel"}),
+        ("Electricity", {"category": "Electricity"}),
+        ("Sheet1", {}),
+        ("Scope 4", {"category": "Scope 4"}),
+    ]
+)
+def test_sheet_fields(sheet_name, fields):
+    assert ingest.sheet_fields(sheet_name) == fields
+    
+def test_parse_sheets(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "ingest_workers", 2)
+    path = tmp_path / "ledger.xlsx"
+    book = Workbook(write_only=True)
+    for scope in (1, 2, 3):
+        sheet = book.create_sheet(f"Scope {scope}")
+        sheet.append(["activity", "value"])
+        for i in range(scope):
+            sheet.append(["electricity", i])
+    book.create_sheet("Sheet1")
+    book.save(path)
+    sheets = ingest.sheet_names(path)
+    # chunks are read before the next sheet, their files are then removed
+    parsed = {
+        sheet: [len(chunk) for chunk in chunks]
+        for sheet, chunks in ingest.parse_sheets(path, sheets, chunk_size=2)
+    }
+    # empty sheets are skipped
+    assert parsed == {"Scope 1": [1], "Scope 2": [2], "Scope 3": [2, 1]}
+    
+def test_saved_upload():
+    with ingest.saved_upload(io.BytesIO(b"activity,value"), suffix=".csv") as path:
+        with open(path, "rb") as file:
+            assert file.read() == b"activity,value"
+    assert not os.path.exists(path)
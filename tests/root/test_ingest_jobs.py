@@ -0,0 +1,62 @@
+import io
+import pytest
+from bson import ObjectId
+from gridfs import GridFSBucket
+from root import ingest_jobs
+from config import Config
+from exceptions import InvalidMediaTypeError, ResourceNotFoundError
+
+FORM = {"scope": "2", "category": "test", "unit_type": "weight", "ignored": "field"}
+
+@pytest.fixture
+def run_inline(monkeypatch):
+    """Run jobs as they are submitted"""
+    monkeypatch.setattr(ingest_jobs, "_dispatch", ingest_jobs.run)
+    monkeypatch.setattr(Config, "ingest_chunk_size", 2)
+
+@pytest.fixture
+def savior_id(db, mock_partner_account):
+    savior_id = mock_partner_account["_id"]
+    yield savior_id
+    for collection in ("logs", "files", "emission_rollups", "ingest_jobs"):
+        db[collection].delete_many({"savior_id": savior_id})
+
+def _csv(values: list) -> io.BytesIO:
+    rows = "".join(f"test,{value},kg\n" for value in values)
+    return io.BytesIO(f"activity,value,unit\n{rows}".encode())
+
+def _submit(db, savior_id, file: io.BytesIO, filename: str = "ledger.csv") -> ObjectId:
+    return ingest_jobs.submit(
+        db, savior_id, user_id=str(savior_id), file=file, filename=filename, form=FORM
+    )
+
+def test_ingest_job(db, savior_id, run_inline):
+    job_id = _submit(db, savior_id, _csv(range(5)))
+    job = ingest_jobs.get(db, savior_id, job_id)
+    assert job["status"] == "done"
+    assert job["progress"] == {"rows_parsed": 5, "rows_inserted": 5, "rows_failed": 0}
+    assert db.logs.count_documents({"source_file.id": job["file_id"]}) == 5
+    assert "form" not in job and "upload_id" not in job
+    stored = db.ingest_jobs.find_one({"_id": job_id})
+    assert "ignored" not in stored["form"]
+    # the raw file is removed once ingested
+    assert not list(GridFSBucket(db, ingest_jobs.BUCKET_NAME).find({"_id": stored["upload_id"]}))
+
+def test_invalid_rows(db, savior_id, run_inline):
+    job_id = _submit(db, savior_id, _csv([1, 2, -1, "ten", 5]))
+    job = ingest_jobs.get(db, savior_id, job_id)
+    assert (job["status"], job["status_code"]) == ("failed", 400)
+    assert job["progress"] == {"rows_parsed": 5, "rows_inserted": 0, "rows_failed": 2}
+    assert set(job["errors"]["value"][i]["rows"][0] for i in range(2)) == {2, 3}
+    assert not db.logs.count_documents({"savior_id": savior_id})
+
+def test_unsupported_file(db, savior_id):
+    with pytest.raises(InvalidMediaTypeError):
+        _submit(db, savior_id, io.BytesIO(b""), filename="ledger.xls")
+
+def test_get_other_saviors_job(db, savior_id, run_inline):
+    job_id = _submit(db, savior_id, _csv([1]))
+    with pytest.raises(ResourceNotFoundError):
+        ingest_jobs.get(db, ObjectId(), job_id)
+    with pytest.raises(ResourceNotFoundError):
+        ingest_jobs.get(db, savior_id, "not-an-id")
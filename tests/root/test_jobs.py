@@ -0,0 +1,60 @@
+import pytest
+from bson import ObjectId
+from root import jobs
+from config import Config
+from exceptions import (
+    InvalidRequestDataError, ResourceConflictError, ResourceNotFoundError
+)
+
+@pytest.fixture
+def run_inline(monkeypatch):
+    """Run jobs as they are submitted"""
+    monkeypatch.setattr(jobs, "_dispatch", jobs.run)
+    monkeypatch.setattr(Config, "job_page_size", 2)
+    
+@pytest.fixture
+def savior_logs(db):
+    savior_id = ObjectId()
+    db.logs.insert_many(
+        [{"savior_id": savior_id, "scope": 1, "co2e": i} for i in range(5)]
+    )
+    yield savior_id
+    db.logs.delete_many({"savior_id": savior_id})
+    db.query_jobs.delete_many({"savior_id": savior_id})
+    
+def test_job_results(db, savior_logs, run_inline):
+    job_id = jobs.submit(
+        db, savior_logs, "find", "logs", {"scope": 1}
+    )
+    job = jobs.get(db, savior_logs, job_id)
+    assert job["status"] == "done"
+    assert (job["num_results"], job["num_pages"]) == (5, 3)
+    pages = [jobs.results(db, savior_logs, job_id, page=page) for page in range(3)]
+    assert sorted(
+        log["co2e"] for page in pages for log in page["results"]
+    ) == list(range(5))
+    with pytest.raises(ResourceNotFoundError):
+        jobs.results(db, savior_logs, job_id, page=3)
+    with pytest.raises(ResourceNotFoundError):
+        jobs.get(db, ObjectId(), job_id)
+    db.query_job_results.delete_many({"job_id": job_id})
+    
+def test_failed_job(db, savior_logs, run_inline):
+    job_id = jobs.submit(
+        db, savior_logs, "aggregate", "logs", [{"$lookup": {"from": "users", "as": "u"}}]
+    )
+    job = jobs.get(db, savior_logs, job_id)
+    assert (job["status"], job["status_code"]) == ("failed", 422)
+    with pytest.raises(ResourceConflictError):
+        jobs.results(db, savior_logs, job_id)
+        
+@pytest.mark.parametrize(
+    ("query_type", "filters"), [("update", {}), ("aggregate", {}), ("find", [])]
+)
+def test_submit_invalid(query_type, filters, db):
+    with pytest.raises(InvalidRequestDataError):
+        jobs.submit(db, ObjectId(), query_type, "logs", filters)
+        
+def test_get_invalid_id(db):
+    with pytest.raises(ResourceNotFoundError):
+        jobs.get(db, ObjectId(), "not-an-id")
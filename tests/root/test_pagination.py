@@ -0,0 +1,24 @@
+import pytest
+from bson import ObjectId
+from datetime import datetime, timezone
+from root import pagination
+from exceptions import InvalidRequestDataError
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 5, 1, 12, 30, 15, 123000, tzinfo=timezone.utc)
+    document = {"_id": ObjectId(), "created_at": created_at}
+    cursor = pagination.encode_cursor(document)
+    assert pagination.decode_cursor(cursor) == (created_at, document["_id"])
+    # naive datetimes read from mongodb are UTC
+    naive = {**document, "created_at": created_at.replace(tzinfo=None)}
+    assert pagination.encode_cursor(naive) == cursor
+    
+@pytest.mark.parametrize("cursor", ["", "garbage", "bm90OmFuOmlk", "MTI6eHl6"])
+def test_decode_invalid_cursor(cursor):
+    with pytest.raises(InvalidRequestDataError):
+        pagination.decode_cursor(cursor)
+        
+def test_after():
+    document = {"_id": ObjectId(), "created_at": datetime.now(tz=timezone.utc)}
+    filters = pagination.after(pagination.encode_cursor(document))
+    assert set(filters) == {"created_at", "$or"}
@@ -1,4 +1,6 @@
 from root.partner import Partner
+from root.savior import account_versions
+from root import file_summaries, product_rollups
 import pytest
 from pytest import fixture
 from bson import ObjectId
@@ -6,6 +8,8 @@ from datetime import datetime, timedelta
 from numbers import Number
 import pandas as pd
 from pymongo.errors import DuplicateKeyError
+from openpyxl import Workbook
+from exceptions import InvalidRequestDataError, FileValidationError
 from datetime import datetime, timezone
             
 @fixture(scope="class")
@@ -42,7 +46,9 @@ def setup(db, savior_id):
 @fixture(scope="class", autouse=True)
 def delete_test_inserts(partner: Partner, savior_id):
     yield
-    for collection in ["logs", "products", "tasks"]:
+    for collection in [
+        "logs", "files", "products", "product_rollups", "emission_rollups", "tasks"
+    ]:
         partner.db[collection].delete_many({"savior_id": savior_id})
     
 class TestPartner:    
@@ -52,6 +58,13 @@ class TestPartner:
         """Test `savior` property returns correct savior_id"""
         assert partner.savior["savior_id"] == savior_id
         
+    def test_savior_is_memoized(self, savior_id):
+        """The profile is read from the db once per instance"""
+        partner = Partner(savior_id=str(savior_id), user_id=str(savior_id))
+        savior = partner.savior
+        partner.db = None # any db access would raise
+        assert partner.savior is savior
+        
     def test_update_profile(self, partner: Partner):
         """
         Test the update of a profile. we test username and make sure that when it is changed,
@@ -69,6 +82,23 @@ class TestPartner:
             tasks_after = get_assigned_tasks(new_username)
             assert bool(tasks_after)
     
+    def test_update_profile_of_a_user(self, partner: Partner, savior_id):
+        """A user's update is made to, and versions, their own account"""
+        user_id = partner.db.partners.insert_one(
+            {"company_id": savior_id, "username": f"member {datetime.now().timestamp()}"}
+        ).inserted_id
+        try:
+            member = Partner(savior_id=str(savior_id), user_id=str(user_id))
+            company_username = partner.db.partners.find_one({"_id": savior_id})["username"]
+            new_username = f"renamed {datetime.now().timestamp()}"
+            assert member.update_profile({"username": new_username})
+            user = partner.db.partners.find_one({"_id": user_id})
+            assert (user["username"], user["account_version"]) == (new_username, 1)
+            assert partner.db.partners.find_one({"_id": savior_id})["username"] == company_username
+            assert account_versions.get(str(user_id)) == 1
+        finally:
+            partner.db.partners.delete_one({"_id": user_id})
+    
     def test_process_file_logs(self, partner: Partner, savior_id):
         mock_logs = [
             {
@@ -101,6 +131,101 @@ class TestPartner:
         assert partner.db.tasks.find_one({"_id": mock_task_id})["complete"] == True
         partner.db.tasks.update_one({"_id": mock_task_id}, {"$set": {"complete": False}})
     
+    def test_ingest_emissions_file(self, partner: Partner, savior_id):
+        rows = pd.DataFrame(
+            [{"activity": "test", "value": i, "unit": "kg"} for i in range(5)]
+        )
+        form = {"scope": "2", "category": "test", "unit_type": "weight"}
+        result = partner.ingest_emissions_file(
+            chunks=[rows[:2], rows[2:4], rows[4:]], 
+            get_form_field=form.get, 
+            filename="chunks.csv",
+        )
+        assert (result.num_rows, result.num_chunks) == (5, 3)
+        logs = list(partner.db.logs.find({"source_file.id": result.file_id}))
+        assert len(logs) == 5
+        assert {log["scope"] for log in logs} == {"2"}
+        assert sum(log["co2e"] for log in logs) == result.co2e
+        summary = partner.db.files.find_one({"_id": result.file_id})
+        assert (summary["num_rows"], summary["co2e"]) == (5, result.co2e)
+        
+    def test_ingest_emissions_file_rolls_back(self, partner: Partner, savior_id):
+        rows = pd.DataFrame([{"activity": "test", "value": 1, "unit": "kg"}])
+        form = {"scope": "2", "category": "test", "unit_type": "weight"}
+        def _chunks():
+            yield rows
+            raise ValueError("unparsable chunk")
+        logs_before = partner.db.logs.count_documents({"savior_id": savior_id})
+        with pytest.raises(ValueError):
+            partner.ingest_emissions_file(
+                chunks=_chunks(), get_form_field=form.get, filename="fails.csv"
+            )
+        assert partner.db.logs.count_documents({"savior_id": savior_id}) == logs_before
+        
+    def test_ingest_emissions_file_validates(self, partner: Partner, savior_id):
+        rows = pd.DataFrame(
+            [{"activity": "test", "value": value, "unit": "kg"} for value in (1, -1, 1)]
+        )
+        form = {"scope": "2", "category": "test", "unit_type": "weight"}
+        logs_before = partner.db.logs.count_documents({"savior_id": savior_id})
+        with pytest.raises(FileValidationError) as e:
+            partner.ingest_emissions_file(
+                chunks=[rows[:1], rows[1:]], get_form_field=form.get, filename="bad.csv"
+            )
+        assert e.value.errors["value"][0]["rows"] == [1]
+        assert partner.db.logs.count_documents({"savior_id": savior_id}) == logs_before
+        
+    def test_ingest_workbook(self, partner: Partner, tmp_path):
+        path = tmp_path / "ledger.xlsx"
+        book = Workbook(write_only=True)
+        for name in ("Scope 1 - Fuel", "Scope 2"):
+            sheet = book.create_sheet(name)
+            sheet.append(["activity", "value", "unit"])
+            sheet.append(["test", 1, "kg"])
+        book.save(path)
+        form = {"category": "form category", "unit_type": "weight"}
+        results = partner.ingest_workbook(
+            path=str(path), sheets=["all"], get_form_field=form.get, filename="ledger.xlsx"
+        )
+        assert len(results) == 2
+        logs = {
+            log["source_file"]["name"]: log for log in partner.db.logs.find(
+                {"source_file.id": {"$in": [result.file_id for result in results]}}
+            )
+        }
+        assert logs["ledger.xlsx - Scope 1 - Fuel"]["scope"] == "1"
+        assert logs["ledger.xlsx - Scope 1 - Fuel"]["category"] == "Fuel"
+        assert logs["ledger.xlsx - Scope 2"]["category"] == "form category"
+        with pytest.raises(InvalidRequestDataError, match="Invalid sheets: Scope 3"):
+            partner.ingest_workbook(
+                path=str(path), sheets=["Scope 3"], get_form_field=form.get, filename="ledger.xlsx"
+            )
+        with pytest.raises(InvalidRequestDataError, match="No sheets given"):
+            partner.ingest_workbook(
+                path=str(path), sheets=[], get_form_field=form.get, filename="ledger.xlsx"
+            )
+        
+    def test_file_summaries_match_logs(self, partner: Partner, savior_id):
+        """Summaries written on upload are the same as ones rebuilt from logs"""
+        files = partner.files
+        assert files
+        file_summaries.refresh(partner.db, savior_id)
+        assert partner.files == files
+        
+    def test_emission_rollups_match_logs(self, partner: Partner, savior_id):
+        """Buckets recorded on upload hold the co2e and count of the logs"""
+        logs = list(
+            partner.db.logs.aggregate([
+                {"$match": {"savior_id": savior_id}},
+                {"$group": {"_id": None, "co2e": {"$sum": "$co2e"}, "count": {"$sum": 1}}},
+            ])
+        )
+        assert logs
+        for granularity in ("day", "month"):
+            periods = partner.get_emissions(granularity=granularity)
+            assert sum(period["co2e"] for period in periods) == logs[0]["co2e"]
+            assert sum(period["count"] for period in periods) == logs[0]["count"]
+        
     def test_get_files(self, partner: Partner):
         files = partner.files
         assert files
@@ -216,6 +341,36 @@ class TestPartner:
             process["co2e"] for process in processes
         ) == product_co2e
         
+    def test_product_rollups_match_processes(
+        self, partner: Partner, mock_product_id: ObjectId
+    ):
+        """Rollups kept up to date by process writes are the same as rebuilt ones"""
+        process_id = partner.create_product_process(
+            product_id=mock_product_id, 
+            stage="transport", 
+            process_data={"process": "truck", "activity": "truck", "activity_value": 2},
+        )
+        partner.update_product_process(process_id, {"activity_value": 3})
+        def _totals(header):
+            return (
+                header["co2e"], 
+                header["num_processes"], 
+                {
+                    stage: (totals["co2e"], totals["num_processes"])
+                    for stage, totals in header["stages"].items() 
+                    if totals["num_processes"]
+                },
+            )
+        header = partner.db.product_rollups.find_one({"_id": mock_product_id})
+        assert _totals(header) == _totals(
+            product_rollups.refresh(partner.db, mock_product_id)
+        )
+        assert partner.delete_product_process(process_id)
+        header = partner.db.product_rollups.find_one({"_id": mock_product_id})
+        assert _totals(header) == _totals(
+            product_rollups.refresh(partner.db, mock_product_id)
+        )
+        
     def test_publish_and_unpublish_product(
         self, 
         partner: Partner, 
@@ -0,0 +1,49 @@
+import pytest
+from datetime import datetime, timezone
+from root import pledges
+from exceptions import InvalidRequestDataError
+
+NOW = datetime(2024, 12, 18, 15, 30, tzinfo=timezone.utc) # a wednesday
+
+@pytest.mark.parametrize(
+    ("frequency", "start", "end"),
+    [
+        ("day", datetime(2024, 12, 18), datetime(2024, 12, 19)),
+        ("week", datetime(2024, 12, 16), datetime(2024, 12, 23)),
+        ("month", datetime(2024, 12, 1), datetime(2025, 1, 1)),
+        ("year", datetime(2024, 1, 1), datetime(2025, 1, 1)),
+    ]
+)
+def test_periods(frequency, start, end):
+    start, end = start.replace(tzinfo=timezone.utc), end.replace(tzinfo=timezone.utc)
+    assert pledges.period_start(frequency, NOW) == start
+    assert pledges.period_end(frequency, start) == end
+
+@pytest.mark.parametrize(
+    ("co2e", "expected_streak"),
+    [(10, 2 + 3), (11, 3 - 1)]
+)
+def test_roll_over(co2e, expected_streak):
+    counters = {
+        "frequency": "day",
+        "period": datetime(2024, 12, 15), # naive, as read from mongodb
+        "co2e": co2e,
+        "count": 4,
+        "streak": 2,
+    }
+    pledge = {"frequency": "day", "co2e": 10}
+    rolled = pledges.roll_over(counters, pledge, NOW)
+    assert rolled["period"] == datetime(2024, 12, 18, tzinfo=timezone.utc)
+    assert rolled["co2e"] == rolled["count"] == 0
+    assert rolled["streak"] == expected_streak
+    current = {**counters, "period": datetime(2024, 12, 18)}
+    assert pledges.roll_over(current, pledge, NOW) is current
+
+def test_validate_frequency():
+    with pytest.raises(InvalidRequestDataError):
+        pledges.validate_frequency("fortnight")
+
+@pytest.mark.parametrize("pledge", [{"co2e": 10}, {"frequency": "fortnight", "co2e": 10}])
+def test_record_skips_invalid_pledges(pledge):
+    # returns before reading the counters, so no database is needed
+    pledges.record(None, savior_id=None, pledge=pledge, co2e=1, now=NOW)
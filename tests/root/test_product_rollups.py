@@ -0,0 +1,25 @@
+from bson import ObjectId
+from datetime import datetime, timedelta, timezone
+from root import product_rollups
+
+def test_build():
+    product_id, savior_id = ObjectId(), ObjectId()
+    now = datetime.now(tz=timezone.utc)
+    earlier = now - timedelta(days=1)
+    processes = [
+        {"savior_id": savior_id, "name": "bike", "stage": "sourcing", "co2e": 2, "last_update": earlier},
+        {"savior_id": savior_id, "name": "bike", "stage": "sourcing", "co2e": 3, "last_update": now},
+        {"savior_id": savior_id, "name": "bike", "stage": "transport", "co2e": None, "last_update": earlier},
+    ]
+    header = product_rollups.build(product_id, processes)
+    assert header["_id"] == product_id
+    assert header["savior_id"] == savior_id
+    assert header["name"] == "bike"
+    assert header["published"] is False
+    assert header["co2e"] == 5
+    assert header["num_processes"] == 3
+    assert header["last_update"] == now
+    assert header["stages"] == {
+        "sourcing": {"co2e": 5, "num_processes": 2, "last_update": now},
+        "transport": {"co2e": 0, "num_processes": 1, "last_update": earlier},
+    }
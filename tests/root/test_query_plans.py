@@ -0,0 +1,60 @@
+"""Explain-plan regression tests.
+
+Fail when a `Savior` query's plan degrades to a COLLSCAN, an in-memory sort,
+or examines too many documents. See tests/query_plans.py for more.
+"""
+
+import pytest
+from pytest import fixture
+import indexes
+from root.partner import Partner
+from root.user import User
+from tests.query_plans import (
+    CASES,
+    SEEDED_COLLECTIONS,
+    QueryCase,
+    QueryContext,
+    explain_recorded,
+    recording,
+    seed,
+    unseed,
+)
+
+@fixture(scope="module")
+def seeded(db):
+    indexes.create_indexes(db, collections=SEEDED_COLLECTIONS)
+    seeded = seed(db)
+    yield seeded
+    unseed(db, seeded)
+
+@fixture(scope="module")
+def recorder():
+    with recording() as recorder:
+        yield recorder
+
+@fixture
+def context(db, seeded, recorder) -> QueryContext:
+    partner_id, user_id = str(seeded.partner_id), str(seeded.user_id)
+    context = QueryContext(
+        db=db,
+        partner=Partner(savior_id=partner_id, user_id=partner_id),
+        user=User(savior_id=user_id),
+        seeded=seeded,
+    )
+    recorder.clear()
+    return context
+
+@pytest.mark.parametrize("case", CASES, ids=[case.name for case in CASES])
+def test_query_plan(case: QueryCase, context: QueryContext, recorder, db):
+    case.call(context)
+    assert recorder.commands, f"{case.name} issued no find or aggregate"
+    reports = explain_recorded(
+        db,
+        recorder,
+        allow_blocking_sort=case.allow_blocking_sort,
+        max_examined_ratio=case.max_examined_ratio,
+    )
+    for report in reports:
+        assert not report.violations, (
+            f"{case.name}: {report.command} {report.violations} {report.stages}"
+        )
@@ -206,4 +206,24 @@ class TestSavior:
             with pytest.raises(Exception) as e:
                 test()
         else:
-            test()
\ No newline at end of file
+            test()
+
+    def test_context_freshness(self, savior_id):
+        account_id = str(savior_id)
+        context = Savior.make_context(
+            {"username": "test", "region": "US", "account_version": 1}
+        )
+        assert Savior.is_fresh_context(context, account_id=account_id)
+        assert not Savior.is_fresh_context(None, account_id=account_id)
+        assert not Savior.is_fresh_context(
+            {**context, "v": context["v"] + 1}, account_id=account_id
+        )
+        assert not Savior.is_fresh_context(
+            {**context, "iat": 0}, account_id=account_id
+        )
+        fresh = Savior(savior_id=account_id, context=context)
+        assert not fresh.context_is_stale
+        assert fresh.context is context
+        fresh._record_account_version({"_id": savior_id, "account_version": 2})
+        assert not Savior.is_fresh_context(context, account_id=account_id)
+        assert Savior(savior_id=account_id, context=context).context_is_stale
@@ -1,4 +1,6 @@
 from root.user import User
+from datetime import datetime, timedelta, timezone
+from root import emission_rollups
 import pytest
 from pytest import fixture
 from typing import Literal
@@ -127,4 +129,43 @@ class TestUser:
         )["spriving"] == bool_assertion
         
     
-                
\ No newline at end of file
+    def test_spriving_makes_context_stale(self, user: User):
+        context = User.make_context(user.savior)
+        user.start_spriving()
+        assert User(str(user.savior_id), context=context).context_is_stale
+        fresh = User(str(user.savior_id))
+        assert fresh.context["spriving"] is True
+        assert fresh.context["av"] == context["av"] + 1
+        user.stop_spriving()
+        
+    def test_logs_next_cursor(self, user: User):
+        first_page = user.logs(limit=1)
+        if not first_page["has_more"]:
+            pytest.skip("The user needs more than one log")
+        next_page = user.logs(limit=1, cursor=first_page["next_cursor"])
+        assert next_page["logs"] == user.logs(limit=1, skip=1)["logs"]
+        
+        
+    def test_pledge_progress(self, mock_product_id: ObjectId, user: User):
+        user.pledge({"frequency": "day", "co2e": 1000})
+        before = user.pledge_progress()
+        assert before["frequency"] == "day"
+        res = user.log_product_emissions(product_id=mock_product_id, value=1)
+        after = user.pledge_progress()
+        assert after["count"] == before["count"] + 1
+        assert after["co2e"] == before["co2e"] + res["co2e"]
+        assert after["remaining_co2e"] == 1000 - after["co2e"]
+        user.undo_pledge()
+        assert user.pledge_progress() is None
+        
+    def test_times_logged_before_backfill(self, user: User, db, monkeypatch):
+        monkeypatch.setattr(emission_rollups, "_backfilled", False)
+        db.backfills.delete_many({"_id": emission_rollups.BACKFILL_ID})
+        since = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        db.product_logs.insert_one(
+            {"savior_id": user.savior_id, "created_at": since + timedelta(days=3)}
+        )
+        times_logged = user.get_times_logged(since.strftime("%Y-%m-%dT%H:%M:%S.%f%z"))
+        assert times_logged == db.product_logs.count_documents(
+            {"savior_id": user.savior_id, "created_at": {"$gt": since}}
+        )
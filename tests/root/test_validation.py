@@ -0,0 +1,84 @@
+import pandas as pd
+import pytest
+from root import validation
+from exceptions import FileValidationError
+
+def _rows(*rows: dict) -> pd.DataFrame:
+    defaults = {
+        "activity": "test",
+        "value": 1,
+        "unit": "kg",
+        "unit_type": "weight",
+        "scope": "2",
+        "category": "test",
+    }
+    return pd.DataFrame([{**defaults, **row} for row in rows])
+
+def test_valid_rows_are_normalized():
+    df, report = validation.validate(
+        _rows({"value": "2.5", "unit": " KG", "scope": 3}, {"scope": "1.0"})
+    )
+    assert not report
+    assert list(df["value"]) == [2.5, 1]
+    assert list(df["unit"]) == [" KG", "kg"]
+    assert list(df["scope"]) == ["3", "1"]
+
+@pytest.mark.parametrize(
+    ("row", "column", "message"),
+    [
+        ({"activity": " "}, "activity", "is blank"),
+        ({"category": None}, "category", "is blank"),
+        ({"value": "ten"}, "value", "must be a number"),
+        ({"value": -1}, "value", "must not be negative"),
+        ({"unit": "kwh"}, "unit", "doesn't match its unit_type"),
+        ({"unit_type": "money", "unit": "dollars"}, "unit", "doesn't match its unit_type"),
+        ({"scope": 4}, "scope", "must be 1, 2 or 3"),
+    ]
+)
+def test_invalid_rows(row, column, message):
+    df, report = validation.validate(_rows({}, row, {}))
+    assert report.to_dict() == {column: [{"error": message, "count": 1, "rows": [1]}]}
+    assert report.num_invalid_rows == 1
+
+def test_units_are_kept():
+    df, report = validation.validate(
+        _rows(
+            {"unit_type": "energy", "unit": "kWh"},
+            {"unit_type": "energy", "unit": "MMBTU"},
+            {"unit_type": "money", "unit": "USD"},
+            {"unit_type": "containeroverdistance", "unit": "t_km"},
+        )
+    )
+    assert not report
+    assert list(df["unit"]) == ["kWh", "MMBTU", "USD", "t_km"]
+    assert list(df["unit_type"]) == ["energy", "energy", "money", "containeroverdistance"]
+
+def test_ghg_category():
+    df = _rows({}, {}, {"value": -1}).assign(ghg_category=["3.1", None, "3.15"])
+    _, report = validation.validate(df)
+    assert [(column, error["rows"]) for column, errors in report.to_dict().items()
+            for error in errors] == [("value", [2]), ("ghg_category", [2])]
+    assert report.num_invalid_rows == 1
+
+def test_blank_rows_are_dropped():
+    df = pd.concat([_rows({}), pd.DataFrame([{}]), _rows({})], ignore_index=True)
+    df, report = validation.validate(df)
+    assert len(df) == 2
+    assert report.to_dict() == {"row": [{"error": "is blank", "count": 1, "rows": [1]}]}
+
+def test_report_merges_chunks(monkeypatch):
+    monkeypatch.setattr(validation, "MAX_REPORTED_ROWS", 3)
+    report = validation.ValidationReport()
+    for start in (0, 2):
+        chunk = _rows({"value": -1}, {"value": -1})
+        chunk.index += start
+        report.merge(validation.validate(chunk)[1])
+    assert report.to_dict() == {
+        "value": [{"error": "must not be negative", "count": 4, "rows": [0, 1, 2]}]
+    }
+    assert report.num_invalid_rows == 4
+    with pytest.raises(FileValidationError) as e:
+        report.raise_for_errors()
+    assert e.value.status_code == 400
+    assert e.value.errors == report.to_dict()
+    assert "value must not be negative in 4 rows" in str(e.value)
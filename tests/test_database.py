@@ -0,0 +1,40 @@
+import os
+from pymongo import MongoClient
+from database import MongoRegistry, mongo
+from root.savior import Savior
+
+class TestMongoRegistry:
+
+    def test_client_is_shared(self):
+        registry = MongoRegistry()
+        client = registry.client
+        assert isinstance(client, MongoClient)
+        assert registry.client is client
+        registry.close()
+
+    def test_configure(self):
+        registry = MongoRegistry()
+        client = registry.client
+        registry.configure(db_name="testing", maxPoolSize=5)
+        assert registry.client is not client
+        assert registry.db.name == "testing"
+        assert registry.client.options.pool_options.max_pool_size == 5
+        registry.close()
+
+    def test_new_client_after_fork(self):
+        """Mock a forked worker by changing the pid the client belongs to"""
+        registry = MongoRegistry()
+        client = registry.client
+        registry._pid = os.getpid() + 1
+        assert registry.client is not client
+        client.close()
+        registry.close()
+
+    def test_init_app(self, flask_app):
+        assert flask_app.extensions["mongo"] is mongo
+        assert flask_app.config["MONGO_DB_NAME"] == mongo.db_name
+
+    def test_saviors_share_client(self, mock_user_account):
+        savior_id = str(mock_user_account["_id"])
+        first, second = Savior(savior_id), Savior(savior_id)
+        assert first.db.client is second.db.client is mongo.client
@@ -0,0 +1,40 @@
+import indexes
+from pytest import fixture
+from pymongo import MongoClient
+
+@fixture(scope="module")
+def index_db():
+    """A separate database so that index tests don't modify the testing one"""
+    client = MongoClient()
+    db = client.spt_indexes_testing
+    yield db
+    client.drop_database(db.name)
+    client.close()
+
+def test_create_and_diff(index_db):
+    diffs = indexes.diff_indexes(index_db)
+    assert diffs.keys() == indexes.INDEXES.keys()
+    assert all(diff.missing for diff in diffs.values())
+    created = indexes.create_indexes(index_db)
+    for collection_name, models in indexes.INDEXES.items():
+        assert set(created[collection_name]) == {
+            model.document["name"] for model in models
+        }
+    assert not any(indexes.diff_indexes(index_db).values())
+    assert indexes.create_indexes(index_db) == {}
+
+def test_mismatched_and_undeclared(index_db):
+    index_db.tasks.drop_indexes()
+    index_db.tasks.create_index([("savior_id", 1)], name="savior_id_created_at")
+    index_db.tasks.create_index([("assignee", 1)], name="assignee")
+    diff = indexes.diff_collection(index_db, "tasks")
+    assert diff.mismatched == ["savior_id_created_at"]
+    assert diff.undeclared == ["assignee"]
+    indexes.create_indexes(index_db, drop_mismatched=True)
+    assert not indexes.diff_collection(index_db, "tasks").mismatched
+
+def test_verify_indexes(index_db):
+    assert indexes.verify_indexes(uri="mongodb://localhost:27017", db_name=index_db.name)
+    assert not indexes.verify_indexes(
+        uri="mongodb://localhost:27017", db_name="spt_indexes_missing"
+    )